@@ -1,23 +1,29 @@
-import json
 import os
 import pathlib
 import datetime
-import zipfile
 import shutil
 import re
 import hashlib
 import random
 import string
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-import pandas
-from docx import Document
 import jwt
 from PIL import Image, ImageFont, ImageDraw, ImageFilter
 
 from common.log import get_logger
-from config.setting import FILE_PATH, DatabaseTable, ITEM_LIST
-from common.postgres_driver import create_conn, execute_sqls, execute_many, fetch_one, fetch_all
+from common.docx_table import iter_docx_tables
+from config.setting import FILE_PATH, DatabaseTable, ITEM_LIST, GRAPH_POINTS, POOL_WORKERS
+from common.postgres_driver import create_conn, execute_sqls, execute_many, copy_rows, upsert_many, fetch_one, fetch_all, dump_json, load_json
 from app.item import DefaultItem
+from app.context import TaskContext
+from app.migrate import item_key_exists
+from app.job import TASK_JOB, submit_job, query_job, cancel_job
+from app.manifest import build_manifest
+from app.downsample import has_key, downsample_graph
+from app.curve import save_graph, load_graph, delete_graph
+from app.upload import validate_test_upload, validate_item_upload, extract_zip, link_or_copy
+from app.timing import StageTimer, profiled, can_profile
 from app.cell import (
     CellRtempDchgCapacity,
     CellStandardCycleLife
@@ -237,7 +243,7 @@ def save_task_info(task_id, submit_date, submit_company, task_note, test_samples
         "submit_date": submit_date,
         "submit_company": submit_company,
         "task_note": task_note,
-        "test_samples": json.dumps(test_samples, ensure_ascii=False, separators=(',', ':'))
+        "test_samples": dump_json(test_samples)
     }
 
     pathlib.Path(os.path.join(FILE_PATH, task_id)).mkdir(exist_ok=True)
@@ -278,22 +284,18 @@ def extract_product_file(task_id, product_file):
     logger.info(f"call extract_product_file: task_id={task_id} product_file={product_file}")
 
     data = []
-    doc_file = Document(os.path.join(FILE_PATH, task_id, "product_file" + os.path.splitext(product_file)[-1]))
 
-    for tb in doc_file.tables:
-        for i, row in enumerate(tb.rows):
-            if row.cells[1].paragraphs[0].text == "":
+    for tb in iter_docx_tables(os.path.join(FILE_PATH, task_id, "product_file" + os.path.splitext(product_file)[-1])):
+        for row in tb:
+            if row[1][0] == "":
                 data.append(
                     [
-                        "".join([para.text.strip() for para in row.cells[0].paragraphs]),
-                        "".join([para.text.strip() for para in row.cells[2].paragraphs]),
-                        "".join([para.text.strip() for para in row.cells[3].paragraphs])
+                        "".join([para.strip() for para in row[0]]),
+                        "".join([para.strip() for para in row[2]]),
+                        "".join([para.strip() for para in row[3]])
                     ]
                 )
 
-    df = pandas.DataFrame(data, columns=["category", "name", "value"])
-    df.insert(0, "task_id", task_id)
-
     sql = f"SELECT product_file FROM {DatabaseTable.TASK} WHERE task_id='{task_id}'"
 
     with create_conn() as conn:
@@ -302,32 +304,21 @@ def extract_product_file(task_id, product_file):
     if ret is False:
         return ret, value
 
-    if value is not None and value[0] is not None:
-        sql = f"DELETE FROM {DatabaseTable.PRODUCT} WHERE task_id='{task_id}'"
-
-        with create_conn() as conn:
-            ret, msg = execute_sqls(conn, sql)
-
-        if ret is False:
-            return ret, msg
-
-        pathlib.Path(os.path.join(FILE_PATH, task_id, value[0])).unlink(missing_ok=True)
-
-    sql = f"INSERT INTO {DatabaseTable.PRODUCT}({','.join(df.columns.tolist())}) VALUES({','.join(['%s'] * df.columns.size)})"
+    sqls = [
+        f"DELETE FROM {DatabaseTable.PRODUCT} WHERE task_id='{task_id}'",
+        f"UPDATE {DatabaseTable.TASK} SET product_date='{str(datetime.date.today())}', product_file='{product_file}' WHERE task_id='{task_id}'"
+    ]
 
     with create_conn() as conn:
-        ret, msg = execute_many(conn, sql, df.to_numpy().tolist())
+        ret, msg = copy_rows(conn, DatabaseTable.PRODUCT, ["task_id", "category", "name", "value"], [[task_id] + row for row in data], sqls)
 
     if ret is False:
         return ret, msg
 
-    sql = f"UPDATE {DatabaseTable.TASK} SET product_date='{str(datetime.date.today())}', product_file='{product_file}' WHERE task_id='{task_id}'"
-
-    with create_conn() as conn:
-        ret, msg = execute_sqls(conn, sql)
+    TaskContext.invalidate(task_id)
 
-    if ret is False:
-        return ret, msg
+    if value is not None and value[0] is not None and value[0] != product_file:
+        pathlib.Path(os.path.join(FILE_PATH, task_id, value[0])).unlink(missing_ok=True)
 
     pathlib.Path(os.path.join(FILE_PATH, task_id, "product_file" + os.path.splitext(product_file)[-1])).rename(pathlib.Path(os.path.join(FILE_PATH, task_id, product_file)))
 
@@ -336,8 +327,8 @@ def extract_product_file(task_id, product_file):
 
 def upload_test_file(user, task_id, test_file):
     """
-    It takes a zip file, unzips it, renames the files, and then checks if the files are in the correct
-    directory structure
+    It checks that a zip file is in the correct directory structure from its central directory, then
+    extracts it in one pass to the staging directory of the user, named by the user
     
     :param user: the user name
     :param task_id: the task id
@@ -348,88 +339,27 @@ def upload_test_file(user, task_id, test_file):
 
     logger.info(f"call upload_test_file: user={user} task_id={task_id} test_file={test_file}")
 
-    file_names = []
-    test_dirs = []
-    test_file_name = ""
-
-    zip_file = zipfile.ZipFile(os.path.join(FILE_PATH, task_id, test_file), 'r')
-
-    for old_name in zip_file.namelist():
-        try:
-            new_name = old_name.encode('cp437').decode('gbk')
-        except:
-            new_name = old_name.encode('utf-8').decode('utf-8')
-
-        file_names.append(
-            {
-                "new": os.path.join(FILE_PATH, task_id, new_name),
-                "old": os.path.join(FILE_PATH, task_id, old_name),
-                "count": len(new_name.rstrip('/').split('/'))
-            }
-        )
-
-        new_name_list = new_name.split('/')
-
-        if test_file_name == "":
-            test_file_name = new_name_list[0]
+    zip_path = os.path.join(FILE_PATH, task_id, test_file)
+    user_path = os.path.join(FILE_PATH, task_id, user)
 
-    if os.path.isfile(os.path.join(FILE_PATH, task_id, test_file_name)):
-        pathlib.Path(os.path.join(FILE_PATH, task_id, test_file_name)).unlink()
-
-    if os.path.isdir(os.path.join(FILE_PATH, task_id, test_file_name)):
-        shutil.rmtree(os.path.join(FILE_PATH, task_id, test_file_name))
-
-    zip_file.extractall(os.path.join(FILE_PATH, task_id))
-
-    zip_file.close()
-
-    pathlib.Path(os.path.join(FILE_PATH, task_id, test_file)).unlink()
+    ret, test_dirs = validate_test_upload(zip_path)
+    if ret is False:
+        pathlib.Path(zip_path).unlink(missing_ok=True)
+        return ret, test_dirs
 
-    file_names.sort(key=lambda x: x["count"])
+    if os.path.isfile(user_path):
+        pathlib.Path(user_path).unlink()
 
-    try:
-        for n in file_names:
-            old_file = pathlib.Path(n["new"]).parent.joinpath(pathlib.Path(n["old"]).name)
-            old_file.rename(pathlib.Path(n["new"]))
+    if os.path.isdir(user_path):
+        shutil.rmtree(user_path)
 
-        if os.path.isfile(os.path.join(FILE_PATH, task_id, user)):
-            pathlib.Path(os.path.join(FILE_PATH, task_id, user)).unlink()
+    ret, msg = extract_zip(zip_path, user_path)
 
-        if os.path.isdir(os.path.join(FILE_PATH, task_id, user)):
-            shutil.rmtree(os.path.join(FILE_PATH, task_id, user))
+    pathlib.Path(zip_path).unlink()
 
-        pathlib.Path(os.path.join(FILE_PATH, task_id, test_file_name)).rename(pathlib.Path(os.path.join(FILE_PATH, task_id, user)))
-    except Exception as e:
-        if os.path.isfile(os.path.join(FILE_PATH, task_id, user)):
-            pathlib.Path(os.path.join(FILE_PATH, task_id, user)).unlink()
-
-        if os.path.isdir(os.path.join(FILE_PATH, task_id, user)):
-            shutil.rmtree(os.path.join(FILE_PATH, task_id, user))
-
-        if os.path.isfile(os.path.join(FILE_PATH, task_id, test_file_name)):
-            pathlib.Path(os.path.join(FILE_PATH, task_id, test_file_name)).unlink()
-
-        if os.path.isdir(os.path.join(FILE_PATH, task_id, test_file_name)):
-            shutil.rmtree(os.path.join(FILE_PATH, task_id, test_file_name))
-
-        return False, f"Caught exception: {e.__doc__}({e})"
-
-    with os.scandir(os.path.join(FILE_PATH, task_id, user)) as gbt_it:
-        for gbt_entry in gbt_it:
-            if gbt_entry.is_dir() and gbt_entry.name in ITEM_LIST:
-                with os.scandir(gbt_entry.path) as category_it:
-                    for category_entry in category_it:
-                        if category_entry.is_dir() and category_entry.name in ITEM_LIST[gbt_entry.name]:
-                            with os.scandir(category_entry.path) as item_it:
-                                for item_entry in item_it:
-                                    if item_entry.is_dir() and item_entry.name in ITEM_LIST[gbt_entry.name][category_entry.name]:
-                                        test_dirs.append([gbt_entry.name, category_entry.name, item_entry.name])
-                                    else:
-                                        return False, f"{item_entry.path} is invalid."             
-                        else:
-                            return False, f"{category_entry.path} is invalid."            
-            else:
-                return False, f"{gbt_entry.path} is invalid."
+    if ret is False:
+        shutil.rmtree(user_path, ignore_errors=True)
+        return ret, msg
 
     return True, test_dirs
 
@@ -448,43 +378,48 @@ def extract_test_file(user, task_id, test_items, parser_rule):
 
     logger.info(f"call extract_test_file: user={user} task_id={task_id} test_items={test_items} parser_rule={parser_rule}")
 
-    sqls = []
+    rows = []
 
     for row in test_items:
         pathlib.Path(os.path.join(FILE_PATH, task_id, row[0], row[1], row[2])).mkdir(parents=True, exist_ok=True)
 
-        shutil.copytree(os.path.join(FILE_PATH, task_id, user, row[0], row[1], row[2]), os.path.join(FILE_PATH, task_id, row[0], row[1], row[2]), dirs_exist_ok=True)
-
-        sql = f"SELECT task_id FROM {DatabaseTable.STAT} WHERE task_id='{task_id}' AND gbt='{row[0]}' AND category='{row[1]}' AND item='{row[2]}'"
+        shutil.copytree(os.path.join(FILE_PATH, task_id, user, row[0], row[1], row[2]), os.path.join(FILE_PATH, task_id, row[0], row[1], row[2]), copy_function=link_or_copy, dirs_exist_ok=True)
 
-        with create_conn() as conn:
-            ret, value = fetch_one(conn, sql)
-
-        if ret is False:
-            return ret, value
+        build_manifest(task_id, row[0], row[1], row[2])
 
-        if value is not None and value[0] is not None:
-            sqls.append(f"UPDATE {DatabaseTable.STAT} SET status='extract',upload_user='{user}',item_note='{row[3]}',result=NULL WHERE task_id='{task_id}' AND gbt='{row[0]}' AND category='{row[1]}' AND item='{row[2]}'")
-        else:
-            sqls.append(f"INSERT INTO {DatabaseTable.STAT}(task_id,status,upload_user,item_note,gbt,category,item) VALUES('{task_id}','extract','{user}','{row[3]}','{row[0]}','{row[1]}','{row[2]}')")
+        rows.append([task_id, row[0], row[1], row[2], 'extract', user, row[3], None])
 
-    if not sqls:
+    if not rows:
         return True, ""
 
-    with create_conn() as conn:
-        ret, msg = execute_sqls(conn, sqls)
+    sql = f"UPDATE {DatabaseTable.TASK} SET test_date='{str(datetime.date.today())}', test_parser='{parser_rule}' WHERE task_id='{task_id}' AND test_date IS NULL"
+
+    ret, key_exists = item_key_exists()
 
     if ret is False:
-        return ret, msg
+        return ret, key_exists
 
-    sql = f"UPDATE {DatabaseTable.TASK} SET test_date='{str(datetime.date.today())}', test_parser='{parser_rule}' WHERE task_id='{task_id}' AND test_date IS NULL"
+    if key_exists is True:
+        with create_conn() as conn:
+            ret, msg = upsert_many(conn, DatabaseTable.STAT, ["task_id", "gbt", "category", "item", "status", "upload_user", "item_note", "result"], rows, ["task_id", "gbt", "category", "item"], sql)
+    else:
+        # the upsert needs the unique key of the items, which is missing until the duplicate rows are removed
+        sqls = []
 
-    with create_conn() as conn:
-        ret, msg = execute_sqls(conn, sql)
+        for row in rows:
+            where = f"task_id='{task_id}' AND gbt='{row[1]}' AND category='{row[2]}' AND item='{row[3]}'"
+
+            sqls.append(f"UPDATE {DatabaseTable.STAT} SET status='extract',upload_user='{user}',item_note='{row[6]}',result=NULL WHERE {where}")
+            sqls.append(f"INSERT INTO {DatabaseTable.STAT}(task_id,status,upload_user,item_note,gbt,category,item) SELECT '{task_id}','extract','{user}','{row[6]}','{row[1]}','{row[2]}','{row[3]}' WHERE NOT EXISTS (SELECT 1 FROM {DatabaseTable.STAT} WHERE {where})")
+
+        with create_conn() as conn:
+            ret, msg = execute_sqls(conn, sqls + [sql])
 
     if ret is False:
         return ret, msg
 
+    TaskContext.invalidate(task_id)
+
     return True, ""
 
 
@@ -520,7 +455,7 @@ def delete_task(task_id):
     return True, ""
 
 
-def query_task_upload_info(task_id, task_note, gbt, item, item_note, test_sample_company, test_sample_name, product_date_range, test_date_range):
+def query_task_upload_info(task_id, task_note, gbt, item, item_note, test_sample_company, test_sample_name, product_date_range, test_date_range, page_size=None, after=None):
     """
     This function queries the database for the task_id, task_note, gbt, item, item_note,
     test_sample_company, test_sample_name, product_date_range, and test_date_range for the given task_id
@@ -536,107 +471,100 @@ def query_task_upload_info(task_id, task_note, gbt, item, item_note, test_sample
     date
     :param test_date_range: a list of two strings, the first one is the start date, the second one is
     the end date
+    :param page_size: the number of tasks of a page, None to return every task as a list
+    :param after: the "next" value of the previous page, None for the first page
     """
 
     logger = get_logger()
 
-    logger.info(f"call query_task_upload_info: task_id={task_id} task_note={task_note} gbt={gbt} item={item} item_note={item_note} test_sample_company={test_sample_company} test_sample_name={test_sample_name} product_date_range={product_date_range} test_date_range={test_date_range}")
+    logger.info(f"call query_task_upload_info: task_id={task_id} task_note={task_note} gbt={gbt} item={item} item_note={item_note} test_sample_company={test_sample_company} test_sample_name={test_sample_name} product_date_range={product_date_range} test_date_range={test_date_range} page_size={page_size} after={after}")
 
-    sql = f"SELECT task_id, task_note, test_samples, product_date, test_date FROM {DatabaseTable.TASK}"
+    samples = "jsonb_array_elements(t.test_samples) WITH ORDINALITY AS e(sample, i)"
 
-    if task_id != "" or task_note != "" or product_date_range["from"] != "" or test_date_range["from"] != "":
-        sql += " WHERE"
+    conditions = []
 
-        if task_id != "":
-            sql += f" task_id like '%{task_id}%'"
+    if task_id != "":
+        conditions.append(f"t.task_id LIKE '%{task_id}%'")
 
-        if task_note != "":
-            if not sql.endswith("WHERE"):
-                sql += " AND"
+    if task_note != "":
+        conditions.append(f"t.task_note LIKE '%{task_note}%'")
 
-            sql += f" task_note like '%{task_note}%'"
+    if product_date_range["from"] != "":
+        conditions.append(f"t.product_date >= '{product_date_range['from']}' AND t.product_date <= '{product_date_range['to']}'")
 
-        if product_date_range["from"] != "":
-            from_date = product_date_range["from"]
-            to_date = product_date_range["to"]
+    if test_date_range["from"] != "":
+        conditions.append(f"t.test_date >= '{test_date_range['from']}' AND t.test_date <= '{test_date_range['to']}'")
 
-            if not sql.endswith("WHERE"):
-                sql += " AND"
+    if test_sample_company != "":
+        conditions.append(f"public.sample_values(t.test_samples, 'company') LIKE '%{test_sample_company}%'")
 
-            sql += f" product_date >= '{from_date}' AND product_date <= '{to_date}'"
+        company = f"(SELECT e.sample->>'company' FROM {samples} WHERE e.sample->>'company' LIKE '%{test_sample_company}%' ORDER BY e.i LIMIT 1)"
+    else:
+        company = "COALESCE(t.test_samples->0->>'company', '')"
 
-        if test_date_range["from"] != "":
-            from_date = test_date_range["from"]
-            to_date = test_date_range["to"]
+    if test_sample_name != "":
+        conditions.append(f"public.sample_values(t.test_samples, 'name') LIKE '%{test_sample_name}%'")
 
-            if not sql.endswith("WHERE"):
-                sql += " AND"
+    if gbt != "" or item != "" or item_note != "":
+        stat = f"SELECT 1 FROM {DatabaseTable.STAT} s WHERE s.task_id = t.task_id"
 
-            sql += f" test_date >= '{from_date}' AND test_date <= '{to_date}'"
+        if gbt != "":
+            stat += f" AND s.gbt LIKE '%{gbt}%'"
 
-    sql += " ORDER BY create_time DESC"
+        if item != "":
+            stat += f" AND s.item LIKE '%{item}%'"
 
-    with create_conn() as conn:
-        ret, data = fetch_all(conn, sql)
+        if item_note != "":
+            stat += f" AND s.item_note LIKE '%{item_note}%'"
 
-    if ret is False:
-        return ret, data
+        conditions.append(f"EXISTS ({stat})")
 
-    task_list = []
+    sql = f"SELECT t.task_id, {company}, t.product_date, t.test_date, t.create_time FROM {DatabaseTable.TASK} t"
 
-    for task in data:
-        company = None
-        name = None
+    if len(conditions) > 0:
+        sql += " WHERE " + " AND ".join(conditions)
 
-        samples = json.loads(task[2])
+    if page_size is None:
+        with create_conn() as conn:
+            ret, data = fetch_all(conn, sql + " ORDER BY t.create_time DESC, t.task_id DESC")
 
-        if test_sample_company != "":
-            for sample in samples[:]:
-                if sample["company"].find(test_sample_company) >= 0:
-                    company = sample["company"]
-                    break
-        else:
-            if len(samples) > 0:
-                company = samples[0]["company"]
-            else:
-                company = ""
+        if ret is False:
+            return ret, data
 
-        if test_sample_name != "":
-            for sample in samples[:]:
-                if sample["name"].find(test_sample_name) >= 0:
-                    name = sample["name"]
-                    break
-        else:
-            if len(samples) > 0:
-                name = samples[0]["name"]
-            else:
-                name = ""
+        return True, [[task[0], task[1], task[2].isoformat() if task[2] is not None else "", task[3].isoformat() if task[3] is not None else ""] for task in data]
+
+    page = "SELECT m.*, (SELECT count(*) FROM matched) FROM matched m"
 
-        if company is not None and name is not None:
-            if gbt != "" or item != "" or item_note != "":
-                sql = f"SELECT task_id FROM {DatabaseTable.STAT} WHERE task_id = '{task[0]}'"
+    if after is not None:
+        page += f" WHERE (m.create_time, m.task_id) < ('{after['create_time']}', '{after['task_id']}')"
 
-                if gbt != "":
-                    sql += f" AND gbt LIKE '%{gbt}%'"
+    page += f" ORDER BY m.create_time DESC, m.task_id DESC LIMIT {int(page_size)}"
 
-                if item != "":
-                    sql += f" AND item LIKE '%{item}%'"                    
+    with create_conn() as conn:
+        ret, data = fetch_all(conn, f"WITH matched AS ({sql}) {page}")
 
-                if item_note != "":
-                    sql += f" AND item_note LIKE '%{item_note}%'" 
+    if ret is False:
+        return ret, data
 
-                with create_conn() as conn:
-                    ret, value = fetch_one(conn, sql)
+    if len(data) > 0:
+        total = data[0][5]
+    else:
+        with create_conn() as conn:
+            ret, value = fetch_one(conn, f"SELECT count(*) FROM ({sql}) matched")
+
+        if ret is False:
+            return ret, value
+
+        total = value[0]
 
-                if ret is False:
-                    return ret, value
+    next_page = None
 
-                if value is None or value[0] is None:
-                    continue
+    if len(data) == int(page_size):
+        next_page = {"create_time": data[-1][4].isoformat(), "task_id": data[-1][0]}
 
-            task_list.append([task[0], company, task[3].isoformat() if task[3] is not None else "", task[4].isoformat() if task[4] is not None else ""])
+    task_list = [[task[0], task[1], task[2].isoformat() if task[2] is not None else "", task[3].isoformat() if task[3] is not None else ""] for task in data]
 
-    return True, task_list
+    return True, {"tasks": task_list, "total": total, "next": next_page}
 
 
 def query_task_product_info(task_id):
@@ -719,12 +647,13 @@ def query_task_test_info(task_id):
     items.sort(key=lambda x: x[1])
     items.sort(key=lambda x: x[0])
 
-    return True, {"submit_date": data[0].isoformat(), "submit_company": data[1], "task_note": data[2], "test_samples": json.loads(data[3]), "test_date": data[4].isoformat() if data[4] is not None else "", "test_items": items}
+    return True, {"submit_date": data[0].isoformat(), "submit_company": data[1], "task_note": data[2], "test_samples": load_json(data[3]), "test_date": data[4].isoformat() if data[4] is not None else "", "test_items": items}
 
 
 def extract_item_file(user, task_id, gbt, category, item, item_file, item_note):
     """
-    It takes a zip file, extracts it, and then moves the contents of the zip file to a new directory
+    It checks the samples of a zip file from its central directory, and extracts it in one pass
+    straight to the directory of the item
     
     :param user: the user who uploaded the file
     :param task_id: the task id
@@ -748,82 +677,23 @@ def extract_item_file(user, task_id, gbt, category, item, item_file, item_note):
     else:
         return False, f"{gbt} is invalid."
 
-    file_names = []
-    samples_dirs = []
-    item_file_name = ""
-
-    zip_file = zipfile.ZipFile(os.path.join(FILE_PATH, task_id, item_file), 'r')
-
-    for old_name in zip_file.namelist():
-        try:
-            new_name = old_name.encode('cp437').decode('gbk')
-        except:
-            new_name = old_name.encode('utf-8').decode('utf-8')
-
-        file_names.append(
-            {
-                "new": os.path.join(FILE_PATH, task_id, new_name),
-                "old": os.path.join(FILE_PATH, task_id, old_name),
-                "count": len(new_name.rstrip('/').split('/'))
-            }
-        )
-
-        new_name_list = new_name.split('/')
-
-        if item_file_name == "":
-            item_file_name = new_name_list[0]
-
-    if os.path.isfile(os.path.join(FILE_PATH, task_id, item_file_name)):
-        pathlib.Path(os.path.join(FILE_PATH, task_id, item_file_name)).unlink()
-
-    if os.path.isdir(os.path.join(FILE_PATH, task_id, item_file_name)):
-        shutil.rmtree(os.path.join(FILE_PATH, task_id, item_file_name))
-
-    zip_file.extractall(os.path.join(FILE_PATH, task_id))
-
-    zip_file.close()
-
-    pathlib.Path(os.path.join(FILE_PATH, task_id, item_file)).unlink()
-
-    file_names.sort(key=lambda x: x["count"])
-
-    try:
-        for n in file_names:
-            old_file = pathlib.Path(n["new"]).parent.joinpath(pathlib.Path(n["old"]).name)
-            old_file.rename(pathlib.Path(n["new"]))
-
-        if os.path.isfile(os.path.join(FILE_PATH, task_id, user)):
-            pathlib.Path(os.path.join(FILE_PATH, task_id, user)).unlink()
-
-        if os.path.isdir(os.path.join(FILE_PATH, task_id, user)):
-            shutil.rmtree(os.path.join(FILE_PATH, task_id, user))
-
-        pathlib.Path(os.path.join(FILE_PATH, task_id, item_file_name)).rename(pathlib.Path(os.path.join(FILE_PATH, task_id, user)))
-    except Exception as e:
-        if os.path.isfile(os.path.join(FILE_PATH, task_id, user)):
-            pathlib.Path(os.path.join(FILE_PATH, task_id, user)).unlink()
+    zip_path = os.path.join(FILE_PATH, task_id, item_file)
 
-        if os.path.isdir(os.path.join(FILE_PATH, task_id, user)):
-            shutil.rmtree(os.path.join(FILE_PATH, task_id, user))
-
-        if os.path.isfile(os.path.join(FILE_PATH, task_id, item_file_name)):
-            pathlib.Path(os.path.join(FILE_PATH, task_id, item_file_name)).unlink()
-
-        if os.path.isdir(os.path.join(FILE_PATH, task_id, item_file_name)):
-            shutil.rmtree(os.path.join(FILE_PATH, task_id, item_file_name))
+    ret, samples_dirs = validate_item_upload(zip_path)
+    if ret is False:
+        pathlib.Path(zip_path).unlink(missing_ok=True)
+        return ret, samples_dirs
 
-        return False, f"Caught exception: {e.__doc__}({e})"
+    pathlib.Path(os.path.join(FILE_PATH, task_id, gbt, category, item)).mkdir(parents=True, exist_ok=True)
 
-    with os.scandir(os.path.join(FILE_PATH, task_id, user)) as sample_it:
-        for sample_entry in sample_it:
-            if sample_entry.name in ITEM_LIST:
-                return False, f"{sample_entry.name} is invalid."
+    ret, msg = extract_zip(zip_path, os.path.join(FILE_PATH, task_id, gbt, category, item))
 
-            samples_dirs.append(sample_entry.name)
+    pathlib.Path(zip_path).unlink()
 
-    pathlib.Path(os.path.join(FILE_PATH, task_id, gbt, category, item)).mkdir(parents=True, exist_ok=True)
+    if ret is False:
+        return ret, msg
 
-    shutil.copytree(os.path.join(FILE_PATH, task_id, user), os.path.join(FILE_PATH, task_id, gbt, category, item), dirs_exist_ok=True)
+    build_manifest(task_id, gbt, category, item)
 
     sql = f"SELECT task_id FROM {DatabaseTable.STAT} WHERE task_id='{task_id}' AND gbt='{gbt}' AND category='{category}' AND item='{item}'"
 
@@ -850,28 +720,39 @@ def extract_item_file(user, task_id, gbt, category, item, item_file, item_note):
     if ret is False:
         return ret, msg
 
+    TaskContext.invalidate(task_id)
+
     return True, samples_dirs
 
 
-def parse_test_item(task_id, gbt, category, item):
+def parse_test_item(task_id, gbt, category, item, context=None, profile=False):
     """
     It takes a task ID, a GBT, a category, and an item, and returns a dictionary with the item's ID, the
-    task ID, the category, and the item's text
+    task ID, the category, and the item's text. The duration of every stage is logged as one timing
+    record.
     
     :param task_id: the id of the task
     :param gbt: the GBT object
     :param category: the category of the item, e.g. "test_item_1"
     :param item: the item to be parsed
+    :param context: the TaskContext shared with the other items of the task, used by parse_task
+    :param profile: True to run the parse under cProfile, the profile is saved in <task>/.cache/profile.
+    Only the parse job worker profiles, see submit_parse_job.
     """
 
     logger = get_logger()
 
-    logger.info(f"call parse_test_item: task_id={task_id} gbt={gbt} category={category} item={item}")
+    logger.info(f"call parse_test_item: task_id={task_id} gbt={gbt} category={category} item={item} profile={profile}")
+
+    if profile is True:
+        ret, msg = can_profile()
+        if ret is False:
+            return ret, msg
 
     if gbt in ITEM_LIST:
         if category in ITEM_LIST[gbt]:
             if item in ITEM_LIST[gbt][category]:
-                instance = eval(ITEM_LIST[gbt][category][item])(task_id, gbt, category, item)
+                instance = eval(ITEM_LIST[gbt][category][item])(task_id, gbt, category, item, context)
             else:
                 return False, f"{item} is invalid."             
         else:
@@ -879,21 +760,199 @@ def parse_test_item(task_id, gbt, category, item):
     else:
         return False, f"{gbt} is invalid."
 
-    ret, item_result = instance.preprocess()
+    timer = StageTimer("parse", task_id=task_id, gbt=gbt, category=category, item=item, item_class=type(instance).__name__)
+
+    with profiled(task_id, hashlib.md5(f"{gbt}/{category}/{item}".encode('utf-8')).hexdigest(), profile):
+        with timer.stage("preprocess"):
+            ret, item_result = instance.preprocess()
+
+        if ret is False:
+            timer.log(ok=False)
+            return ret, item_result
+
+        logger.info(f"parse: {gbt} {category} {item}")
+
+        if item_result:
+            if "graph" in item_result:
+                with timer.stage("save_graph"):
+                    item_result["graph"] = save_graph(task_id, gbt, category, item, item_result["graph"])
+
+            with timer.stage("encode"):
+                result = dump_json(item_result)
+
+            sql = f"UPDATE {DatabaseTable.STAT} SET status='parse', result=%s::jsonb WHERE task_id='{task_id}' AND gbt='{gbt}' AND category='{category}' AND item='{item}'"
+
+            with timer.stage("update"):
+                with create_conn() as conn:
+                    ret, msg = execute_many(conn, sql, [(result,)])
+
+            if ret is True:
+                instance.context.set_item_result(gbt, category, item, item_result)
+                TaskContext.invalidate(task_id, keep=instance.context)
+
+            timer.log(ok=ret, result_bytes=len(result))
+
+            return ret, msg
+
+        timer.log(ok=True)
+
+        return True, "extract"
+
+
+def parse_task(task_id):
+    """
+    It parses every extracted item of a task in one call. An item runs once the items it depends on,
+    its class prerequisites in the same gbt and category, have parsed, and is skipped when one of them
+    failed. The items that do not depend on each other run at the same time. The product info and the
+    item results are loaded once and shared by all the items. Use submit_parse_task_job to run it in
+    the parse workers.
+    
+    :param task_id: the id of the task
+    :return: True, [{"gbt", "category", "item", "ret", "data"}] in the order of stat_info.
+    """
+
+    logger = get_logger()
+
+    logger.info(f"call parse_task: task_id={task_id}")
+
+    sql = f"SELECT gbt, category, item FROM {DatabaseTable.STAT} WHERE task_id='{task_id}' ORDER BY gbt, category, item"
+
+    with create_conn() as conn:
+        ret, data = fetch_all(conn, sql)
+
     if ret is False:
-        return ret, item_result
+        return ret, data
 
-    logger.info(f"parse: {gbt} {category} {item}")
+    items = [tuple(row) for row in data if row[0] in ITEM_LIST and row[1] in ITEM_LIST[row[0]] and row[2] in ITEM_LIST[row[0]][row[1]]]
 
-    if item_result:
-        sql = f"UPDATE {DatabaseTable.STAT} SET status='parse', result='{json.dumps(item_result, separators=(',', ':'))}' WHERE task_id='{task_id}' AND gbt='{gbt}' AND category='{category}' AND item='{item}'"
+    prerequisites = {}
 
-        with create_conn() as conn:
-            return execute_sqls(conn, sql)
+    for gbt, category, item in items:
+        prerequisites[(gbt, category, item)] = [(gbt, category, p) for p in eval(ITEM_LIST[gbt][category][item]).prerequisites if (gbt, category, p) in items]
+
+    context = TaskContext.get(task_id)
+
+    results = {}
+    pending = list(items)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=POOL_WORKERS) as executor:
+        while pending or running:
+            # an item whose prerequisite failed or was skipped is skipped too, which may skip its dependents
+            skipped = True
+
+            while skipped:
+                skipped = [key for key in pending if any(p in results and results[p][0] is not True for p in prerequisites[key])]
+
+                for key in skipped:
+                    pending.remove(key)
+
+                    failed = [p[2] for p in prerequisites[key] if p in results and results[p][0] is not True]
+                    results[key] = (False, f"Skipped, because {', '.join(failed)} did not parse.")
+
+                    logger.info(f"parse_task: {key} skipped")
+
+            for key in [key for key in pending if all(p in results and results[p][0] is True for p in prerequisites[key])]:
+                pending.remove(key)
+                running[executor.submit(parse_test_item, *key, context)] = key
+
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+
+            for future in finished:
+                key = running.pop(future)
+
+                try:
+                    results[key] = future.result()
+                except Exception as e:
+                    results[key] = (False, f"Caught exception: {e.__doc__}({e})")
+
+                logger.info(f"parse_task: {key} {results[key][0]}")
+
+    for key in pending:
+        results[key] = (False, f"Can not resolve the prerequisites of {key[2]}.")
+
+    return True, [{"gbt": key[0], "category": key[1], "item": key[2], "ret": results[key][0], "data": results[key][1]} for key in items]
+
+
+def submit_parse_job(task_id, gbt, category, item, profile=False):
+    """
+    It queues a parse of the item for the parse workers, and returns the job id right away
+    
+    :param task_id: the id of the task
+    :param gbt: the gbt of the item
+    :param category: the category of the item
+    :param item: the item to be parsed
+    :param profile: True to run the parse under cProfile in the worker, see parse_test_item
+    """
+
+    logger = get_logger()
+
+    logger.info(f"call submit_parse_job: task_id={task_id} gbt={gbt} category={category} item={item} profile={profile}")
+
+    if gbt in ITEM_LIST:
+        if category in ITEM_LIST[gbt]:
+            if item not in ITEM_LIST[gbt][category]:
+                return False, f"{item} is invalid."             
+        else:
+            return False, f"{category} is invalid."            
+    else:
+        return False, f"{gbt} is invalid."
+
+    ret, job_id = submit_job(task_id, gbt, category, item, profile is True)
+    if ret is False:
+        return ret, job_id
+
+    return True, {"job_id": job_id}
+
+
+def submit_parse_task_job(task_id):
+    """
+    It queues a parse of every item of the task for the parse workers, see parse_task, and returns the
+    job id right away
+    
+    :param task_id: the id of the task
+    """
+
+    logger = get_logger()
+
+    logger.info(f"call submit_parse_task_job: task_id={task_id}")
+
+    ret, job_id = submit_job(task_id, TASK_JOB, TASK_JOB, TASK_JOB)
+    if ret is False:
+        return ret, job_id
 
-        return True, "parse"
+    return True, {"job_id": job_id}
 
-    return True, "extract"
+
+def query_parse_job(job_id):
+    """
+    It returns the status of a parse job: queued, running, done, failed or cancelled
+    
+    :param job_id: the job id returned by submit_parse_job
+    """
+
+    logger = get_logger()
+
+    logger.info(f"call query_parse_job: job_id={job_id}")
+
+    return query_job(job_id)
+
+
+def cancel_parse_job(job_id):
+    """
+    It cancels a parse job that no worker has started yet
+    
+    :param job_id: the job id returned by submit_parse_job
+    """
+
+    logger = get_logger()
+
+    logger.info(f"call cancel_parse_job: job_id={job_id}")
+
+    return cancel_job(job_id)
 
 
 def delete_test_item(task_id, gbt, category, item):
@@ -918,11 +977,15 @@ def delete_test_item(task_id, gbt, category, item):
     if ret is False:
         return ret, msg
 
+    TaskContext.invalidate(task_id)
+
     try:
         shutil.rmtree(os.path.join(FILE_PATH, task_id, gbt, category, item))
     except:
         pass
 
+    delete_graph(task_id, gbt, category, item)
+
     return True, ""
 
 
@@ -992,7 +1055,7 @@ def query_extract_item_info(task_id, gbt, category, item):
     return True, {"files": stat_data["files"], "decision": decision_data}
 
 
-def query_parse_item_info(task_id, gbt, category, item):
+def query_parse_item_info(task_id, gbt, category, item, with_graph=True, graph_points=GRAPH_POINTS, full_sample=None):
     """
     It takes in a task_id, gbt, category, and item, and returns a dictionary of files, table, list,
     graph, and decision.
@@ -1001,11 +1064,14 @@ def query_parse_item_info(task_id, gbt, category, item):
     :param gbt: the name of the data source
     :param category: "category"
     :param item: the name of the item to be parsed
+    :param with_graph: False to leave the curves out, they can be fetched by query_parse_item_graph
+    :param graph_points: the max number of points per curve of the graph, None for full resolution
+    :param full_sample: the key of a curve, or a sample whose curves are returned at full resolution
     """
 
     logger = get_logger()
 
-    logger.info(f"call query_parse_item_info: task_id={task_id} gbt={gbt} category={category} item={item}")
+    logger.info(f"call query_parse_item_info: task_id={task_id} gbt={gbt} category={category} item={item} with_graph={with_graph} graph_points={graph_points} full_sample={full_sample}")
 
     if gbt in ITEM_LIST:
         if category in ITEM_LIST[gbt]:
@@ -1026,7 +1092,60 @@ def query_parse_item_info(task_id, gbt, category, item):
     if ret is False:
         return ret, decision_data
 
-    return True, {"files": stat_data["files"], "table": stat_data["table"], "list": stat_data["list"], "graph": stat_data["graph"], "decision": decision_data}
+    graph = stat_data["graph"][:2]
+    graph_error = ""
+
+    if with_graph is True:
+        ret, data = load_graph(task_id, gbt, category, item, stat_data["graph"])
+
+        # the table and the list are still returned when the curves are missing
+        if ret is False:
+            graph_error = data
+        elif full_sample is not None and has_key(data, full_sample) is False:
+            return False, f"{full_sample} is not a curve or a sample of {item}."
+        else:
+            graph = downsample_graph(data, graph_points, () if full_sample is None else (full_sample,))
+
+    return True, {"files": stat_data["files"], "table": stat_data["table"], "list": stat_data["list"], "graph": graph, "graph_error": graph_error, "decision": decision_data}
+
+
+def query_parse_item_graph(task_id, gbt, category, item, graph_points=GRAPH_POINTS, full_sample=None):
+    """
+    It returns the graph of a parsed item, with its curves loaded from the curve store
+    
+    :param task_id: the task id
+    :param gbt: the gbt of the item
+    :param category: the category of the item
+    :param item: the item
+    :param graph_points: the max number of points per curve, None for full resolution
+    :param full_sample: the key of a curve, or a sample whose curves are returned at full resolution
+    """
+
+    logger = get_logger()
+
+    logger.info(f"call query_parse_item_graph: task_id={task_id} gbt={gbt} category={category} item={item} graph_points={graph_points} full_sample={full_sample}")
+
+    sql = f"SELECT result FROM {DatabaseTable.STAT} WHERE task_id='{task_id}' AND gbt='{gbt}' AND category='{category}' AND item='{item}'"
+
+    with create_conn() as conn:
+        ret, result = fetch_one(conn, sql)
+
+    if ret is False:
+        return ret, result
+
+    if result is None or result[0] is None:
+        return True, []
+
+    graph = load_json(result[0]).get("graph", [])
+
+    ret, graph = load_graph(task_id, gbt, category, item, graph)
+    if ret is False:
+        return ret, graph
+
+    if full_sample is not None and has_key(graph, full_sample) is False:
+        return False, f"{full_sample} is not a curve or a sample of {item}."
+
+    return True, downsample_graph(graph, graph_points, () if full_sample is None else (full_sample,))
 
 
 def query_item_list(gbt, category):
@@ -1045,4 +1164,43 @@ def query_item_list(gbt, category):
     if gbt in ITEM_LIST and category in ITEM_LIST[gbt]:
         return True, list(ITEM_LIST[gbt][category].keys())
 
-    return True, []
\ No newline at end of file
+    return True, []
+
+def query_item_results(gbt, category, item, column, op, value):
+    """
+    It finds the samples of every task whose value in a column of the result table of an item
+    compares to a value, such as the samples of 室温放电容量 whose 平均放电容量 is below 50
+    
+    :param gbt: the gbt of the item
+    :param category: the category of the item
+    :param item: the item
+    :param column: the header of the column, or a part of it, such as '平均放电容量'
+    :param op: one of <, <=, >, >=, =, !=
+    :param value: the number the values are compared to
+    :return: True, [[task_id, sample, value]] ordered by task_id.
+    """
+
+    logger = get_logger()
+
+    logger.info(f"call query_item_results: gbt={gbt} category={category} item={item} column={column} op={op} value={value}")
+
+    if op not in ("<", "<=", ">", ">=", "=", "!="):
+        return False, f"{op} is invalid."
+
+    header = f"""SELECT (k.i - 1)::int AS pos FROM jsonb_array_elements_text(s.result->'table'->0) WITH ORDINALITY AS k(name, i)
+        WHERE k.name LIKE '%{column}%' ORDER BY k.i LIMIT 1"""
+
+    sql = f"""SELECT s.task_id, r.row->>0, (r.row->>h.pos)::numeric FROM {DatabaseTable.STAT} s
+        CROSS JOIN LATERAL ({header}) h
+        CROSS JOIN LATERAL jsonb_array_elements(s.result->'table') WITH ORDINALITY AS r(row, i)
+        WHERE s.gbt='{gbt}' AND s.category='{category}' AND s.item='{item}' AND s.result IS NOT NULL AND r.i > 1
+            AND CASE WHEN jsonb_typeof(r.row->h.pos) = 'number' THEN (r.row->>h.pos)::numeric {op} {float(value)} ELSE false END
+        ORDER BY s.task_id, r.i"""
+
+    with create_conn() as conn:
+        ret, data = fetch_all(conn, sql)
+
+    if ret is False:
+        return ret, data
+
+    return True, [[row[0], row[1], float(row[2])] for row in data]
@@ -0,0 +1,216 @@
+import os
+import pathlib
+import hashlib
+import shutil
+import tempfile
+
+import numpy
+import pandas
+
+from config.setting import FILE_PATH, CACHE_DIR, CACHE_SIZE
+from common.log import get_logger
+
+
+# It's a class that keeps the parsed columns of the cycler files of a task as .npy files
+class ColumnCache(object):
+    def __init__(self, cache_path, size=CACHE_SIZE):
+        """
+        The cache lives in <task>/.cache/<kind>, one directory per file content, one .npy per column.
+
+        :param cache_path: the directory of the cache
+        :param size: the size budget of the cache in bytes, the least recently used entries are
+        evicted beyond it
+        """
+
+        self.cache_path = cache_path
+        self.size = size
+
+
+    @classmethod
+    def for_file(cls, file_path, kind):
+        """
+        It returns the cache of the task the file belongs to, or None if the file is not under FILE_PATH
+
+        :param file_path: the path to the cycler file
+        :param kind: the kind of the cache, such as "csv" or "dat"
+        """
+
+        rel_path = os.path.relpath(os.path.abspath(file_path), os.path.abspath(FILE_PATH))
+
+        if rel_path.startswith(os.pardir) or os.sep not in rel_path:
+            return None
+
+        return cls(os.path.join(FILE_PATH, rel_path.split(os.sep)[0], CACHE_DIR, kind))
+
+
+    def read(self, file_path, usecols, reader):
+        """
+        It returns the columns of the file from the cache, and parses only the missing columns with the
+        reader before storing them
+
+        :param file_path: the path to the cycler file
+        :param usecols: the columns to return
+        :param reader: a function that takes a list of columns and parses them from the file
+        :return: A DataFrame.
+        """
+
+        try:
+            entry_path = self._entry(file_path)
+        except OSError:
+            return reader(usecols)
+
+        columns = {}
+        missing = []
+
+        for column in usecols:
+            column_file = os.path.join(entry_path, self._column_name(column))
+
+            if os.path.exists(column_file):
+                try:
+                    columns[column] = numpy.load(column_file, allow_pickle=True)
+                    continue
+                except Exception:
+                    pass
+
+            missing.append(column)
+
+        if missing:
+            df = reader(missing)
+
+            for column in missing:
+                columns[column] = df[column].to_numpy()
+
+            try:
+                self._save(entry_path, {column: columns[column] for column in missing})
+            except Exception as e:
+                logger = get_logger()
+                logger.warning(f"Caught exception: {e.__doc__}({e})")
+        else:
+            os.utime(entry_path)
+
+        return pandas.DataFrame({column: columns[column] for column in usecols})
+
+
+    def chunks(self, file_path, usecols, chunksize):
+        """
+        It returns the columns of the file in chunks of rows from memory mapped .npy files, or None if
+        one of the columns is not cached yet
+
+        :param file_path: the path to the cycler file
+        :param usecols: the columns to return
+        :param chunksize: the number of rows of every chunk
+        :return: A generator of DataFrames.
+        """
+
+        try:
+            entry_path = self._entry(file_path)
+        except OSError:
+            return None
+
+        columns = {}
+
+        for column in usecols:
+            try:
+                columns[column] = numpy.load(os.path.join(entry_path, self._column_name(column)), mmap_mode='r', allow_pickle=True)
+            except (OSError, ValueError):
+                return None
+
+        os.utime(entry_path)
+
+        rows = min(len(values) for values in columns.values())
+
+        def generator():
+            for start in range(0, rows, chunksize):
+                yield pandas.DataFrame({column: numpy.asarray(values[start: start + chunksize]) for column, values in columns.items()})
+
+        return generator()
+
+
+    def _entry(self, file_path):
+        """
+        It returns the cache directory for the content of the file. The content hash is only computed
+        when the size or mtime of the file changed since it was last seen.
+
+        :param file_path: the path to the cycler file
+        """
+
+        stat = os.stat(file_path)
+
+        stat_key = hashlib.md5(f"{os.path.abspath(file_path)}:{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8')).hexdigest()
+        stat_file = os.path.join(self.cache_path, "stat", stat_key)
+
+        try:
+            with open(stat_file, "r") as f:
+                content_key = f.read().strip()
+        except OSError:
+            md5 = hashlib.md5()
+
+            with open(file_path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    md5.update(block)
+
+            content_key = md5.hexdigest()
+
+            os.makedirs(os.path.dirname(stat_file), exist_ok=True)
+            self._write(stat_file, lambda f: f.write(content_key.encode('utf-8')))
+
+        return os.path.join(self.cache_path, "data", content_key)
+
+
+    def _save(self, entry_path, columns):
+        os.makedirs(entry_path, exist_ok=True)
+
+        for column, values in columns.items():
+            self._write(os.path.join(entry_path, self._column_name(column)), lambda f: numpy.save(f, values, allow_pickle=True))
+
+        self.evict()
+
+
+    def _write(self, file_path, write):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix=".tmp")
+
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+
+            os.replace(tmp_path, file_path)
+        except Exception:
+            pathlib.Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+
+    def _column_name(self, column):
+        return hashlib.md5(column.encode('utf-8')).hexdigest() + ".npy"
+
+
+    def evict(self):
+        """
+        It removes the least recently used entries until the cache fits in its size budget
+        """
+
+        data_path = os.path.join(self.cache_path, "data")
+
+        if not os.path.isdir(data_path):
+            return
+
+        entries = []
+        total = 0
+
+        with os.scandir(data_path) as data_it:
+            for data_entry in data_it:
+                if data_entry.is_dir():
+                    size = sum(f.stat().st_size for f in os.scandir(data_entry.path) if f.is_file())
+                    entries.append([data_entry.stat().st_mtime, size, data_entry.path])
+                    total += size
+
+        if total <= self.size:
+            return
+
+        entries.sort(key=lambda x: x[0])
+
+        for _, size, entry_path in entries:
+            if total <= self.size:
+                break
+
+            shutil.rmtree(entry_path, ignore_errors=True)
+            total -= size
@@ -1,15 +1,9 @@
 import statistics
-import json
 import re
 import os
 
-import pandas
-from joblib import Parallel, delayed
-from joblib.parallel import cpu_count
-
 from app.item import DefaultItem
-from config.setting import DatabaseTable
-from common.postgres_driver import create_conn, fetch_one
+from app.reader import read_segments, read_tail_segments
 from common.log import get_logger
 
 
@@ -21,45 +15,38 @@ class CellRtempDchgCapacity(DefaultItem):
         indicating whether the operation is successful. The second element is the result of the operation.
         """
 
-        def extract_file(csv_file, rated_capacity):
+        def extract_file(csv_file, gbt, rated_capacity):
             """
             The function extracts the data from the csv file and returns a list of lists
             
             :param csv_file: The name of the CSV file to be processed
+            :param gbt: the gbt of the item, passed in so that the item is not sent to the worker pool
             :param rated_capacity: The rated capacity of the battery in kWh
             """
 
             try:
-                if self.gbt == "GB 38031":
-                    df = pandas.read_csv(csv_file, skiprows=13, encoding='gbk', usecols=['Cycle', 'Step', 'Step time, S', 'Power, W', 'Amp-Hours, AH'])
-                    df = df.dropna(how='any')
+                if gbt == "GB 38031":
+                    index = read_segments(csv_file, ['Cycle', 'Step', 'Step time, S', 'Power, W', 'Amp-Hours, AH'], accumulators=['Amp-Hours, AH'])
 
-                    max_cycle = int(df[df['Power, W'] < 0]['Cycle'].max())
-                    dchg_step = int(df[(df['Power, W'] < 0) & (df.Cycle == max_cycle)]["Step"].max())
+                    max_cycle, dchg_step = index.last_discharge()
 
                     dchg = []
 
                     for i in range(2, max_cycle + 1):
-                        max_index = df[(df.Cycle == i) & (df.Step == dchg_step)]['Step time, S'].astype('float64').idxmax()
-
-                        dchg.append(round(-1 * df.loc[max_index, 'Amp-Hours, AH'], 2))
+                        dchg.append(round(-1 * index.end_value(i, dchg_step, column='Amp-Hours, AH'), 2))
 
                     return True, [csv_file.split('/')[-3]] + dchg + [f"{(dchg[-1] - dchg[-2]) / rated_capacity:.2%}"]
                 else:
-                    df = pandas.read_csv(csv_file, skiprows=13, encoding='gbk', usecols=['Cycle', 'Step', 'Step time, S', 'Voltage, V', 'Power, W', 'Amp-Hours, AH'])
-                    df = df.dropna(how='any')
+                    index = read_tail_segments(csv_file, ['Cycle', 'Step', 'Step time, S', 'Voltage, V', 'Power, W', 'Amp-Hours, AH'], 3, keep=1, accumulators=['Amp-Hours, AH'])
 
-                    max_cycle = int(df[df['Power, W'] < 0]['Cycle'].max())
-                    dchg_step = int(df[(df['Power, W'] < 0) & (df.Cycle == max_cycle)]["Step"].max())
+                    max_cycle, dchg_step = index.last_discharge()
 
                     dchg = []
 
                     for i in range(2, -1, -1):
-                        max_index = df[(df.Cycle == max_cycle - i) & (df.Step == dchg_step)]['Step time, S'].astype('float64').idxmax()
-
-                        dchg.append(round(-1 * df.loc[max_index, 'Amp-Hours, AH'], 2))
+                        dchg.append(round(-1 * index.end_value(max_cycle - i, dchg_step, column='Amp-Hours, AH'), 2))
 
-                    df = df[(df.Cycle == max_cycle) & (df.Step == dchg_step)][['Amp-Hours, AH', "Voltage, V"]]
+                    df = index.rows(max_cycle, dchg_step, columns=['Amp-Hours, AH', "Voltage, V"])
                     df['Amp-Hours, AH'] = (-1 * df['Amp-Hours, AH']).round(2)
 
                     return True, [csv_file.split('/')[-3]] + dchg + [round(statistics.mean(dchg), 2)] + [df.to_numpy().tolist()]
@@ -69,19 +56,11 @@ class CellRtempDchgCapacity(DefaultItem):
 
                 return False, f"Caught exception: {e.__doc__}({e})"
 
-        sql = f"SELECT value FROM {DatabaseTable.PRODUCT} WHERE task_id='{self.task_id}' AND category='{self.category}' AND name='额定容量（Ah）'"
-
-        with create_conn() as conn:
-            ret, rated_capacity = fetch_one(conn, sql)
+        ret, rated_capacity = self.context.get_product_number(self.category, '额定容量（Ah）')
 
         if ret is False:
             return ret, rated_capacity
 
-        if rated_capacity is None or rated_capacity[0] is None:
-            return False, "Can not find 额定容量（Ah）."
-
-        rated_capacity = float(rated_capacity[0])
-
         csv_files = []
 
         with os.scandir(self.item_path) as item_it:
@@ -92,7 +71,7 @@ class CellRtempDchgCapacity(DefaultItem):
                             if data_entry.name.endswith(".csv"):
                                 csv_files.append(data_entry.path)
 
-        extract_results = Parallel(n_jobs=cpu_count())(delayed(extract_file)(csv_file, rated_capacity) for csv_file in csv_files)
+        extract_results = self.extract_files(extract_file, [(csv_file, self.gbt, rated_capacity) for csv_file in csv_files])
 
         if len(extract_results) == 0 or any([result[0] is False for result in extract_results]):
             return True, {}
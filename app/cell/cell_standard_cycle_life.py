@@ -1,18 +1,14 @@
-import json
 import re
 import os
 
-import pandas
-from joblib import Parallel, delayed
-from joblib.parallel import cpu_count
-
 from app.item import DefaultItem
-from config.setting import DatabaseTable
-from common.postgres_driver import create_conn, fetch_one
+from app.reader import read_segments
 from common.log import get_logger
 
 
 class CellStandardCycleLife(DefaultItem):
+    prerequisites = ("室温放电容量",)
+
     def preprocess(self):
         """
         It reads a bunch of csv files, extracts some data from them, and returns a dictionary
@@ -29,18 +25,14 @@ class CellStandardCycleLife(DefaultItem):
             """
 
             try:
-                df = pandas.read_csv(csv_file, skiprows=13, encoding='gbk', usecols=['Cycle', 'Step', 'Step time, S', 'Voltage, V', 'Power, W', 'Amp-Hours, AH'])
-                df = df.dropna(how='any')
+                index = read_segments(csv_file, ['Cycle', 'Step', 'Step time, S', 'Voltage, V', 'Power, W', 'Amp-Hours, AH'], accumulators=['Amp-Hours, AH'])
 
-                max_cycle = int(df[df['Power, W'] < 0]['Cycle'].max())
-                dchg_step = int(df[(df['Power, W'] < 0) & (df.Cycle == max_cycle)]["Step"].max())
+                max_cycle, dchg_step = index.last_discharge()
 
                 dchg = []
 
                 for i in range(2, max_cycle+1):
-                    max_index = df[(df.Cycle == i) & (df.Step == dchg_step)]['Step time, S'].astype('float64').idxmax()
-
-                    dchg.append(round(-1 * df.loc[max_index, 'Amp-Hours, AH'], 2))
+                    dchg.append(round(-1 * index.end_value(i, dchg_step, column='Amp-Hours, AH'), 2))
 
                 if max_cycle > 1000:
                     return True, [csv_file.split('/')[-3]] + [round(dchg[99], 2), round(dchg[199], 2), round(dchg[299], 2), round(dchg[399], 2), round(dchg[499], 2), round(dchg[999], 2)] + [round(rdc, 2)] + [f"{dchg[499] / rdc:.2%}", f"{dchg[999] / rdc:.2%}"] + [[[i+1, ah] for i, ah in enumerate(dchg)]]
@@ -53,21 +45,11 @@ class CellStandardCycleLife(DefaultItem):
                 return False, f"Caught exception: {e.__doc__}({e})"
 
 
-        sql = f"SELECT result FROM {DatabaseTable.STAT} WHERE task_id='{self.task_id}' AND gbt='{self.gbt}' AND category='{self.category}' AND item='室温放电容量'"
-
-        with create_conn() as conn:
-            ret, mrdc = fetch_one(conn, sql)
+        ret, mrdc = self.context.get_sample_capacities(self.gbt, self.category)
 
         if ret is False:
             return ret, mrdc
 
-        if mrdc is None or mrdc[0] is None:
-            return False, "Please parse item(室温放电容量) first."
-
-        mrdc = json.loads(mrdc[0])
-
-        mrdc = {row[0]: row[-1] for row in mrdc["table"][1:]}
-
         csv_files = []
 
         with os.scandir(self.item_path) as item_it:
@@ -78,7 +60,7 @@ class CellStandardCycleLife(DefaultItem):
                             if data_entry.name.endswith(".csv"):
                                 csv_files.append(data_entry.path)
 
-        extract_results = Parallel(n_jobs=cpu_count())(delayed(extract_file)(csv_file, mrdc[csv_file.split('/')[-3]]) for csv_file in csv_files)
+        extract_results = self.extract_files(extract_file, [(csv_file, mrdc[csv_file.split('/')[-3]]) for csv_file in csv_files])
 
         if len(extract_results) == 0 or any([result[0] is False for result in extract_results]):
             return True, {}
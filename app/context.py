@@ -0,0 +1,250 @@
+import os
+import re
+import uuid
+import threading
+from collections import OrderedDict
+
+from config.setting import FILE_PATH, CACHE_DIR, CONTEXT_SIZE, DatabaseTable
+from common.postgres_driver import create_conn, fetch_all, load_json
+
+
+# It's a class that loads the product info and the item results of a task once for all of its items
+class TaskContext(object):
+    _contexts = OrderedDict()
+    _contexts_lock = threading.Lock()
+
+    def __init__(self, task_id):
+        """
+        The product info and the item results are loaded on first use, with one query each. Use
+        TaskContext.get to share one context per task in the process.
+
+        :param task_id: the task id
+        """
+
+        self.task_id = task_id
+
+        self.lock = threading.Lock()
+        self.version = self._read_version()
+        self.products = None
+        self.results = None
+        self.capacities = {}
+
+
+    @staticmethod
+    def version_file(task_id):
+        return os.path.join(FILE_PATH, task_id, CACHE_DIR, "context.version")
+
+
+    def _read_version(self):
+        try:
+            with open(TaskContext.version_file(self.task_id), "r") as f:
+                return f.read()
+        except OSError:
+            return None
+
+
+    @classmethod
+    def get(cls, task_id):
+        """
+        It returns the context of a task kept by this process, or a new one. A kept context is dropped
+        when any process wrote to the task since it was loaded, see invalidate.
+
+        :param task_id: the task id
+        :return: A TaskContext.
+        """
+
+        with cls._contexts_lock:
+            context = cls._contexts.pop(task_id, None)
+
+            if context is None or context.version != context._read_version():
+                context = cls(task_id)
+
+            cls._contexts[task_id] = context
+
+            while len(cls._contexts) > CONTEXT_SIZE:
+                cls._contexts.popitem(last=False)
+
+        return context
+
+
+    @classmethod
+    def invalidate(cls, task_id, keep=None):
+        """
+        It tells every process that the product info or the item results of a task changed, by
+        replacing the version file of the task
+
+        :param task_id: the task id
+        :param keep: a context that is already up to date, it stays valid in this process
+        """
+
+        version_file = TaskContext.version_file(task_id)
+
+        try:
+            os.makedirs(os.path.dirname(version_file), exist_ok=True)
+
+            tmp_file = f"{version_file}.{os.getpid()}.{threading.get_ident()}"
+
+            with open(tmp_file, "w") as f:
+                f.write(uuid.uuid4().hex)
+
+            os.replace(tmp_file, version_file)
+        except OSError:
+            pass
+
+        if keep is not None:
+            keep.version = keep._read_version()
+
+
+    def _load_products(self):
+        sql = f"SELECT category, name, value FROM {DatabaseTable.PRODUCT} WHERE task_id='{self.task_id}'"
+
+        with create_conn() as conn:
+            ret, data = fetch_all(conn, sql)
+
+        if ret is False:
+            return ret, data
+
+        return True, {(row[0], row[1]): row[2] for row in data}
+
+
+    def _load_results(self):
+        sql = f"SELECT gbt, category, item, result FROM {DatabaseTable.STAT} WHERE task_id='{self.task_id}' AND result IS NOT NULL"
+
+        with create_conn() as conn:
+            ret, data = fetch_all(conn, sql)
+
+        if ret is False:
+            return ret, data
+
+        return True, {(row[0], row[1], row[2]): load_json(row[3]) for row in data}
+
+
+    def get_product_value(self, category, name):
+        """
+        It returns the value of a product info field of the task
+
+        :param category: the category of the product, such as SampleCategory.CELL
+        :param name: the name of the field, such as '额定容量（Ah）'
+        :return: True, value or None
+        """
+
+        with self.lock:
+            if self.products is None:
+                ret, products = self._load_products()
+                if ret is False:
+                    return ret, products
+
+                self.products = products
+
+            return True, self.products.get((category, name))
+
+
+    def get_product_number(self, category, name):
+        """
+        It returns the number of a product info field, such as 100.0 for '100Ah', 1200.0 for '1,200Ah'
+        or -20.0 for '-20℃'
+
+        :param category: the category of the product
+        :param name: the name of the field, such as '额定容量（Ah）'
+        :return: True, float
+        """
+
+        ret, value = self.get_product_value(category, name)
+
+        if ret is False:
+            return ret, value
+
+        number = re.search(r'[-+]?\d+(,\d{3})*(\.\d+)?', value) if value is not None else None
+
+        if number is None:
+            return False, f"Can not find {name}."
+
+        return True, float(number.group().replace(',', ''))
+
+
+    def get_product_choice(self, category, name):
+        """
+        It returns the checked option of a product info field written as check boxes, such as
+        '能量型' for '■能量型□功率型'
+
+        :param category: the category of the product
+        :param name: the name of the field, such as '产品类型'
+        :return: True, option
+        """
+
+        ret, value = self.get_product_value(category, name)
+
+        if ret is False:
+            return ret, value
+
+        if value is None:
+            return False, f"Can not find {name}."
+
+        return True, value.split('■')[-1].split('□')[0].strip()
+
+
+    def get_item_result(self, gbt, category, item):
+        """
+        It returns the parse result of an item of the task
+
+        :param gbt: the gbt of the item
+        :param category: the category of the item
+        :param item: the item
+        :return: True, result dictionary or None
+        """
+
+        with self.lock:
+            if self.results is None:
+                ret, results = self._load_results()
+                if ret is False:
+                    return ret, results
+
+                self.results = results
+
+            return True, self.results.get((gbt, category, item))
+
+
+    def get_sample_capacities(self, gbt, category, item='室温放电容量'):
+        """
+        It returns the mean discharge capacity of every sample, the last column of the table of the
+        室温放电容量 item, which the other items of the category compare to
+
+        :param gbt: the gbt of the item
+        :param category: the category of the item
+        :param item: the item the capacities are read from
+        :return: True, {sample: capacity}
+        """
+
+        with self.lock:
+            capacities = self.capacities.get((gbt, category, item))
+
+        if capacities is not None:
+            return True, capacities
+
+        ret, result = self.get_item_result(gbt, category, item)
+
+        if ret is False:
+            return ret, result
+
+        if result is None:
+            return False, f"Please parse item({item}) first."
+
+        capacities = {row[0]: row[-1] for row in result["table"][1:]}
+
+        with self.lock:
+            self.capacities[(gbt, category, item)] = capacities
+
+        return True, capacities
+
+
+    def set_item_result(self, gbt, category, item, result):
+        """
+        It records the result of an item that was just parsed, so that the items depending on it do not
+        read it back from the database
+        """
+
+        with self.lock:
+            if self.results is not None:
+                self.results[(gbt, category, item)] = result
+
+            self.capacities.pop((gbt, category, item), None)
@@ -0,0 +1,138 @@
+import os
+import hashlib
+import tempfile
+import pathlib
+
+import numpy
+
+from config.setting import FILE_PATH, CACHE_DIR
+
+
+# the curves are kept next to the data of the item, not under the .cache of the task, which can be
+# deleted at any time
+CURVE_FILE = ".curve.npz"
+
+
+def curve_path(task_id, gbt, category, item):
+    return os.path.join(FILE_PATH, task_id, gbt, category, item, CURVE_FILE)
+
+
+def _legacy_curve_path(task_id, gbt, category, item):
+    key = hashlib.md5(f"{gbt}/{category}/{item}".encode('utf-8')).hexdigest()
+
+    return os.path.join(FILE_PATH, task_id, CACHE_DIR, "curve", f"{key}.npz")
+
+
+def save_graph(task_id, gbt, category, item, graph):
+    """
+    It saves the curves of the graph of an item result as float32 arrays in one .npz file in the item
+    directory, and returns the graph with the curves replaced by their ids
+
+    :param task_id: the task id
+    :param gbt: the gbt of the item
+    :param category: the category of the item
+    :param item: the item
+    :param graph: [{title: [x label, y label]}, {"keys": [...]}, {"values": [curve, ...]}]
+    :return: [{title: [x label, y label]}, {"keys": [...]}, {"curves": [id, ...]}], or the graph as
+    is when its curves are not numeric arrays.
+    """
+
+    if len(graph) < 3 or "values" not in graph[2]:
+        return graph
+
+    try:
+        arrays = {f"c{i}": numpy.asarray(curve, dtype='float32') for i, curve in enumerate(graph[2]["values"])}
+    except (TypeError, ValueError):
+        return graph
+
+    curve_ids = list(arrays)
+
+    # the integer columns, such as the cycle numbers, are kept as integers too
+    for curve_id, curve in zip(curve_ids, graph[2]["values"]):
+        if arrays[curve_id].ndim != 2 or arrays[curve_id].size == 0:
+            continue
+
+        columns = [column for column, values in enumerate(zip(*curve)) if all(isinstance(v, (int, numpy.integer)) and not isinstance(v, bool) for v in values)]
+
+        if columns:
+            arrays[f"{curve_id}_int"] = numpy.asarray([[row[column] for column in columns] for row in curve], dtype='int64')
+            arrays[f"{curve_id}_int_columns"] = numpy.asarray(columns, dtype='int64')
+
+    file_path = curve_path(task_id, gbt, category, item)
+
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), prefix=CURVE_FILE, suffix=".tmp")
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            numpy.savez(f, **arrays)
+
+        os.replace(tmp_path, file_path)
+    except Exception:
+        pathlib.Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+    return [graph[0], graph[1], {"curves": curve_ids}]
+
+
+def _to_list(array, int_array=None, int_columns=None):
+    """
+    It converts a float32 array back to lists of floats, rounded to the 7 significant digits float32
+    holds, so that 3.21 is not sent as 3.2100000381469727. The integer columns saved along with it
+    are put back as integers.
+    """
+
+    values = array.astype('float64')
+
+    if values.ndim == 2 and values.size > 0:
+        scale = numpy.nanmax(numpy.abs(values), axis=0)
+        scale[~numpy.isfinite(scale) | (scale == 0)] = 1
+
+        for column, decimals in enumerate(numpy.maximum(0, 7 - numpy.ceil(numpy.log10(scale))).astype('int64')):
+            values[:, column] = values[:, column].round(decimals)
+
+    values = values.tolist()
+
+    if int_array is not None:
+        int_columns = int_columns.tolist()
+
+        for row, int_row in zip(values, int_array.tolist()):
+            for column, value in zip(int_columns, int_row):
+                row[column] = value
+
+    return values
+
+
+def load_graph(task_id, gbt, category, item, graph):
+    """
+    It returns the graph of an item result with its curves loaded from the curve store, the store of
+    the items parsed before it moved to the item directory is read too
+
+    :param task_id: the task id
+    :param gbt: the gbt of the item
+    :param category: the category of the item
+    :param item: the item
+    :param graph: the graph saved in stat_info, with the curves inline or referenced by id
+    :return: True, graph or False, message when the curves are missing and the item must be parsed
+    again
+    """
+
+    if len(graph) < 3 or "curves" not in graph[2]:
+        return True, graph
+
+    for file_path in (curve_path(task_id, gbt, category, item), _legacy_curve_path(task_id, gbt, category, item)):
+        try:
+            with numpy.load(file_path) as data:
+                values = [_to_list(data[curve_id], data.get(f"{curve_id}_int"), data.get(f"{curve_id}_int_columns")) for curve_id in graph[2]["curves"]]
+        except (OSError, KeyError, ValueError):
+            continue
+
+        return True, [graph[0], graph[1], {"values": values}]
+
+    return False, f"The curves of {item} are missing, please parse it again."
+
+
+def delete_graph(task_id, gbt, category, item):
+    pathlib.Path(curve_path(task_id, gbt, category, item)).unlink(missing_ok=True)
+    pathlib.Path(_legacy_curve_path(task_id, gbt, category, item)).unlink(missing_ok=True)
@@ -0,0 +1,104 @@
+import copy
+
+import numpy
+
+from config.setting import GRAPH_POINTS
+
+
+def lttb(points, threshold=GRAPH_POINTS):
+    """
+    It downsamples a curve with Largest-Triangle-Three-Buckets: the first and last points are kept,
+    the points in between are split into threshold - 2 buckets, and from every bucket the point that
+    makes the largest triangle with the point kept before it and the mean of the next bucket is kept
+
+    :param points: a list of [x, y]
+    :param threshold: the number of points to keep, the curve is returned as is if it has fewer
+    :return: A list of [x, y].
+    """
+
+    if threshold is None or threshold < 3 or len(points) <= threshold:
+        return points
+
+    data = numpy.asarray(points, dtype='float64')
+
+    edges = numpy.linspace(1, len(data) - 1, threshold - 1).astype('int64')
+
+    selected = [0]
+    a = 0
+
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+
+        if i + 2 < len(edges):
+            next_mean = data[end: edges[i + 2]].mean(axis=0)
+        else:
+            next_mean = data[-1]
+
+        bucket = data[start: end]
+
+        area = numpy.abs((data[a, 0] - next_mean[0]) * (bucket[:, 1] - data[a, 1]) - (data[a, 0] - bucket[:, 0]) * (next_mean[1] - data[a, 1]))
+
+        a = start + int(area.argmax())
+        selected.append(a)
+
+    selected.append(len(data) - 1)
+
+    return [points[i] for i in selected]
+
+
+def match_key(key, full_keys):
+    """
+    It tells whether the curve of a key is one of full_keys. A sample matches its own curves too, whose
+    keys are "<sample>-<curve>" when an item draws several curves per sample.
+
+    :param key: the key of a curve
+    :param full_keys: the keys of curves, or the names of samples
+    :return: True or False.
+    """
+
+    return any(key == full_key or key.startswith(f"{full_key}-") for full_key in full_keys)
+
+
+def has_key(graph, full_key):
+    """
+    It tells whether a graph has a curve of full_key, see match_key
+
+    :param graph: [{title: [x label, y label]}, {"keys": [...]}, {"values": [curve, ...]}]
+    :param full_key: the key of a curve, or the name of a sample
+    :return: True or False.
+    """
+
+    keys = graph[1].get("keys", []) if len(graph) > 1 else []
+
+    return any(match_key(key, (full_key,)) for key in keys)
+
+
+def downsample_graph(graph, threshold=GRAPH_POINTS, full_keys=()):
+    """
+    It downsamples every curve of the graph of an item result
+
+    :param graph: [{title: [x label, y label]}, {"keys": [...]}, {"values": [curve, ...]}]
+    :param threshold: the number of points to keep per curve, None for full resolution
+    :param full_keys: the keys or the samples whose curves are returned at full resolution, see match_key
+    :return: A new graph, the given one is not modified.
+    """
+
+    if len(graph) < 3 or threshold is None:
+        return graph
+
+    graph = copy.copy(graph)
+
+    keys = graph[1].get("keys", [])
+    values = graph[2].get("values", [])
+
+    curves = []
+
+    for i, curve in enumerate(values):
+        if (i < len(keys) and match_key(keys[i], full_keys)) or not isinstance(curve, list) or len(curve) == 0 or not isinstance(curve[0], list):
+            curves.append(curve)
+        else:
+            curves.append(lttb(curve, threshold))
+
+    graph[2] = dict(graph[2], values=curves)
+
+    return graph
@@ -1,16 +1,48 @@
 import os
 import re
+import sys
 import pathlib
 import copy
-import json
+import pickle
+import hashlib
+import tempfile
 
-from config.setting import FILE_PATH, DatabaseTable, TestDataError
-from common.postgres_driver import create_conn, fetch_one
+from config.setting import FILE_PATH, CACHE_DIR, DatabaseTable, TestDataError
+from common.postgres_driver import create_conn, fetch_one, load_json
+from app.manifest import load_manifest
+from app.context import TaskContext
+from app.pool import run_parallel
+from app.timing import timed_call, log_timing
+from common.log import get_logger
+
+
+# the modules the extract functions of the items read their files with, a change to any of them drops the
+# saved extract results
+EXTRACT_MODULES = ("app.reader", "app.segment", "app.cache")
+
+_source_hashes = {}
+
+
+def _source_hash(module_name):
+    """
+    It returns the md5 of the source file of a module, once per process
+    """
+
+    if module_name not in _source_hashes:
+        __import__(module_name)
+
+        with open(sys.modules[module_name].__file__, "rb") as f:
+            _source_hashes[module_name] = hashlib.md5(f.read()).hexdigest()
+
+    return _source_hashes[module_name]
 
 
 # It's a class that has a default value for any attribute that doesn't exist
 class DefaultItem(object):
-    def __init__(self, task_id, gbt, category, item):
+    # the items of the same gbt and category whose results preprocess() reads
+    prerequisites = ()
+
+    def __init__(self, task_id, gbt, category, item, context=None):
         """
         The function takes in a task_id, gbt, category, and item and then creates a path to the item.
         
@@ -18,6 +50,7 @@ class DefaultItem(object):
         :param gbt: the name of the folder
         :param category: the category of the item
         :param item: the name of the file
+        :param context: the TaskContext shared by the items of a task, the one kept by the process if None
         """
 
         self.task_id = task_id
@@ -25,12 +58,118 @@ class DefaultItem(object):
         self.category = category
         self.item = item
         self.item_path = os.path.join(FILE_PATH, self.task_id, self.gbt, self.category, self.item)
+        self.context = context if context is not None else TaskContext.get(task_id)
 
 
     def preprocess(self):
         return True, {}
 
 
+    def _fingerprint(self, path):
+        """
+        It returns the path, size and mtime of a file, or of every file under a directory
+        """
+
+        if os.path.isfile(path):
+            stat = os.stat(path)
+
+            return f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+        fingerprint = []
+
+        for dir_path, dir_names, file_names in os.walk(path):
+            dir_names.sort()
+
+            for file_name in sorted(file_names):
+                stat = os.stat(os.path.join(dir_path, file_name))
+                fingerprint.append(f"{os.path.join(dir_path, file_name)}:{stat.st_size}:{stat.st_mtime_ns}")
+
+        return "|".join(fingerprint)
+
+
+    def extract_files(self, extract_file, args_list):
+        """
+        It runs extract_file over every tuple of arguments on the shared worker pool, like run_parallel,
+        but reuses the results saved by the last parse for the files that did not change since. The
+        first argument of every tuple is the file or directory that is extracted.
+
+        :param extract_file: the extract function of the item
+        :param args_list: a list of tuples of arguments
+        :return: The results, in the order of args_list.
+        """
+
+        extract_path = os.path.join(FILE_PATH, self.task_id, CACHE_DIR, "extract", hashlib.md5(f"{self.gbt}/{self.category}/{self.item}".encode('utf-8')).hexdigest())
+
+        def code_hash(code, md5):
+            md5.update(code.co_code)
+            md5.update(repr(code.co_names).encode('utf-8'))
+
+            for const in code.co_consts:
+                if hasattr(const, "co_code"):
+                    code_hash(const, md5)
+                else:
+                    md5.update(repr(const).encode('utf-8'))
+
+            return md5
+
+        md5 = code_hash(extract_file.__code__, hashlib.md5())
+
+        # the values extract_file closes over, and the source of the helpers it calls
+        for cell in extract_file.__closure__ or ():
+            md5.update(repr(cell.cell_contents).encode('utf-8'))
+
+        for module_name in EXTRACT_MODULES + (type(self).__module__,):
+            md5.update(_source_hash(module_name).encode('utf-8'))
+
+        version = md5.hexdigest()
+
+        results = [None] * len(args_list)
+        keys = []
+        missing = []
+
+        for i, args in enumerate(args_list):
+            key = hashlib.md5(f"{type(self).__name__}:{version}:{self._fingerprint(args[0])}:{args[1:]!r}".encode('utf-8')).hexdigest()
+            keys.append(key)
+
+            try:
+                with open(os.path.join(extract_path, f"{key}.pkl"), "rb") as f:
+                    results[i] = pickle.load(f)
+            except Exception:
+                missing.append(i)
+
+        if missing:
+            for i, (result, stats) in zip(missing, run_parallel(timed_call, [(extract_file,) + tuple(args_list[i]) for i in missing])):
+                results[i] = result
+
+                log_timing("extract_file", task_id=self.task_id, gbt=self.gbt, category=self.category, item=self.item, file=os.path.basename(str(args_list[i][0])), ok=result[0] is not False, **stats)
+
+        log_timing("extract", task_id=self.task_id, gbt=self.gbt, category=self.category, item=self.item, files=len(args_list), cached=len(args_list) - len(missing))
+
+        try:
+            os.makedirs(extract_path, exist_ok=True)
+
+            for i in missing:
+                if results[i][0] is False:
+                    continue
+
+                fd, tmp_path = tempfile.mkstemp(dir=extract_path, suffix=".tmp")
+
+                with os.fdopen(fd, "wb") as f:
+                    pickle.dump(results[i], f)
+
+                os.replace(tmp_path, os.path.join(extract_path, f"{keys[i]}.pkl"))
+
+            with os.scandir(extract_path) as extract_it:
+                for extract_entry in extract_it:
+                    if extract_entry.name[:-len(".pkl")] not in keys:
+                        os.remove(extract_entry.path)
+        except Exception as e:
+            logger = get_logger()
+            logger.warning(f"Caught exception: {e.__doc__}({e})")
+
+        return results
+
+
     def get_stat(self):
         """
         It takes a path to a directory, and returns a dictionary of the files in that directory and its
@@ -41,19 +180,16 @@ class DefaultItem(object):
         data = {"files": []}
         files_dict = {}
 
-        with os.scandir(self.item_path) as sample_it:
-            for sample_entry in sample_it:
-                if sample_entry.is_dir():
-                    for p in pathlib.Path(sample_entry.path).glob('**/*'):
-                        if p.is_file():
-                            files_dict.setdefault(sample_entry.name, {})
-                            dir_name = '-'.join(p.as_posix()[len(sample_entry.path)+1 : ].split('/')[:-1])
-                            files_dict[sample_entry.name].setdefault(dir_name, [])
+        manifest = load_manifest(self.task_id, self.gbt, self.category, self.item)
 
-                            if p.suffix in {".png", ".PNG", ".jpg", ".JPG", ".jpeg", ".JPEG", ".bmp", ".BMP", ".mp4", ".MP4"}:
-                                files_dict[sample_entry.name][dir_name].append([p.name, p.as_posix(), "yes"])
-                            else:
-                                files_dict[sample_entry.name][dir_name].append([p.name, p.as_posix(), "no"])
+        for f in manifest["files"]:
+            parts = f["path"].split('/')
+
+            files_dict.setdefault(f["sample"], {})
+            dir_name = '-'.join(parts[1:-1])
+            files_dict[f["sample"]].setdefault(dir_name, [])
+
+            files_dict[f["sample"]][dir_name].append([parts[-1], os.path.join(self.item_path, f["path"]), "yes" if f["media"] else "no"])
 
         index = list(files_dict)
         index.sort(key=lambda x: int(re.sub("\D", "", x)) if re.search("\d+", x) is not None else 0)
@@ -80,7 +216,7 @@ class DefaultItem(object):
             ret, result = fetch_one(conn, sql)
 
         if ret is True and result is not None and result[0] is not None:
-            data.update(json.loads(result[0]))
+            data.update(load_json(result[0]))
 
             data.setdefault("table", [])
             data.setdefault("list", [])
@@ -94,14 +230,12 @@ class DefaultItem(object):
         It returns the decision of the current state.
         """
 
-        with os.scandir(self.item_path) as sample_it:
-            for sample_entry in sample_it:
-                if sample_entry.is_dir():
-                    for dev in pathlib.Path(sample_entry.path).glob('**/*'):
-                        if dev.name == "初步判定结果":
-                            with os.scandir(dev.as_posix()) as data_it:
-                                for data_entry in data_it:
-                                    if data_entry.name.endswith(".txt"):
-                                        return True, pathlib.Path(data_entry.path).read_text(encoding='utf8')
+        manifest = load_manifest(self.task_id, self.gbt, self.category, self.item)
+
+        if manifest["decision"] is not None:
+            try:
+                return True, pathlib.Path(os.path.join(self.item_path, manifest["decision"])).read_text(encoding='utf8')
+            except OSError:
+                pass
 
         return True, ""
\ No newline at end of file
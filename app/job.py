@@ -0,0 +1,231 @@
+import os
+import time
+import socket
+import threading
+
+from config.setting import DatabaseTable, JOB_POLL_INTERVAL, JOB_HEARTBEAT, JOB_STALE
+from common.postgres_driver import create_conn, execute_sqls, fetch_one
+from common.log import get_logger
+
+
+# the gbt, category and item of a job that parses every item of its task
+TASK_JOB = ""
+
+JOB_TABLE_SQLS = [
+    f"""CREATE TABLE IF NOT EXISTS {DatabaseTable.JOB} (
+        job_id BIGSERIAL PRIMARY KEY,
+        task_id VARCHAR NOT NULL,
+        gbt VARCHAR NOT NULL,
+        category VARCHAR NOT NULL,
+        item VARCHAR NOT NULL,
+        status VARCHAR NOT NULL DEFAULT 'queued',
+        message TEXT,
+        worker VARCHAR,
+        create_time TIMESTAMP NOT NULL DEFAULT now(),
+        start_time TIMESTAMP,
+        heartbeat_time TIMESTAMP,
+        finish_time TIMESTAMP
+    )""",
+    f"ALTER TABLE {DatabaseTable.JOB} ADD COLUMN IF NOT EXISTS profile BOOLEAN NOT NULL DEFAULT false",
+    f"CREATE INDEX IF NOT EXISTS parse_job_status_idx ON {DatabaseTable.JOB}(status, job_id)",
+    # at most one queued or running job per item, submit_job relies on it. The queued jobs submitted
+    # twice before the key existed are cancelled first
+    f"""UPDATE {DatabaseTable.JOB} j SET status='cancelled', message='duplicate', finish_time=now()
+        WHERE j.status='queued' AND EXISTS (
+            SELECT 1 FROM {DatabaseTable.JOB} o
+            WHERE o.task_id=j.task_id AND o.gbt=j.gbt AND o.category=j.category AND o.item=j.item
+            AND o.status IN ('queued','running') AND (o.status='running' OR o.job_id < j.job_id)
+        )""",
+    f"CREATE UNIQUE INDEX IF NOT EXISTS parse_job_active_key ON {DatabaseTable.JOB}(task_id, gbt, category, item) WHERE status IN ('queued','running')"
+]
+
+
+def init_job_table():
+    """
+    It creates the parse job table if it does not exist
+    """
+
+    with create_conn() as conn:
+        return execute_sqls(conn, JOB_TABLE_SQLS)
+
+
+def submit_job(task_id, gbt, category, item, profile=False):
+    """
+    It queues a parse job for a test item, or returns the job that is already queued or running for it
+
+    :param task_id: the task id
+    :param gbt: the gbt of the item
+    :param category: the category of the item
+    :param item: the item to parse
+    :param profile: True to run the parse under cProfile, ignored when a job of the item is already
+    queued or running
+    :return: True, job_id
+    """
+
+    where = f"task_id='{task_id}' AND gbt='{gbt}' AND category='{category}' AND item='{item}'"
+
+    insert = f"""INSERT INTO {DatabaseTable.JOB}(task_id,gbt,category,item,profile) VALUES('{task_id}','{gbt}','{category}','{item}',{'true' if profile else 'false'})
+        ON CONFLICT (task_id,gbt,category,item) WHERE status IN ('queued','running') DO NOTHING RETURNING job_id"""
+
+    select = f"SELECT job_id FROM {DatabaseTable.JOB} WHERE {where} AND status IN ('queued','running') ORDER BY job_id DESC LIMIT 1"
+
+    # the job that holds the key may finish between the two statements, the insert is then tried again
+    for _ in range(3):
+        with create_conn() as conn:
+            ret, value = fetch_one(conn, insert)
+
+            if ret is True and value is None:
+                ret, value = fetch_one(conn, select)
+
+        if ret is False:
+            return ret, value
+
+        if value is not None:
+            return True, value[0]
+
+    return False, f"Can not submit a job for {gbt}/{category}/{item}."
+
+
+def query_job(job_id):
+    """
+    It returns the status of a parse job, along with the status of its item in the stat table
+
+    :param job_id: the job id
+    """
+
+    sql = f"""SELECT j.status, j.message, j.worker, j.create_time, j.start_time, j.finish_time, s.status
+        FROM {DatabaseTable.JOB} j LEFT JOIN {DatabaseTable.STAT} s
+        ON s.task_id=j.task_id AND s.gbt=j.gbt AND s.category=j.category AND s.item=j.item
+        WHERE j.job_id={int(job_id)}"""
+
+    with create_conn() as conn:
+        ret, value = fetch_one(conn, sql)
+
+    if ret is False:
+        return ret, value
+
+    if value is None:
+        return False, f"Can not find job {job_id}."
+
+    return True, {
+        "status": value[0],
+        "message": value[1] or "",
+        "worker": value[2] or "",
+        "create_time": value[3].isoformat() if value[3] is not None else "",
+        "start_time": value[4].isoformat() if value[4] is not None else "",
+        "finish_time": value[5].isoformat() if value[5] is not None else "",
+        "item_status": value[6] or ""
+    }
+
+
+def cancel_job(job_id):
+    """
+    It cancels a parse job that has not been claimed by a worker yet
+
+    :param job_id: the job id
+    """
+
+    sql = f"UPDATE {DatabaseTable.JOB} SET status='cancelled', finish_time=now() WHERE job_id={int(job_id)} AND status='queued' RETURNING job_id"
+
+    with create_conn() as conn:
+        ret, value = fetch_one(conn, sql)
+
+    if ret is False:
+        return ret, value
+
+    if value is not None:
+        return True, "cancelled"
+
+    ret, data = query_job(job_id)
+    if ret is False:
+        return ret, data
+
+    return False, f"Job {job_id} is {data['status']}."
+
+
+def claim_job(worker):
+    """
+    It claims the oldest queued job, or a running job whose worker stopped sending heartbeats. Rows
+    locked by other workers are skipped, so any number of workers can poll the table.
+
+    :param worker: the name of the worker
+    :return: True, (job_id, task_id, gbt, category, item, profile) or None
+    """
+
+    sql = f"""UPDATE {DatabaseTable.JOB} SET status='running', worker='{worker}', start_time=now(), heartbeat_time=now()
+        WHERE job_id = (
+            SELECT job_id FROM {DatabaseTable.JOB}
+            WHERE status='queued' OR (status='running' AND heartbeat_time < now() - interval '{JOB_STALE} seconds')
+            ORDER BY job_id
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING job_id, task_id, gbt, category, item, profile"""
+
+    with create_conn() as conn:
+        return fetch_one(conn, sql)
+
+
+def finish_job(job_id, status, message):
+    sql = f"UPDATE {DatabaseTable.JOB} SET status='{status}', message='{message}', finish_time=now() WHERE job_id={int(job_id)}"
+
+    with create_conn() as conn:
+        return execute_sqls(conn, sql)
+
+
+def run_worker(parse, parse_task):
+    """
+    It claims and runs parse jobs until the process is stopped
+
+    :param parse: the function that parses an item and takes a profile flag, such as parse_test_item
+    :param parse_task: the function that parses every item of a task, such as parse_task, for the
+    jobs submitted with TASK_JOB
+    """
+
+    logger = get_logger()
+
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+
+    logger.info(f"Worker {worker} start.")
+
+    while True:
+        ret, job = claim_job(worker)
+
+        if ret is False:
+            logger.error(job)
+
+            time.sleep(JOB_POLL_INTERVAL)
+            continue
+
+        if job is None:
+            time.sleep(JOB_POLL_INTERVAL)
+            continue
+
+        job_id = job[0]
+
+        logger.info(f"run job {job_id}: {job[1:5]} profile={job[5]}")
+
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(JOB_HEARTBEAT):
+                with create_conn() as conn:
+                    execute_sqls(conn, f"UPDATE {DatabaseTable.JOB} SET heartbeat_time=now() WHERE job_id={job_id}")
+
+        heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+        heartbeat_thread.start()
+
+        try:
+            if job[4] == TASK_JOB:
+                ret, data = parse_task(job[1])
+            else:
+                ret, data = parse(*job[1:5], profile=job[5])
+        except Exception as e:
+            ret, data = False, f"Caught exception: {e.__doc__}({e})"
+        finally:
+            stop.set()
+            heartbeat_thread.join()
+
+        ret, msg = finish_job(job_id, "done" if ret is True else "failed", str(data).replace("'", "''"))
+        if ret is False:
+            logger.error(msg)
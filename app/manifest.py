@@ -0,0 +1,108 @@
+import os
+import json
+import pathlib
+import hashlib
+import tempfile
+
+from config.setting import FILE_PATH, CACHE_DIR
+from common.log import get_logger
+
+
+MEDIA_SUFFIXES = {".png", ".PNG", ".jpg", ".JPG", ".jpeg", ".JPEG", ".bmp", ".BMP", ".mp4", ".MP4"}
+
+DECISION_DIR = "初步判定结果"
+
+
+def manifest_path(task_id, gbt, category, item):
+    key = hashlib.md5(f"{gbt}/{category}/{item}".encode('utf-8')).hexdigest()
+
+    return os.path.join(FILE_PATH, task_id, CACHE_DIR, "manifest", f"{key}.json")
+
+
+def build_manifest(task_id, gbt, category, item):
+    """
+    It walks the sample directories of an item once, and saves the list of its files and the location
+    of its decision text under the .cache of the task
+
+    :param task_id: the task id
+    :param gbt: the gbt of the item
+    :param category: the category of the item
+    :param item: the item
+    :return: A dictionary with the keys dirs, files and decision.
+    """
+
+    item_path = os.path.join(FILE_PATH, task_id, gbt, category, item)
+
+    # the mtime of every directory of the item, a file added, renamed or removed in any of them
+    # changes the mtime of its directory
+    manifest = {"dirs": {"": os.stat(item_path).st_mtime_ns}, "files": [], "decision": None}
+
+    with os.scandir(item_path) as sample_it:
+        for sample_entry in sample_it:
+            if not sample_entry.is_dir():
+                continue
+
+            manifest["dirs"][sample_entry.name] = sample_entry.stat().st_mtime_ns
+
+            for p in pathlib.Path(sample_entry.path).glob('**/*'):
+                if p.is_dir():
+                    manifest["dirs"][p.as_posix()[len(item_path)+1:]] = p.stat().st_mtime_ns
+
+                if p.is_file():
+                    stat = p.stat()
+
+                    manifest["files"].append({
+                        "sample": sample_entry.name,
+                        "path": p.as_posix()[len(item_path)+1:],
+                        "size": stat.st_size,
+                        "mtime": stat.st_mtime_ns,
+                        "media": p.suffix in MEDIA_SUFFIXES
+                    })
+                elif p.name == DECISION_DIR and manifest["decision"] is None:
+                    with os.scandir(p.as_posix()) as data_it:
+                        for data_entry in data_it:
+                            if data_entry.name.endswith(".txt"):
+                                manifest["decision"] = data_entry.path[len(item_path)+1:]
+                                break
+
+    file_path = manifest_path(task_id, gbt, category, item)
+
+    try:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix=".tmp")
+
+        with os.fdopen(fd, "w", encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+
+        os.replace(tmp_path, file_path)
+    except Exception as e:
+        logger = get_logger()
+        logger.warning(f"Caught exception: {e.__doc__}({e})")
+
+    return manifest
+
+
+def load_manifest(task_id, gbt, category, item):
+    """
+    It returns the saved manifest of an item, and builds it again when it is missing or any directory
+    of the item changed since it was built
+
+    :param task_id: the task id
+    :param gbt: the gbt of the item
+    :param category: the category of the item
+    :param item: the item
+    """
+
+    item_path = os.path.join(FILE_PATH, task_id, gbt, category, item)
+
+    try:
+        with open(manifest_path(task_id, gbt, category, item), "r", encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        if all([os.stat(os.path.join(item_path, dir_path)).st_mtime_ns == mtime for dir_path, mtime in manifest["dirs"].items()]):
+            return manifest
+    except (OSError, ValueError, KeyError):
+        pass
+
+    return build_manifest(task_id, gbt, category, item)
@@ -0,0 +1,195 @@
+import sys
+
+from config.setting import DatabaseTable
+from common.postgres_driver import create_conn, execute_sqls, execute_many, fetch_one, fetch_all, dump_json, load_json
+from common.log import get_logger
+
+
+def to_jsonb(table, column):
+    """
+    It converts a text JSON column to JSONB, once. The NaN and Infinity written by json.dumps are not
+    valid JSONB, the rows holding them are decoded and written again by dump_json, which turns them
+    into null and leaves the strings alone.
+
+    :param table: the table, such as DatabaseTable.STAT
+    :param column: the name of the column
+    :return: A tuple of two values.
+    """
+
+    schema, name = table.split(".")
+
+    sql = f"SELECT data_type FROM information_schema.columns WHERE table_schema='{schema}' AND table_name='{name}' AND column_name='{column}'"
+
+    with create_conn() as conn:
+        ret, data = fetch_one(conn, sql)
+
+    if ret is False or data is None or data[0] == 'jsonb':
+        return ret, "" if ret is True else data
+
+    with create_conn() as conn:
+        ret, data = fetch_all(conn, f"SELECT ctid::text, {column} FROM {table} WHERE {column} ~ '(NaN|Infinity)'")
+
+    if ret is False:
+        return ret, data
+
+    try:
+        rows = [(dump_json(load_json(value)), ctid) for ctid, value in data]
+    except ValueError as e:
+        return False, f"Caught exception: {e.__doc__}({e})"
+
+    if rows:
+        with create_conn() as conn:
+            ret, msg = execute_many(conn, f"UPDATE {table} SET {column}=%s WHERE ctid=%s::tid", rows)
+
+        if ret is False:
+            return ret, msg
+
+    with create_conn() as conn:
+        return execute_sqls(conn, f"ALTER TABLE {table} ALTER COLUMN {column} TYPE jsonb USING {column}::jsonb")
+
+
+# the text JSON columns of the baseline schema, see to_jsonb
+JSONB_COLUMNS = [(DatabaseTable.STAT, "result"), (DatabaseTable.TASK, "test_samples")]
+
+SCHEMA_SQLS = [
+    # the values of a field of every sample, one per line, so that a LIKE on them can be served by a
+    # trigram index and can not match across two samples
+    """CREATE OR REPLACE FUNCTION public.sample_values(samples jsonb, field text) RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE AS
+        $$ SELECT string_agg(e.sample->>field, E'\\n' ORDER BY e.i) FROM jsonb_array_elements(CASE WHEN jsonb_typeof(samples) = 'array' THEN samples ELSE '[]'::jsonb END) WITH ORDINALITY AS e(sample, i) $$""",
+    f"CREATE INDEX IF NOT EXISTS stat_info_item_idx ON {DatabaseTable.STAT}(gbt, category, item)",
+    # no query reads the results through it, it only slowed down the writes of the parses
+    f"DROP INDEX IF EXISTS {DatabaseTable.STAT.split('.')[0]}.stat_info_result_idx"
+]
+
+# the trigram indexes of the sample searches, pg_trgm may not be available or allowed, the searches
+# then scan the task table
+TRGM_SQLS = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS task_info_sample_company_idx ON {DatabaseTable.TASK} USING GIN (public.sample_values(test_samples, 'company') gin_trgm_ops)",
+    f"CREATE INDEX IF NOT EXISTS task_info_sample_name_idx ON {DatabaseTable.TASK} USING GIN (public.sample_values(test_samples, 'name') gin_trgm_ops)"
+]
+
+
+# the key of the upserts of extract_test_file
+ITEM_KEY = f"{DatabaseTable.STAT.split('.')[0]}.stat_info_item_key"
+
+ITEM_COLUMNS = "task_id, gbt, category, item"
+
+
+def item_key_exists():
+    """
+    It tells whether the unique key of the rows of stat_info exists, see create_item_key
+
+    :return: True, bool
+    """
+
+    with create_conn() as conn:
+        ret, data = fetch_one(conn, f"SELECT to_regclass('{ITEM_KEY}')")
+
+    if ret is False:
+        return ret, data
+
+    return True, data[0] is not None
+
+
+def create_item_key():
+    """
+    It creates the unique key of the rows of stat_info on (task_id, gbt, category, item). When some
+    items have several rows, nothing is deleted and the key is not created, see dedupe_items.
+
+    :return: A tuple of two values.
+    """
+
+    ret, exists = item_key_exists()
+
+    if ret is False or exists is True:
+        return ret, "" if ret is True else exists
+
+    sql = f"SELECT {ITEM_COLUMNS}, count(*) FROM {DatabaseTable.STAT} GROUP BY {ITEM_COLUMNS} HAVING count(*) > 1 ORDER BY {ITEM_COLUMNS}"
+
+    with create_conn() as conn:
+        ret, data = fetch_all(conn, sql)
+
+    if ret is False:
+        return ret, data
+
+    if len(data) > 0:
+        return False, f"{ITEM_KEY} is not created, {len(data)} items have several rows in {DatabaseTable.STAT}: {data[:20]}. Uploads are slower until then, run python -m app.migrate --dedupe-items to keep one row per item."
+
+    with create_conn() as conn:
+        return execute_sqls(conn, f"CREATE UNIQUE INDEX IF NOT EXISTS stat_info_item_key ON {DatabaseTable.STAT}({ITEM_COLUMNS})")
+
+
+def dedupe_items():
+    """
+    It keeps one row per item in stat_info, the one with a result, then the parsed one, and deletes the
+    others, before creating the unique key. It is run by hand, never at the start of the service.
+
+    :return: A tuple of two values.
+    """
+
+    logger = get_logger()
+
+    logger.info("call dedupe_items")
+
+    sql = f"""DELETE FROM {DatabaseTable.STAT} s USING (
+            SELECT ctid, row_number() OVER (PARTITION BY {ITEM_COLUMNS} ORDER BY result IS NOT NULL DESC, status = 'parse' DESC, ctid DESC) AS n
+            FROM {DatabaseTable.STAT}
+        ) d
+        WHERE s.ctid = d.ctid AND d.n > 1
+        RETURNING s.task_id, s.gbt, s.category, s.item, s.status"""
+
+    with create_conn() as conn:
+        ret, data = fetch_all(conn, sql)
+
+    if ret is False:
+        return ret, data
+
+    logger.warning(f"dedupe_items removed {len(data)} rows from {DatabaseTable.STAT}: {data}")
+
+    return create_item_key()
+
+
+def migrate():
+    """
+    It brings the schema of the database up to date. Every statement can be run again, so it is
+    run at every start of the service. The trigram indexes are optional and created in a transaction
+    of their own, after the schema.
+    """
+
+    logger = get_logger()
+
+    logger.info("call migrate")
+
+    for table, column in JSONB_COLUMNS:
+        ret, msg = to_jsonb(table, column)
+
+        if ret is False:
+            return ret, msg
+
+    with create_conn() as conn:
+        ret, msg = execute_sqls(conn, SCHEMA_SQLS)
+
+    if ret is False:
+        return ret, msg
+
+    ret, msg = create_item_key()
+
+    if ret is False:
+        logger.error(msg)
+
+    with create_conn() as conn:
+        ret, msg = execute_sqls(conn, TRGM_SQLS)
+
+    if ret is False:
+        logger.warning(f"The trigram indexes of the sample searches are not created: {msg}")
+
+    return True, ""
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--dedupe-items"]:
+        print(dedupe_items())
+    else:
+        print(migrate())
@@ -1,18 +1,14 @@
-import json
 import re
 import os
 
-import pandas
-from joblib import Parallel, delayed
-from joblib.parallel import cpu_count
-
 from app.item import DefaultItem
-from config.setting import DatabaseTable
-from common.postgres_driver import create_conn, fetch_one
+from app.reader import read_tail_segments
 from common.log import get_logger
 
 
 class ModHtempChargeMaintain(DefaultItem):
+    prerequisites = ("室温放电容量",)
+
     def preprocess(self):
         """
         The function extracts the data from the csv file and returns a list of lists
@@ -26,39 +22,34 @@ class ModHtempChargeMaintain(DefaultItem):
             """
 
             try:
-                df = pandas.read_csv(csv_file, skiprows=13, encoding='gbk', usecols=['Total Time, S', 'Cycle', 'Step', 'Step time, S', 'Power, W', 'Amp Hours Discharge, AH'])
-                df = df.dropna(how='any')
+                def discharge_starts(index):
+                    return index.frame[(index.frame["Power, W"] < 0) & (index.frame["Step time, S"] == 1)].index
+
+                def covered(index):
+                    return len(discharge_starts(index)) > 1 and discharge_starts(index)[-2] > 0
+
+                index = read_tail_segments(csv_file, ['Total Time, S', 'Cycle', 'Step', 'Step time, S', 'Power, W', 'Amp Hours Discharge, AH'], 3, covered=covered, stream=False, time='Total Time, S', accumulators=['Amp Hours Discharge, AH'])
 
-                discharge_index = df[(df["Power, W"] < 0) & (df["Step time, S"] == 1)].index
+                discharge_index = discharge_starts(index)
 
                 maintain_start = discharge_index[-2]
                 recover_start = discharge_index[-1]
 
-                maintain_end = df[(df.Cycle == df.loc[maintain_start, "Cycle"]) & (df.Step == df.loc[maintain_start, "Step"])]['Total Time, S'].astype('float64').idxmax()
-                recover_end = df[(df.Cycle == df.loc[recover_start, "Cycle"]) & (df.Step == df.loc[recover_start, "Step"])]['Total Time, S'].astype('float64').idxmax()
+                maintain = index.frame.loc[maintain_start - 1, 'Amp Hours Discharge, AH'] - index.end_value(*index.segment_of(maintain_start), column='Amp Hours Discharge, AH')
+                recover = index.frame.loc[recover_start - 1, 'Amp Hours Discharge, AH'] - index.end_value(*index.segment_of(recover_start), column='Amp Hours Discharge, AH')
 
-                return True, [csv_file.split('/')[-3], df.loc[maintain_start - 1, 'Amp Hours Discharge, AH'] - df.loc[maintain_end, 'Amp Hours Discharge, AH'], df.loc[recover_start - 1, 'Amp Hours Discharge, AH'] - df.loc[recover_end, 'Amp Hours Discharge, AH']]
+                return True, [csv_file.split('/')[-3], maintain, recover]
             except Exception as e:
                 logger = get_logger()
                 logger.error(f"Caught exception: {e.__doc__}({e})")
 
                 return False, f"Caught exception: {e.__doc__}({e})"
 
-        sql = f"SELECT result FROM {DatabaseTable.STAT} WHERE task_id='{self.task_id}' AND gbt='{self.gbt}' AND category='{self.category}' AND item='室温放电容量'"
-
-        with create_conn() as conn:
-            ret, mrdc = fetch_one(conn, sql)
+        ret, mrdc = self.context.get_sample_capacities(self.gbt, self.category)
 
         if ret is False:
             return ret, mrdc
 
-        if mrdc is None or mrdc[0] is None:
-            return False, "Please parse item(室温放电容量) first."
-
-        mrdc = json.loads(mrdc[0])
-
-        mrdc = {row[0]: row[-1] for row in mrdc["table"][1:]}
-
         csv_files = []
 
         with os.scandir(self.item_path) as item_it:
@@ -69,7 +60,7 @@ class ModHtempChargeMaintain(DefaultItem):
                             if data_entry.name.endswith(".csv"):
                                 csv_files.append(data_entry.path)
 
-        extract_results = Parallel(n_jobs=cpu_count())(delayed(extract_file)(csv_file,) for csv_file in csv_files)
+        extract_results = self.extract_files(extract_file, [(csv_file,) for csv_file in csv_files])
 
         if len(extract_results) == 0 or any([result[0] is False for result in extract_results]):
             return True, {}
@@ -1,18 +1,14 @@
-import json
 import re
 import os
 
-import pandas
-from joblib import Parallel, delayed
-from joblib.parallel import cpu_count
-
 from app.item import DefaultItem
-from config.setting import DatabaseTable
-from common.postgres_driver import create_conn, fetch_one
+from app.reader import read_tail_segments
 from common.log import get_logger
 
 
 class ModHtempDchgCapacity(DefaultItem):
+    prerequisites = ("室温放电容量",)
+
     def preprocess(self):
         """
         The function extracts the data from the csv file and returns a list of lists
@@ -26,20 +22,15 @@ class ModHtempDchgCapacity(DefaultItem):
             """
 
             try:
-                df = pandas.read_csv(csv_file, skiprows=13, encoding='gbk', usecols=['Cycle', 'Step', 'Step time, S', 'Voltage, V', 'Power, W', 'Amp Hours Discharge, AH'])
-                df = df.dropna(how='any')
+                index = read_tail_segments(csv_file, ['Cycle', 'Step', 'Step time, S', 'Voltage, V', 'Power, W', 'Amp Hours Discharge, AH'], 1, keep=1, accumulators=['Amp Hours Discharge, AH'])
 
-                max_cycle = int(df[df['Power, W'] < 0]['Cycle'].max())
-                dchg_step = int(df[(df['Power, W'] < 0) & (df.Cycle == max_cycle)]["Step"].max())
+                max_cycle, dchg_step = index.last_discharge()
 
-                min_index = df[(df.Cycle == max_cycle) & (df.Step == dchg_step)]['Step time, S'].astype('float64').idxmin()
-                max_index = df[(df.Cycle == max_cycle) & (df.Step == dchg_step)]['Step time, S'].astype('float64').idxmax()
+                dchg = [index.capacity(max_cycle, dchg_step, column='Amp Hours Discharge, AH')]
 
-                dchg = [df.loc[min_index - 1, 'Amp Hours Discharge, AH'] - df.loc[max_index, 'Amp Hours Discharge, AH']]
+                init_ah = index.before_value(max_cycle, dchg_step, column='Amp Hours Discharge, AH')
 
-                init_ah = df.loc[min_index - 1, 'Amp Hours Discharge, AH']
-
-                df = df[(df.Cycle == max_cycle) & (df.Step == dchg_step)][['Amp Hours Discharge, AH', "Voltage, V"]]
+                df = index.rows(max_cycle, dchg_step, columns=['Amp Hours Discharge, AH', "Voltage, V"])
                 df['Amp Hours Discharge, AH'] = (init_ah - df['Amp Hours Discharge, AH']).round(2)
 
                 return True, [csv_file.split('/')[-3]] + dchg + [df.to_numpy().tolist()]
@@ -49,21 +40,11 @@ class ModHtempDchgCapacity(DefaultItem):
 
                 return False, f"Caught exception: {e.__doc__}({e})"
 
-        sql = f"SELECT result FROM {DatabaseTable.STAT} WHERE task_id='{self.task_id}' AND gbt='{self.gbt}' AND category='{self.category}' AND item='室温放电容量'"
-
-        with create_conn() as conn:
-            ret, mrdc = fetch_one(conn, sql)
+        ret, mrdc = self.context.get_sample_capacities(self.gbt, self.category)
 
         if ret is False:
             return ret, mrdc
 
-        if mrdc is None or mrdc[0] is None:
-            return False, "Please parse item(室温放电容量) first."
-
-        mrdc = json.loads(mrdc[0])
-
-        mrdc = {row[0]: row[-1] for row in mrdc["table"][1:]}
-
         csv_files = []
 
         with os.scandir(self.item_path) as item_it:
@@ -74,7 +55,7 @@ class ModHtempDchgCapacity(DefaultItem):
                             if data_entry.name.endswith(".csv"):
                                 csv_files.append(data_entry.path)
 
-        extract_results = Parallel(n_jobs=cpu_count())(delayed(extract_file)(csv_file,) for csv_file in csv_files)
+        extract_results = self.extract_files(extract_file, [(csv_file,) for csv_file in csv_files])
 
         if len(extract_results) == 0 or any([result[0] is False for result in extract_results]):
             return True, {}
@@ -1,17 +1,13 @@
-import json
 import re
 import os
 
-import pandas
-from joblib import Parallel, delayed
-from joblib.parallel import cpu_count
-
 from app.item import DefaultItem
-from config.setting import DatabaseTable
-from common.postgres_driver import create_conn, fetch_one
+from app.reader import read_tail_segments
 
 
 class ModReserve(DefaultItem):
+    prerequisites = ("室温放电容量",)
+
     def preprocess(self):
         """
         The function extracts the data from the csv file and returns a list of lists
@@ -24,33 +20,17 @@ class ModReserve(DefaultItem):
             :param csv_file: the file to extract the data from
             """
 
-            df = pandas.read_csv(csv_file, skiprows=13, encoding='gbk', usecols=['Total Time, S', 'Cycle', 'Step', 'Step time, S', 'Power, W', 'Amp Hours Discharge, AH'])
-            df = df.dropna(how='any')
-
-            discharge_max_index = df[df["Power, W"] < 0]['Total Time, S'].astype('float64').idxmax()
-            max_cycle = df.loc[discharge_max_index, "Cycle"]
-            dchg_step = df.loc[discharge_max_index, "Step"]
-
-            min_index = df[(df["Power, W"] < 0) & (df.Cycle == max_cycle) & (df.Step == dchg_step)]['Step time, S'].astype('float64').idxmin()
-            max_index = df[(df["Power, W"] < 0) & (df.Cycle == max_cycle) & (df.Step == dchg_step)]['Step time, S'].astype('float64').idxmax()
+            index = read_tail_segments(csv_file, ['Total Time, S', 'Cycle', 'Step', 'Step time, S', 'Power, W', 'Amp Hours Discharge, AH'], 1, accumulators=['Amp Hours Discharge, AH'])
 
-            return [csv_file.split('/')[-3], df.loc[min_index - 1, 'Amp Hours Discharge, AH'] - df.loc[max_index, 'Amp Hours Discharge, AH']]
+            max_cycle, dchg_step = index.latest_discharge()
 
-        sql = f"SELECT result FROM {DatabaseTable.STAT} WHERE task_id='{self.task_id}' AND gbt='{self.gbt}' AND category='{self.category}' AND item='室温放电容量'"
+            return [csv_file.split('/')[-3], index.capacity(max_cycle, dchg_step, column='Amp Hours Discharge, AH')]
 
-        with create_conn() as conn:
-            ret, mrdc = fetch_one(conn, sql)
+        ret, mrdc = self.context.get_sample_capacities(self.gbt, self.category)
 
         if ret is False:
             return ret, mrdc
 
-        if mrdc is None or mrdc[0] is None:
-            return False, "Please parse item(室温放电容量) first."
-
-        mrdc = json.loads(mrdc[0])
-
-        mrdc = {row[0]: row[-1] for row in mrdc["table"][1:]}
-
         csv_files = []
 
         with os.scandir(self.item_path) as item_it:
@@ -61,7 +41,7 @@ class ModReserve(DefaultItem):
                             if data_entry.name.endswith(".csv"):
                                 csv_files.append(data_entry.path)
 
-        extract_results = Parallel(n_jobs=cpu_count())(delayed(extract_file)(csv_file,) for csv_file in csv_files)
+        extract_results = self.extract_files(extract_file, [(csv_file,) for csv_file in csv_files])
         extract_results.sort(key=lambda x: int(re.sub("\D", "", x[0])))
 
         item_result = {
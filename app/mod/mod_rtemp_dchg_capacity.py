@@ -1,15 +1,9 @@
 import statistics
-import json
 import re
 import os
 
-import pandas
-from joblib import Parallel, delayed
-from joblib.parallel import cpu_count
-
 from app.item import DefaultItem
-from config.setting import DatabaseTable
-from common.postgres_driver import create_conn, fetch_one
+from app.reader import read_tail_segments
 from common.log import get_logger
 
 
@@ -28,24 +22,18 @@ class ModRtempDchgCapacity(DefaultItem):
             """
 
             try:
-                df = pandas.read_csv(csv_file, skiprows=13, encoding='gbk', usecols=['Cycle', 'Step', 'Step time, S', 'Voltage, V', 'Power, W', 'Amp Hours Discharge, AH'])
-                df = df.dropna(how='any')
+                index = read_tail_segments(csv_file, ['Cycle', 'Step', 'Step time, S', 'Voltage, V', 'Power, W', 'Amp Hours Discharge, AH'], 3, keep=1, accumulators=['Amp Hours Discharge, AH'])
 
-                max_cycle = int(df[df['Power, W'] < 0]['Cycle'].max())
-                dchg_step = int(df[(df['Power, W'] < 0) & (df.Cycle == max_cycle)]["Step"].max())
+                max_cycle, dchg_step = index.last_discharge()
 
                 dchg = []
 
                 for i in range(2, -1, -1):
-                    min_index = df[(df.Cycle == max_cycle - i) & (df.Step == dchg_step)]['Step time, S'].astype('float64').idxmin()
-                    max_index = df[(df.Cycle == max_cycle - i) & (df.Step == dchg_step)]['Step time, S'].astype('float64').idxmax()
-
-                    dchg.append(round(df.loc[min_index - 1, 'Amp Hours Discharge, AH'] - df.loc[max_index, 'Amp Hours Discharge, AH'], 2))
+                    dchg.append(round(index.capacity(max_cycle - i, dchg_step, column='Amp Hours Discharge, AH'), 2))
 
-                init_index = df[(df.Cycle == max_cycle) & (df.Step == dchg_step)]['Step time, S'].astype('float64').idxmin()
-                init_ah = df.loc[init_index - 1, 'Amp Hours Discharge, AH']
+                init_ah = index.before_value(max_cycle, dchg_step, column='Amp Hours Discharge, AH')
 
-                df = df[(df.Cycle == max_cycle) & (df.Step == dchg_step)][['Amp Hours Discharge, AH', "Voltage, V"]]
+                df = index.rows(max_cycle, dchg_step, columns=['Amp Hours Discharge, AH', "Voltage, V"])
                 df['Amp Hours Discharge, AH'] = (init_ah - df['Amp Hours Discharge, AH']).round(2)
 
                 return True, [csv_file.split('/')[-3]] + dchg + [round(statistics.mean(dchg), 2)] + [df.to_numpy().tolist()]
@@ -55,19 +43,11 @@ class ModRtempDchgCapacity(DefaultItem):
 
                 return False, f"Caught exception: {e.__doc__}({e})"
 
-        sql = f"SELECT value FROM {DatabaseTable.PRODUCT} WHERE task_id='{self.task_id}' AND category='{self.category}' AND name='额定容量（Ah）'"
-
-        with create_conn() as conn:
-            ret, rated_capacity = fetch_one(conn, sql)
+        ret, rated_capacity = self.context.get_product_number(self.category, '额定容量（Ah）')
 
         if ret is False:
             return ret, rated_capacity
 
-        if rated_capacity is None or rated_capacity[0] is None:
-            return False, "Can not find 额定容量（Ah）."
-
-        rated_capacity = float(rated_capacity[0])
-
         csv_files = []
 
         with os.scandir(self.item_path) as item_it:
@@ -78,7 +58,7 @@ class ModRtempDchgCapacity(DefaultItem):
                             if data_entry.name.endswith(".csv"):
                                 csv_files.append(data_entry.path)
 
-        extract_results = Parallel(n_jobs=cpu_count())(delayed(extract_file)(csv_file,) for csv_file in csv_files)
+        extract_results = self.extract_files(extract_file, [(csv_file,) for csv_file in csv_files])
 
         if len(extract_results) == 0 or any([result[0] is False for result in extract_results]):
             return True, {}
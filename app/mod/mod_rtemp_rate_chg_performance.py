@@ -1,18 +1,14 @@
-import json
 import re
 import os
 
-import pandas
-from joblib import Parallel, delayed
-from joblib.parallel import cpu_count
-
 from app.item import DefaultItem
-from config.setting import DatabaseTable
-from common.postgres_driver import create_conn, fetch_one
+from app.reader import read_tail_segments
 from common.log import get_logger
 
 
 class ModRtempRateChgPerformance(DefaultItem):
+    prerequisites = ("室温放电容量",)
+
     def preprocess(self):
         """
         It extracts data from a csv file and returns a list of lists
@@ -28,38 +24,22 @@ class ModRtempRateChgPerformance(DefaultItem):
             """
 
             try:
-                df = pandas.read_csv(csv_file, skiprows=13, encoding='gbk', usecols=['Total Time, S', 'Cycle', 'Step', 'Step time, S', 'Power, W', 'Amp Hours Discharge, AH'])
-                df = df.dropna(how='any')
+                index = read_tail_segments(csv_file, ['Total Time, S', 'Cycle', 'Step', 'Step time, S', 'Power, W', 'Amp Hours Discharge, AH'], 1, accumulators=['Amp Hours Discharge, AH'])
 
-                discharge_max_index = df[df["Power, W"] < 0]['Total Time, S'].astype('float64').idxmax()
-                max_cycle = df.loc[discharge_max_index, "Cycle"]
-                dchg_step = df.loc[discharge_max_index, "Step"]
+                max_cycle, dchg_step = index.latest_discharge()
 
-                min_index = df[(df["Power, W"] < 0) & (df.Cycle == max_cycle) & (df.Step == dchg_step)]['Step time, S'].astype('float64').idxmin()
-                max_index = df[(df["Power, W"] < 0) & (df.Cycle == max_cycle) & (df.Step == dchg_step)]['Step time, S'].astype('float64').idxmax()
-
-                return True, [csv_file.split('/')[-3], df.loc[min_index - 1, 'Amp Hours Discharge, AH'] - df.loc[max_index, 'Amp Hours Discharge, AH']]
+                return True, [csv_file.split('/')[-3], index.capacity(max_cycle, dchg_step, column='Amp Hours Discharge, AH')]
             except Exception as e:
                 logger = get_logger()
                 logger.error(f"Caught exception: {e.__doc__}({e})")
 
                 return False, f"Caught exception: {e.__doc__}({e})"
 
-        sql = f"SELECT result FROM {DatabaseTable.STAT} WHERE task_id='{self.task_id}' AND gbt='{self.gbt}' AND category='{self.category}' AND item='室温放电容量'"
-
-        with create_conn() as conn:
-            ret, mrdc = fetch_one(conn, sql)
+        ret, mrdc = self.context.get_sample_capacities(self.gbt, self.category)
 
         if ret is False:
             return ret, mrdc
 
-        if mrdc is None or mrdc[0] is None:
-            return False, "Please parse item(室温放电容量) first."
-
-        mrdc = json.loads(mrdc[0])
-
-        mrdc = {row[0]: row[-1] for row in mrdc["table"][1:]}
-
         csv_files = []
 
         with os.scandir(self.item_path) as item_it:
@@ -70,7 +50,7 @@ class ModRtempRateChgPerformance(DefaultItem):
                             if data_entry.name.endswith(".csv"):
                                 csv_files.append(data_entry.path)
 
-        extract_results = Parallel(n_jobs=cpu_count())(delayed(extract_file)(csv_file,) for csv_file in csv_files)
+        extract_results = self.extract_files(extract_file, [(csv_file,) for csv_file in csv_files])
 
         if len(extract_results) == 0 or any([result[0] is False for result in extract_results]):
             return True, {}
@@ -1,18 +1,15 @@
-import json
 import re
 import os
 
-import pandas
-from joblib import Parallel, delayed
-from joblib.parallel import cpu_count
-
 from app.item import DefaultItem
-from config.setting import DatabaseTable, SampleCategory
-from common.postgres_driver import create_conn, fetch_one
+from app.reader import read_tail_segments
+from config.setting import SampleCategory
 from common.log import get_logger
 
 
 class ModRtempRateDchgCapacity(DefaultItem):
+    prerequisites = ("室温放电容量",)
+
     def preprocess(self):
         """
         The function extracts the data from the csv file and returns a list of lists
@@ -28,19 +25,13 @@ class ModRtempRateDchgCapacity(DefaultItem):
             """
 
             try:
-                df = pandas.read_csv(csv_file, skiprows=13, encoding='gbk', usecols=['Total Time, S', 'Cycle', 'Step', 'Step time, S', 'Power, W', 'Voltage, V', 'Amp Hours Discharge, AH'])
-                df = df.dropna(how='any')
-
-                discharge_max_index = df[df["Power, W"] < 0]['Total Time, S'].astype('float64').idxmax()
-                max_cycle = df.loc[discharge_max_index, "Cycle"]
-                dchg_step = df.loc[discharge_max_index, "Step"]
+                index = read_tail_segments(csv_file, ['Total Time, S', 'Cycle', 'Step', 'Step time, S', 'Power, W', 'Voltage, V', 'Amp Hours Discharge, AH'], 1, keep=1, accumulators=['Amp Hours Discharge, AH'])
 
-                min_index = df[(df["Power, W"] < 0) & (df.Cycle == max_cycle) & (df.Step == dchg_step)]['Step time, S'].astype('float64').idxmin()
-                max_index = df[(df["Power, W"] < 0) & (df.Cycle == max_cycle) & (df.Step == dchg_step)]['Step time, S'].astype('float64').idxmax()
+                max_cycle, dchg_step = index.latest_discharge()
 
-                init_ah = df.loc[min_index - 1, 'Amp Hours Discharge, AH']
+                init_ah = index.before_value(max_cycle, dchg_step, column='Amp Hours Discharge, AH')
 
-                df = df[min_index: max_index + 1][['Amp Hours Discharge, AH', 'Voltage, V']]
+                df = index.rows(max_cycle, dchg_step, columns=['Amp Hours Discharge, AH', 'Voltage, V'])
 
                 df['Amp Hours Discharge, AH'] = (init_ah - df['Amp Hours Discharge, AH']).round(2)
 
@@ -51,39 +42,21 @@ class ModRtempRateDchgCapacity(DefaultItem):
 
                 return False, f"Caught exception: {e.__doc__}({e})"
 
-        sql = f"SELECT value FROM {DatabaseTable.PRODUCT} WHERE task_id='{self.task_id}' AND category='{SampleCategory.CELL}' AND name='产品类型'"
-
-        with create_conn() as conn:
-            ret, cell_type = fetch_one(conn, sql)
+        ret, cell_type = self.context.get_product_choice(SampleCategory.CELL, '产品类型')
 
         if ret is False:
             return ret, cell_type
 
-        if cell_type is None or cell_type[0] is None:
-            return False, "Can not find 产品类型."
-
-        cell_type = cell_type[0].split('■')[-1].split('□')[0].strip()
-
         amp_rate = 0.9
 
         if cell_type == '功率型':
             amp_rate = 0.8
 
-        sql = f"SELECT result FROM {DatabaseTable.STAT} WHERE task_id='{self.task_id}' AND gbt='{self.gbt}' AND category='{self.category}' AND item='室温放电容量'"
-
-        with create_conn() as conn:
-            ret, mrdc = fetch_one(conn, sql)
+        ret, mrdc = self.context.get_sample_capacities(self.gbt, self.category)
 
         if ret is False:
             return ret, mrdc
 
-        if mrdc is None or mrdc[0] is None:
-            return False, "Can not find 室温放电容量."
-
-        mrdc = json.loads(mrdc[0])
-
-        mrdc = {row[0]: row[-1] for row in mrdc["table"][1:]}
-
         csv_files = []
 
         with os.scandir(self.item_path) as item_it:
@@ -94,7 +67,7 @@ class ModRtempRateDchgCapacity(DefaultItem):
                             if data_entry.name.endswith(".csv"):
                                 csv_files.append(data_entry.path)
 
-        extract_results = Parallel(n_jobs=cpu_count())(delayed(extract_file)(csv_file,) for csv_file in csv_files)
+        extract_results = self.extract_files(extract_file, [(csv_file,) for csv_file in csv_files])
 
         if len(extract_results) == 0 or any([result[0] is False for result in extract_results]):
             return True, {}
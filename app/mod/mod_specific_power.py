@@ -4,10 +4,9 @@ import os
 import pathlib
 
 import pandas
-from joblib import Parallel, delayed
-from joblib.parallel import cpu_count
 
 from app.item import DefaultItem
+from app.reader import read_tail_segments
 from config.setting import DatabaseTable
 from common.log import get_logger
 
@@ -30,10 +29,15 @@ class ModSpecificPower(DefaultItem):
             """
 
             try:
-                df = pandas.read_csv(csv_file, skiprows=13, encoding='gbk', usecols=['Total Time, S', 'Step time, S', 'Current, A', 'Power, W'])
-                df = df.dropna(how='any')
-                discharge_index = df[df["Power, W"] < 0]['Total Time, S'].astype('float64').idxmax()
-                charge_index = df[df["Power, W"] > 0]['Total Time, S'].astype('float64').idxmax()
+                def covered(index):
+                    return index.last_discharge_row() >= 0 and index.last_charge_row() >= 0
+
+                index = read_tail_segments(csv_file, ['Total Time, S', 'Cycle', 'Step', 'Step time, S', 'Current, A', 'Power, W'], 1, covered=covered, stream=False)
+
+                discharge_index = index.last_discharge_row()
+                charge_index = index.last_charge_row()
+
+                df = index.frame
 
                 discharge_list = [csv_file.split('/')[-3], "放电", -1 * df.loc[discharge_index, 'Current, A'], df.loc[discharge_index, 'Step time, S'], -1 * df.loc[discharge_index, 'Power, W']]
                 charge_list = [csv_file.split('/')[-3], "充电", df.loc[charge_index, 'Current, A'], df.loc[charge_index, 'Step time, S'], df.loc[charge_index, 'Power, W']]
@@ -68,7 +72,7 @@ class ModSpecificPower(DefaultItem):
                             if data_entry.name.endswith(".csv"):
                                 csv_files.append(data_entry.path)
 
-        extract_results = Parallel(n_jobs=cpu_count())(delayed(extract_file)(csv_file,) for csv_file in csv_files)
+        extract_results = self.extract_files(extract_file, [(csv_file,) for csv_file in csv_files])
 
         if len(extract_results) == 0 or any([result[0] is False for result in extract_results]):
             return True, {}
@@ -1,15 +1,14 @@
 import statistics
 import json
 import re
-import csv
 import pathlib
 import os
 
 import pandas
-from joblib import Parallel, delayed
-from joblib.parallel import cpu_count
 
 from app.item import DefaultItem
+from app.reader import read_dat_files, discharge_rows
+from app.segment import SegmentIndex
 from config.setting import DatabaseTable
 from common.log import get_logger
 
@@ -51,20 +50,19 @@ class PackEnergyDensity(DefaultItem):
                 if len(dat_files) > 0:
                     dat_files.sort()
 
-                    df = pandas.concat([pandas.read_csv(dat_file, header=0, usecols=['cycle_1', 'ABCVoltage', 'ABCCurrent', 'ABCkWhOut', 'ABCCommandMode', 'StopCondition'], encoding='utf-8', delim_whitespace=True, quoting=csv.QUOTE_NONE) for dat_file in dat_files])
+                    df = pandas.concat(read_dat_files(dat_files, ['cycle_1', 'ABCVoltage', 'ABCCurrent', 'ABCkWhOut', 'ABCCommandMode', 'StopCondition'], discharge_rows))
 
-                    df.index = [i for i in range(df.index.size)]
+                    index = SegmentIndex(df, keys=("cycle_1",), time=None, power='ABCCurrent', accumulators=['ABCkWhOut'])
 
-                    max_cycle = int(df[(df['ABCCurrent'] < 0) & (df['ABCCommandMode'] == 1) & (df['StopCondition'] == 1)]['cycle_1'].max())
+                    max_cycle = index.last_discharge()
 
                     row.append(dev_path.split('/')[-1])
 
                     for i in range(2, -1, -1):
-                        max_index = max(df[(df['cycle_1'] == max_cycle - i) & (df['ABCCurrent'] < 0) & (df['ABCCommandMode'] == 1) & (df['StopCondition'] == 1)].index)
-                        dchg_df = df[(df['cycle_1'] == max_cycle - i) & (df['ABCCurrent'] < 0) & (df['ABCCommandMode'] == 1) & (df['StopCondition'] == 1)][['ABCkWhOut', 'ABCVoltage']]
+                        dchg_df = index.rows(max_cycle - i, columns=['ABCkWhOut', 'ABCVoltage'])
                         dchg_df['ABCkWhOut'] = (-1000 * dchg_df['ABCkWhOut']).round(2)
 
-                        row.append(round(-1 * df.loc[max_index, 'ABCkWhOut'], 2))
+                        row.append(round(-1 * index.end_value(max_cycle - i, column='ABCkWhOut'), 2))
                         dchg.append(dchg_df.to_numpy().tolist())
 
                     row.append(round(statistics.mean(row[-3:]), 2))
@@ -78,21 +76,47 @@ class PackEnergyDensity(DefaultItem):
 
                 return False, f"Caught exception: {e.__doc__}({e})"
 
-        item_result = {
-            "table": [['样本编号', '第1轮循环放电能量(kWh)', '第2轮循环放电能量(kWh)', '第3轮循环放电能量(kWh)', '放电能量平均值(kWh)', '蓄电池系统质量(kg)', 'PED(Wh/kg)']],
-            "graph": [{"电压与放电能量曲线": ["放电能量(Wh)", "电压(V)"]}, {"keys": ["第1轮循环放电", "第2轮循环放电", "第3轮循环放电"]}, {"values": []}]
-        }
+        dev_paths = []
 
         with os.scandir(self.item_path) as item_it:
             for item_entry in item_it:
                 if os.path.exists(os.path.join(item_entry.path, "设备数据")):
-                    ret, extract_result = extract_file(item_entry.path)
-                    if ret is False or len(extract_result) <= 7:
-                        return True, {}
+                    dev_paths.append(item_entry.path)
+
+        extract_results = self.extract_files(extract_file, [(dev_path,) for dev_path in dev_paths])
+
+        if any([result[0] is False or len(result[1]) <= 7 for result in extract_results]):
+            return True, {}
+
+        extract_results = [result[1] for result in extract_results]
+
+        def sample_order(result):
+            # the samples without a number in their name, such as A包, come after the numbered ones
+            digits = re.sub(r"\D", "", result[0])
+
+            return (int(digits) if digits else float("inf"), result[0])
+
+        extract_results.sort(key=sample_order)
+
+        curve_names = ["第1轮循环放电", "第2轮循环放电", "第3轮循环放电"]
+
+        item_result = {
+            "table": [['样本编号', '第1轮循环放电能量(kWh)', '第2轮循环放电能量(kWh)', '第3轮循环放电能量(kWh)', '放电能量平均值(kWh)', '蓄电池系统质量(kg)', 'PED(Wh/kg)']],
+            "graph": [{"电压与放电能量曲线": ["放电能量(Wh)", "电压(V)"]}, {"keys": []}, {"values": []}]
+        }
+
+        # without any sample, the header of the table and the names of the curves, as before
+        if len(extract_results) == 0:
+            item_result["graph"][1]["keys"] = curve_names
+
+        for result in extract_results:
+            item_result["table"].append(result[:7])
 
-                    item_result["table"].append(extract_result[:7])
-                    item_result["graph"][2]["values"] = extract_result[7:]
+            if len(extract_results) == 1:
+                item_result["graph"][1]["keys"] += curve_names
+            else:
+                item_result["graph"][1]["keys"] += [f"{result[0]}-{name}" for name in curve_names]
 
-                    break
+            item_result["graph"][2]["values"] += result[7:]
 
-        return True, item_result
\ No newline at end of file
+        return True, item_result
@@ -1,15 +1,8 @@
-import json
 import re
-import csv
 import os
 
-import pandas
-from joblib import Parallel, delayed
-from joblib.parallel import cpu_count
-
 from app.item import DefaultItem
-from config.setting import DatabaseTable
-from common.postgres_driver import create_conn, fetch_one
+from app.reader import read_dat_files, discharge_rows
 from common.log import get_logger
 
 
@@ -43,13 +36,10 @@ class PackRtempDchgCapacity(DefaultItem):
 
                     dchg_list = []
 
-                    for dat_file in dat_files:
-                        df = pandas.read_csv(dat_file, header=0, usecols=['TestTime.1', 'ABCCurrent', 'ABCAhOut', 'ABCCommandMode', 'StopCondition'], encoding='utf-8', delim_whitespace=True, quoting=csv.QUOTE_NONE)
-                        df.index = [i for i in range(df.index.size)]
-
+                    for df in read_dat_files(dat_files, ['TestTime.1', 'ABCCurrent', 'ABCAhOut', 'ABCCommandMode', 'StopCondition'], discharge_rows, keep_previous=True):
                         try:
-                            index_min = min(df[(df['ABCCurrent'] < 0) & (df['ABCCommandMode'] == 1) & (df['StopCondition'] == 1)].index)
-                            index_max = max(df[(df['ABCCurrent'] < 0) & (df['ABCCommandMode'] == 1) & (df['StopCondition'] == 1)].index)
+                            index_min = min(df[discharge_rows(df)].index)
+                            index_max = max(df[discharge_rows(df)].index)
 
                             if index_min > 0:
                                 index_min = index_min - 1
@@ -83,19 +73,11 @@ class PackRtempDchgCapacity(DefaultItem):
 
                 return False, f"Caught exception: {e.__doc__}({e})"
 
-        sql = f"SELECT value FROM {DatabaseTable.PRODUCT} WHERE task_id='{self.task_id}' AND category='{self.category}' AND name='额定容量（Ah）'"
-
-        with create_conn() as conn:
-            ret, rated_capacity = fetch_one(conn, sql)
+        ret, rated_capacity = self.context.get_product_number(self.category, '额定容量（Ah）')
 
         if ret is False:
             return ret, rated_capacity
 
-        if rated_capacity is None or rated_capacity[0] is None:
-            return False, "Can not find 额定容量（Ah）."
-
-        rated_capacity = float(re.sub(r'\D+', '', rated_capacity[0]))
-
         dev_paths = []
 
         with os.scandir(self.item_path) as item_it:
@@ -103,7 +85,7 @@ class PackRtempDchgCapacity(DefaultItem):
                 if os.path.exists(os.path.join(item_entry.path, "设备数据")):
                     dev_paths.append(item_entry.path)
 
-        extract_results = Parallel(n_jobs=cpu_count())(delayed(extract_file)(dev_path, rated_capacity) for dev_path in dev_paths)
+        extract_results = self.extract_files(extract_file, [(dev_path, rated_capacity) for dev_path in dev_paths])
 
         if len(extract_results) == 0 or any([result[0] is False for result in extract_results]):
             return True, {}
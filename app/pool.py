@@ -0,0 +1,117 @@
+import os
+import fcntl
+import itertools
+from contextlib import contextmanager
+
+from joblib.externals.loky import get_reusable_executor
+
+from config.setting import POOL_PATH, POOL_WORKERS, POOL_IDLE_TIMEOUT
+from common.metrics import POOL_PENDING
+
+
+def _warm():
+    """
+    It imports the heavy modules once in every worker, so that the first task does not pay for them
+    """
+
+    import numpy
+    import pandas
+
+
+# the slot a task waits on when every slot is taken, a different one at each turn
+_slot_turns = itertools.count(os.getpid())
+
+
+@contextmanager
+def _slot():
+    """
+    It takes one of the POOL_WORKERS host-wide slots, so that the pools of all the processes together
+    never run more than POOL_WORKERS tasks at a time. When every slot is taken, it blocks on one of
+    them in turn until it is released.
+    """
+
+    os.makedirs(POOL_PATH, exist_ok=True)
+
+    fd = None
+
+    for i in range(POOL_WORKERS):
+        fd = os.open(os.path.join(POOL_PATH, f"slot-{i}"), os.O_CREAT | os.O_RDWR)
+
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            break
+        except OSError:
+            os.close(fd)
+            fd = None
+
+    if fd is None:
+        fd = os.open(os.path.join(POOL_PATH, f"slot-{next(_slot_turns) % POOL_WORKERS}"), os.O_CREAT | os.O_RDWR)
+
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        except BaseException:
+            os.close(fd)
+            raise
+
+    try:
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def _call(func, args):
+    with _slot():
+        return func(*args)
+
+
+def get_executor():
+    """
+    It returns the long-lived executor of this process. The workers start on the first call, stay alive
+    between calls, and exit only after POOL_IDLE_TIMEOUT seconds without work. Every process may start
+    POOL_WORKERS of them, the slots keep the host at POOL_WORKERS running tasks.
+    """
+
+    return get_reusable_executor(max_workers=POOL_WORKERS, timeout=POOL_IDLE_TIMEOUT, initializer=_warm)
+
+
+def warm_pool():
+    """
+    It starts every worker of the executor ahead of the first request
+    """
+
+    executor = get_executor()
+
+    for future in [executor.submit(_warm) for _ in range(POOL_WORKERS)]:
+        future.result()
+
+
+def submit(func, *args):
+    """
+    It submits a function to the shared worker pool
+
+    :param func: the function to run, closures are allowed
+    :param args: the arguments of the function
+    :return: A future.
+    """
+
+    future = get_executor().submit(_call, func, args)
+
+    POOL_PENDING.inc()
+    future.add_done_callback(lambda _: POOL_PENDING.dec())
+
+    return future
+
+
+def run_parallel(func, args_list):
+    """
+    It runs a function over every tuple of arguments on the shared worker pool
+
+    :param func: the function to run, closures are allowed
+    :param args_list: a list of tuples of arguments
+    :return: The results, in the order of args_list.
+    """
+
+    futures = [submit(func, *args) for args in args_list]
+
+    return [future.result() for future in futures]
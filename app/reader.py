@@ -0,0 +1,331 @@
+import io
+import os
+import csv
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+import pandas
+
+from app.cache import ColumnCache
+from app.segment import SegmentIndex
+from app.timing import record
+from common.log import get_logger
+from config.setting import STREAM_SIZE, STREAM_CHUNK, TAIL_BLOCK, DAT_THREADS
+
+
+DAT_DTYPES = {
+    'cycle_1': 'float64',
+    'TestTime.1': 'float64',
+    'ABCVoltage': 'float64',
+    'ABCCurrent': 'float64',
+    'ABCAhOut': 'float64',
+    'ABCkWhOut': 'float64',
+    'ABCCommandMode': 'float64',
+    'StopCondition': 'float64'
+}
+
+
+def read_cycler_csv(csv_file, usecols):
+    """
+    It reads the columns of an Arbin cycler export, from the column cache of the task when the file was
+    parsed before
+
+    :param csv_file: the path to the csv file
+    :param usecols: the columns to read
+    :return: A DataFrame.
+    """
+
+    def reader(columns):
+        return pandas.read_csv(csv_file, skiprows=13, encoding='gbk', usecols=columns)
+
+    cache = ColumnCache.for_file(csv_file, "csv")
+
+    df = reader(usecols) if cache is None else cache.read(csv_file, usecols, reader)
+
+    record(rows=len(df), bytes=os.path.getsize(csv_file))
+
+    return df
+
+
+def iter_cycler_csv(csv_file, usecols, chunksize=STREAM_CHUNK):
+    """
+    It reads the columns of an Arbin cycler export in chunks of rows, so that the whole file is never
+    held in memory
+
+    :param csv_file: the path to the csv file
+    :param usecols: the columns to read
+    :param chunksize: the number of rows of every chunk
+    :return: A generator of DataFrames.
+    """
+
+    cache = ColumnCache.for_file(csv_file, "csv")
+
+    if cache is not None:
+        chunks = cache.chunks(csv_file, usecols, chunksize)
+
+        if chunks is not None:
+            return chunks
+
+    return pandas.read_csv(csv_file, skiprows=13, encoding='gbk', usecols=usecols, chunksize=chunksize)
+
+
+def read_cycler_tail(csv_file, usecols, cycles, block_size=TAIL_BLOCK):
+    """
+    It reads an Arbin cycler export backwards from the end of the file in blocks of bytes, until the
+    window holds at least cycles + 1 distinct cycles, then parses only that window
+
+    :param csv_file: the path to the csv file
+    :param usecols: the columns to read
+    :param cycles: the number of trailing cycles that are needed
+    :param block_size: the number of bytes read at a time
+    :return: the DataFrame of the window, and whether the window is the whole file.
+    """
+
+    with open(csv_file, "rb") as f:
+        for _ in range(13):
+            f.readline()
+
+        header = f.readline()
+        data_start = f.tell()
+
+        names = [name.strip() for name in next(csv.reader([header.decode('gbk')]))]
+        cycle_index = names.index("Cycle")
+
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+
+        window = b""
+        head = b""
+        seen = set()
+
+        while position > data_start and len(seen) <= cycles:
+            size = min(block_size, position - data_start)
+            position -= size
+
+            f.seek(position)
+            block = f.read(size) + head
+
+            if position > data_start:
+                cut = block.find(b"\n") + 1
+
+                if cut == 0:
+                    head = block
+                    continue
+
+                head, lines = block[:cut], block[cut:]
+            else:
+                head, lines = b"", block
+
+            for line in lines.splitlines():
+                fields = line.split(b",")
+
+                if len(fields) > cycle_index and fields[cycle_index].strip():
+                    seen.add(fields[cycle_index].strip())
+
+            window = lines + window
+
+    df = pandas.read_csv(io.BytesIO(header + window), encoding='gbk', usecols=usecols)
+
+    record(rows=len(df), bytes=len(header) + len(window))
+
+    return df, position <= data_start
+
+
+def read_segments(csv_file, usecols, keep=0, stream=True, **kwargs):
+    """
+    It reads an Arbin cycler export into a SegmentIndex. Files larger than STREAM_SIZE are streamed in
+    chunks, keeping only the rows of the last `keep` discharge segments.
+
+    :param csv_file: the path to the csv file
+    :param usecols: the columns to read
+    :param keep: the number of trailing discharge segments whose rows are needed by rows()
+    :param stream: False if the caller needs every row of the frame
+    :param kwargs: the arguments of SegmentIndex, such as accumulators
+    :return: A SegmentIndex.
+    """
+
+    size = os.path.getsize(csv_file)
+
+    if stream and size > STREAM_SIZE:
+        def chunks():
+            for chunk in iter_cycler_csv(csv_file, usecols):
+                record(rows=len(chunk))
+
+                yield chunk.dropna(how='any')
+
+        record(bytes=size)
+
+        return SegmentIndex.from_chunks(chunks(), keep=keep, **kwargs)
+
+    return SegmentIndex(read_cycler_csv(csv_file, usecols).dropna(how='any'), **kwargs)
+
+
+def read_tail_segments(csv_file, usecols, cycles, covered=None, keep=0, stream=True, **kwargs):
+    """
+    It reads only the last cycles of an Arbin cycler export into a SegmentIndex, and falls back to
+    read_segments when the tail window does not cover what the item needs
+
+    :param csv_file: the path to the csv file
+    :param usecols: the columns to read
+    :param cycles: the number of trailing discharge cycles that are needed
+    :param covered: a function that takes the SegmentIndex of the window and tells whether it is
+    enough, by default whether the window starts before the first needed discharge cycle
+    :param keep: see read_segments
+    :param stream: see read_segments
+    :param kwargs: the arguments of SegmentIndex, such as accumulators
+    :return: A SegmentIndex.
+    """
+
+    def discharge_covered(index):
+        if not (index.table["power_min"] < 0).any():
+            return False
+
+        max_cycle = index.last_discharge()[0]
+
+        return index.table.index.get_level_values(0).min() < max_cycle - (cycles - 1)
+
+    try:
+        df, whole = read_cycler_tail(csv_file, usecols, cycles)
+
+        df = df.dropna(how='any')
+
+        # a window without any row, or without the segments the item needs, is read again as a whole
+        if not df.empty:
+            index = SegmentIndex(df, **kwargs)
+
+            if whole or (covered or discharge_covered)(index):
+                return index
+    except Exception as e:
+        logger = get_logger()
+        logger.warning(f"Read the whole of {csv_file} after the tail failed. Caught exception: {e.__doc__}({e})")
+
+    return read_segments(csv_file, usecols, keep=keep, stream=stream, **kwargs)
+
+
+def read_dat(dat_file, usecols):
+    """
+    It reads the columns of a Digatron .dat file, from the column cache of the task when the file was
+    parsed before
+
+    :param dat_file: the path to the dat file
+    :param usecols: the columns to read
+    :return: A DataFrame.
+    """
+
+    def reader(columns):
+        return pandas.read_csv(dat_file, header=0, usecols=columns, encoding='utf-8', delim_whitespace=True, quoting=csv.QUOTE_NONE, dtype={c: DAT_DTYPES[c] for c in columns if c in DAT_DTYPES})
+
+    cache = ColumnCache.for_file(dat_file, "dat")
+
+    if cache is None:
+        return reader(usecols)
+
+    return cache.read(dat_file, usecols, reader)
+
+
+def discharge_rows(df):
+    """
+    It tells the rows of a Digatron .dat file that belong to a discharge step ended by its stop
+    condition
+    """
+
+    return (df['ABCCurrent'] < 0) & (df['ABCCommandMode'] == 1) & (df['StopCondition'] == 1)
+
+
+def iter_dat(dat_file, usecols, chunksize=STREAM_CHUNK):
+    """
+    It reads the columns of a Digatron .dat file in chunks of rows, from the column cache when the file
+    was read before, each chunk indexed by the positions of its rows in the file
+
+    :param dat_file: the path to the dat file
+    :param usecols: the columns to read
+    :param chunksize: the number of rows of every chunk
+    :return: A generator of DataFrames.
+    """
+
+    cache = ColumnCache.for_file(dat_file, "dat")
+
+    chunks = cache.chunks(dat_file, usecols, chunksize) if cache is not None else None
+
+    if chunks is None:
+        if os.path.getsize(dat_file) <= STREAM_SIZE:
+            chunks = [read_dat(dat_file, usecols)]
+        else:
+            chunks = pandas.read_csv(dat_file, header=0, usecols=usecols, encoding='utf-8', delim_whitespace=True, quoting=csv.QUOTE_NONE, dtype={c: DAT_DTYPES[c] for c in usecols if c in DAT_DTYPES}, chunksize=chunksize)
+
+    offset = 0
+
+    for chunk in chunks:
+        chunk.index = pandas.RangeIndex(offset, offset + len(chunk))
+        offset += len(chunk)
+
+        yield chunk
+
+
+def read_dat_rows(dat_file, usecols, predicate=None, keep_previous=False):
+    """
+    It reads the rows of a Digatron .dat file that match a predicate, filtering every chunk as it is
+    read so that the other rows are never held together
+
+    :param dat_file: the path to the dat file
+    :param usecols: the columns to read, including the columns of the predicate
+    :param predicate: a function that takes a DataFrame and returns a boolean Series, all rows if None
+    :param keep_previous: True to also keep the row just before every run of matching rows
+    :return: A DataFrame indexed by the positions of the rows in the file.
+    """
+
+    kept = []
+    previous = None
+    previous_match = False
+
+    for chunk in iter_dat(dat_file, usecols):
+        if chunk.empty:
+            continue
+
+        if predicate is None:
+            kept.append(chunk)
+            continue
+
+        mask = predicate(chunk).to_numpy()
+        keep = mask.copy()
+
+        if keep_previous:
+            starts = mask & ~numpy.concatenate(([previous_match], mask[:-1]))
+            keep[:-1] |= starts[1:]
+
+            if starts[0] and previous is not None:
+                kept.append(previous)
+
+        kept.append(chunk[keep])
+
+        previous = chunk.iloc[-1:]
+        previous_match = mask[-1]
+
+    if not kept:
+        return pandas.DataFrame(columns=usecols)
+
+    return pandas.concat(kept)
+
+
+def read_dat_files(dat_files, usecols, predicate=None, keep_previous=False, threads=DAT_THREADS):
+    """
+    It reads the matching rows of several Digatron .dat files on a few threads
+
+    :param dat_files: the paths to the dat files
+    :param usecols: see read_dat_rows
+    :param predicate: see read_dat_rows
+    :param keep_previous: see read_dat_rows
+    :param threads: the max number of files read at a time
+    :return: A list of DataFrames, in the order of dat_files.
+    """
+
+    if len(dat_files) <= 1:
+        dfs = [read_dat_rows(dat_file, usecols, predicate, keep_previous) for dat_file in dat_files]
+    else:
+        with ThreadPoolExecutor(max_workers=min(threads, len(dat_files))) as executor:
+            dfs = list(executor.map(lambda dat_file: read_dat_rows(dat_file, usecols, predicate, keep_previous), dat_files))
+
+    # the threads do not see the stats of the caller, so the files are counted here
+    record(rows=sum(len(df) for df in dfs), bytes=sum(os.path.getsize(dat_file) for dat_file in dat_files))
+
+    return dfs
@@ -0,0 +1,290 @@
+import collections
+
+import numpy
+import pandas
+
+
+# It's a class that indexes a cycler DataFrame by (Cycle, Step) segments in a single pass
+class SegmentIndex(object):
+    def __init__(self, df, keys=("Cycle", "Step"), time="Step time, S", power="Power, W", accumulators=()):
+        """
+        It groups the rows of a cycler DataFrame by its segment keys once, and keeps a table of the
+        start/end row, the min/max step time and the end-of-step accumulators of every segment.
+
+        :param df: the DataFrame read from the cycler file, NaN rows already dropped
+        :param keys: the columns that identify a segment, ("Cycle", "Step") for Arbin exports
+        :param time: the step time column, None to use the row order
+        :param power: the column whose sign tells discharge (< 0) from charge (> 0)
+        :param accumulators: the columns whose value at the end and before the start of every segment
+        is needed, such as 'Amp-Hours, AH'
+        """
+
+        self.keys = list(keys)
+        self.time = time
+        self.power = power
+        self.accumulators = list(accumulators)
+
+        if df is None:
+            return
+
+        self.frame = df.reset_index(drop=True)
+        self.table, self.indices = self._aggregate(self.frame, 0, {})
+
+
+    @classmethod
+    def from_chunks(cls, chunks, keys=("Cycle", "Step"), time="Step time, S", power="Power, W", accumulators=(), keep=0):
+        """
+        It builds the index from an iterable of DataFrame chunks, folding every chunk into per-segment
+        aggregates so that only one chunk is held in memory at a time.
+
+        :param chunks: an iterable of DataFrames, NaN rows already dropped
+        :param keep: the number of trailing discharge segments whose rows are kept for rows()
+        :return: A SegmentIndex.
+        """
+
+        index = cls(None, keys=keys, time=time, power=power, accumulators=accumulators)
+
+        partials = []
+        kept = collections.OrderedDict()
+        previous = {}
+        offset = 0
+        columns = None
+
+        for chunk in chunks:
+            columns = chunk.columns
+            chunk = chunk.reset_index(drop=True)
+
+            if chunk.empty:
+                continue
+
+            partial, chunk_indices = index._aggregate(chunk, offset, previous)
+            partials.append(partial)
+
+            if keep > 0:
+                for key, positions in chunk_indices.items():
+                    if key in kept or partial.loc[key, "power_min"] < 0:
+                        rows = chunk.iloc[positions - offset]
+                        rows.index = positions
+
+                        kept.setdefault(key, []).append(rows)
+                        kept.move_to_end(key)
+
+                while len(kept) > keep:
+                    kept.popitem(last=False)
+
+            for accumulator in index.accumulators:
+                previous[accumulator] = chunk[accumulator].iat[-1]
+
+            offset += len(chunk)
+
+        if not partials:
+            raise ValueError("No cycler rows to index.")
+
+        index.table = index._merge(partials)
+
+        if kept:
+            index.frame = pandas.concat([rows for value in kept.values() for rows in value])
+        else:
+            index.frame = pandas.DataFrame(columns=columns)
+
+        index.indices = {key: numpy.concatenate([rows.index.to_numpy() for rows in value]) for key, value in kept.items()}
+
+        return index
+
+
+    def _aggregate(self, frame, offset, previous):
+        """
+        It aggregates the rows of a frame into one row per segment
+
+        :param frame: the DataFrame with a RangeIndex
+        :param offset: the position of the first row of the frame in the whole file
+        :param previous: the accumulator values of the row before the frame
+        :return: the segment table and the positions of the rows of every segment.
+        """
+
+        work = pandas.DataFrame({key: frame[key].to_numpy().astype('int64') for key in self.keys})
+        work["row"] = numpy.arange(len(frame)) + offset
+        work["time"] = work["row"] if self.time is None else frame[self.time].to_numpy().astype('float64')
+
+        power_values = frame[self.power].to_numpy()
+        work["power"] = power_values
+        work["dchg_row"] = numpy.where(power_values < 0, work["row"], -1)
+        work["chg_row"] = numpy.where(power_values > 0, work["row"], -1)
+
+        grouped = work.groupby(self.keys, sort=False)
+
+        table = grouped.agg(
+            start=("row", "min"),
+            end=("row", "max"),
+            rows=("row", "size"),
+            time_min=("time", "min"),
+            time_max=("time", "max"),
+            power_min=("power", "min"),
+            dchg_last=("dchg_row", "max"),
+            chg_last=("chg_row", "max")
+        )
+
+        first = grouped["time"].idxmin().to_numpy()
+        last = grouped["time"].idxmax().to_numpy()
+
+        table["first"] = first + offset
+        table["last"] = last + offset
+
+        for accumulator in self.accumulators:
+            values = frame[accumulator].to_numpy()
+            before = numpy.concatenate(([previous.get(accumulator, numpy.nan)], values[:-1]))
+
+            table[f"end:{accumulator}"] = values[last]
+            table[f"before:{accumulator}"] = before[first]
+
+        indices = {key: positions + offset for key, positions in grouped.indices.items()}
+
+        return table, indices
+
+
+    def _merge(self, partials):
+        """
+        It merges the tables of several chunks, for the segments that span a chunk boundary
+
+        :param partials: the segment tables of the chunks, in file order
+        """
+
+        if len(partials) == 1:
+            return partials[0]
+
+        parts = pandas.concat(partials).reset_index()
+
+        grouped = parts.groupby(self.keys, sort=False)
+
+        table = grouped.agg(
+            start=("start", "min"),
+            end=("end", "max"),
+            rows=("rows", "sum"),
+            time_min=("time_min", "min"),
+            time_max=("time_max", "max"),
+            power_min=("power_min", "min"),
+            dchg_last=("dchg_last", "max"),
+            chg_last=("chg_last", "max")
+        )
+
+        first = grouped["time_min"].idxmin().to_numpy()
+        last = grouped["time_max"].idxmax().to_numpy()
+
+        table["first"] = parts["first"].to_numpy()[first]
+        table["last"] = parts["last"].to_numpy()[last]
+
+        for accumulator in self.accumulators:
+            table[f"end:{accumulator}"] = parts[f"end:{accumulator}"].to_numpy()[last]
+            table[f"before:{accumulator}"] = parts[f"before:{accumulator}"].to_numpy()[first]
+
+        return table
+
+
+    def _key(self, key):
+        return key[0] if len(self.keys) == 1 else tuple(key)
+
+
+    def segment(self, *key):
+        """
+        It returns the row of the segment table for the given key
+
+        :param key: the segment key, such as (cycle, step)
+        :return: A pandas Series.
+        """
+
+        return self.table.loc[self._key(key)]
+
+
+    def has_segment(self, *key):
+        return self._key(key) in self.table.index
+
+
+    def rows(self, *key, columns=None):
+        """
+        It returns the rows of the segment without scanning the whole frame
+
+        :param key: the segment key, such as (cycle, step)
+        :param columns: the columns to return, all of them if None
+        :return: A DataFrame.
+        """
+
+        df = self.frame.loc[self.indices[self._key(key)]]
+
+        return df if columns is None else df[columns]
+
+
+    def end_value(self, *key, column):
+        """
+        It returns the value of an accumulator at the row with the max step time of the segment
+
+        :param key: the segment key, such as (cycle, step)
+        :param column: the accumulator column
+        """
+
+        return self.table.loc[self._key(key), f"end:{column}"]
+
+
+    def before_value(self, *key, column):
+        """
+        It returns the value of an accumulator at the row just before the row with the min step time
+        of the segment
+
+        :param key: the segment key, such as (cycle, step)
+        :param column: the accumulator column
+        """
+
+        return self.table.loc[self._key(key), f"before:{column}"]
+
+
+    def capacity(self, *key, column):
+        """
+        It returns how much an accumulator grew during the segment, such as the discharged AH of a
+        discharge step
+
+        :param key: the segment key, such as (cycle, step)
+        :param column: the accumulator column
+        """
+
+        return self.before_value(*key, column=column) - self.end_value(*key, column=column)
+
+
+    def last_discharge(self):
+        """
+        It returns the max cycle that has a discharge row, and the max discharge step of that cycle
+        :return: (max_cycle, dchg_step), or max_cycle if the segments only have one key.
+        """
+
+        dchg = self.table[self.table["power_min"] < 0].index.to_frame(index=False)
+
+        max_cycle = int(dchg[self.keys[0]].max())
+
+        if len(self.keys) == 1:
+            return max_cycle
+
+        return max_cycle, int(dchg[dchg[self.keys[0]] == max_cycle][self.keys[1]].max())
+
+
+    def latest_discharge(self):
+        """
+        It returns the key of the segment that holds the last discharge row of the file
+        """
+
+        return self.table["dchg_last"].idxmax()
+
+
+    def last_discharge_row(self):
+        return int(self.table["dchg_last"].max())
+
+
+    def last_charge_row(self):
+        return int(self.table["chg_last"].max())
+
+
+    def segment_of(self, row):
+        """
+        It returns the key of the segment that holds the given row of the frame
+
+        :param row: the row position in the frame
+        """
+
+        return self._key([int(self.frame.loc[row, key]) for key in self.keys])
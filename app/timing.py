@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import threading
+import cProfile
+from contextlib import contextmanager
+
+from config.setting import FILE_PATH, CACHE_DIR
+from common.log import get_logger
+
+
+_local = threading.local()
+
+
+def record(**counts):
+    """
+    It adds counts, such as rows and bytes, to the stats of the file being extracted by this thread, if
+    any
+
+    :param counts: the counts to add
+    """
+
+    stats = getattr(_local, "stats", None)
+
+    if stats is not None:
+        for key, value in counts.items():
+            stats[key] = stats.get(key, 0) + value
+
+
+@contextmanager
+def collect():
+    """
+    It collects what record() is given in the block, and the duration of the block
+    """
+
+    previous = getattr(_local, "stats", None)
+    stats = {}
+
+    _local.stats = stats
+    start = time.perf_counter()
+
+    try:
+        yield stats
+    finally:
+        stats["seconds"] = round(time.perf_counter() - start, 4)
+        _local.stats = previous
+
+
+def timed_call(func, *args):
+    """
+    It runs func in a worker of the pool and returns its result with the stats of the call
+
+    :return: (result, stats)
+    """
+
+    with collect() as stats:
+        result = func(*args)
+
+    return result, stats
+
+
+def log_timing(event, **fields):
+    """
+    It writes one structured timing record to the log
+
+    :param event: the name of the record, such as "parse" or "extract_file"
+    :param fields: the fields of the record
+    """
+
+    logger = get_logger()
+    logger.info(f"timing {json.dumps(dict(event=event, **fields), ensure_ascii=False, default=str)}")
+
+
+# It's a class that measures the stages of a parse, and logs them as one record
+class StageTimer(object):
+    def __init__(self, event, **fields):
+        """
+        :param event: the name of the record
+        :param fields: the fields that identify what is timed, such as the task id and the item
+        """
+
+        self.event = event
+        self.fields = fields
+        self.stages = {}
+        self.start = time.perf_counter()
+
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.stages[name] = round(self.stages.get(name, 0) + time.perf_counter() - start, 4)
+
+
+    def log(self, **fields):
+        log_timing(self.event, **self.fields, **fields, stages=self.stages, seconds=round(time.perf_counter() - self.start, 4))
+
+
+_profile_lock = threading.Lock()
+
+
+def can_profile():
+    """
+    It tells whether a block can be profiled in this process. cProfile profiles a whole OS thread, in
+    a gevent worker that is the thread every request runs on, and a second profiler would replace the
+    first one.
+
+    :return: True, "" or False, message
+    """
+
+    try:
+        import gevent.monkey
+
+        if gevent.monkey.is_module_patched("threading"):
+            return False, "Profiling is not available in the web workers, submit the parse with submit_parse_job and profile=True."
+    except ImportError:
+        pass
+
+    if _profile_lock.locked():
+        return False, "Another parse is being profiled in this process."
+
+    return True, ""
+
+
+@contextmanager
+def profiled(task_id, name, enabled=True):
+    """
+    It runs the block under cProfile and saves the profile in <task>/.cache/profile, to be read with
+    pstats or snakeviz. Only this process is profiled, not the workers of the pool, and one block at a
+    time, see can_profile.
+
+    :param task_id: the task id
+    :param name: the name of the profile file, without extension
+    :param enabled: False to run the block without profiling
+    """
+
+    if not enabled:
+        yield None
+        return
+
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("Another parse is being profiled in this process.")
+
+    profile_path = os.path.join(FILE_PATH, task_id, CACHE_DIR, "profile")
+    profile_file = os.path.join(profile_path, f"{name}-{time.strftime('%Y%m%d%H%M%S')}.prof")
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+    try:
+        yield profile_file
+    finally:
+        profiler.disable()
+        _profile_lock.release()
+
+        os.makedirs(profile_path, exist_ok=True)
+        profiler.dump_stats(profile_file)
+
+        log_timing("profile", task_id=task_id, file=profile_file)
@@ -0,0 +1,213 @@
+import os
+import shutil
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config.setting import ITEM_LIST, UNZIP_THREADS, UNZIP_LARGE
+
+
+def member_name(info):
+    """
+    It returns the name of a zip member as it was written. zipfile decodes the names without the
+    UTF-8 flag as cp437, while the archivers of Chinese Windows write them in gbk.
+
+    :param info: a ZipInfo
+    :return: The decoded name.
+    """
+
+    if info.flag_bits & 0x800:
+        return info.filename
+
+    try:
+        return info.filename.encode('cp437').decode('gbk')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return info.filename
+
+
+def read_members(zip_path):
+    """
+    It reads the members of a zip file from its central directory, without extracting anything
+
+    :param zip_path: the path to the zip file
+    :return: True, [(ZipInfo, name parts)] where the name parts are the decoded name split on '/'
+    """
+
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as zip_file:
+            infos = zip_file.infolist()
+    except (zipfile.BadZipFile, OSError) as e:
+        return False, f"Caught exception: {e.__doc__}({e})"
+
+    members = []
+
+    for info in infos:
+        name = member_name(info).replace('\\', '/')
+        parts = name.rstrip('/').split('/')
+
+        if name.startswith('/') or any([part in ("", ".", "..") for part in parts]):
+            return False, f"{name} is invalid."
+
+        members.append((info, parts))
+
+    if len(members) == 0:
+        return False, "The zip file is empty."
+
+    top = members[0][1][0]
+
+    for info, parts in members:
+        if parts[0] != top:
+            return False, f"{'/'.join(parts)} is invalid."
+
+    return True, members
+
+
+def validate_test_upload(zip_path):
+    """
+    It checks that a test upload is laid out as <folder>/<gbt>/<category>/<item>/... with the gbt,
+    category and item of ITEM_LIST, from the central directory of the zip file
+
+    :param zip_path: the path to the zip file
+    :return: True, [[gbt, category, item]] or False, message
+    """
+
+    ret, members = read_members(zip_path)
+    if ret is False:
+        return ret, members
+
+    test_dirs = []
+
+    for info, parts in members:
+        levels = parts[1:4]
+
+        for depth, name in enumerate(levels):
+            # a file can not stand where a gbt, category or item folder is expected
+            if depth == len(parts) - 2 and not info.is_dir():
+                return False, f"{'/'.join(parts)} is invalid."
+
+            if depth == 0 and name not in ITEM_LIST:
+                return False, f"{'/'.join(parts[:2])} is invalid."
+
+            if depth == 1 and name not in ITEM_LIST[levels[0]]:
+                return False, f"{'/'.join(parts[:3])} is invalid."
+
+            if depth == 2 and name not in ITEM_LIST[levels[0]][levels[1]]:
+                return False, f"{'/'.join(parts[:4])} is invalid."
+
+        if len(levels) == 3 and levels not in test_dirs:
+            test_dirs.append(levels)
+
+    return True, test_dirs
+
+
+def validate_item_upload(zip_path):
+    """
+    It checks that an item upload is laid out as <folder>/<sample>/... from the central directory of
+    the zip file, the samples must not be named like a gbt
+
+    :param zip_path: the path to the zip file
+    :return: True, [sample] or False, message
+    """
+
+    ret, members = read_members(zip_path)
+    if ret is False:
+        return ret, members
+
+    samples_dirs = []
+
+    for info, parts in members:
+        if len(parts) < 2:
+            continue
+
+        if parts[1] in ITEM_LIST:
+            return False, f"{parts[1]} is invalid."
+
+        if parts[1] not in samples_dirs:
+            samples_dirs.append(parts[1])
+
+    return True, samples_dirs
+
+
+def extract_zip(zip_path, dest_path, threads=UNZIP_THREADS, large=UNZIP_LARGE):
+    """
+    It extracts every member of a zip file once, straight to dest_path joined with its decoded name
+    without the top folder. The members of at least `large` bytes are extracted on a few threads,
+    each with a zip file of its own.
+
+    :param zip_path: the path to the zip file
+    :param dest_path: the directory that stands for the top folder of the zip file
+    :param threads: the max number of large members extracted at a time
+    :param large: the size from which a member is extracted on a thread
+    :return: A tuple of two values.
+    """
+
+    ret, members = read_members(zip_path)
+    if ret is False:
+        return ret, members
+
+    local = threading.local()
+
+    def extract(zip_file, info, path):
+        # a file placed by link_or_copy shares its data with the staged upload, it is replaced, not
+        # written through
+        if os.path.lexists(path):
+            os.unlink(path)
+
+        with zip_file.open(info) as src, open(path, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+
+    def extract_large(info, path):
+        if not hasattr(local, "zip_file"):
+            local.zip_file = zipfile.ZipFile(zip_path, 'r')
+            zip_files.append(local.zip_file)
+
+        extract(local.zip_file, info, path)
+
+    zip_files = []
+    futures = []
+
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as zip_file, ThreadPoolExecutor(max_workers=threads) as executor:
+            for info, parts in members:
+                path = os.path.join(dest_path, *parts[1:])
+
+                if info.is_dir():
+                    os.makedirs(path, exist_ok=True)
+                    continue
+
+                if len(parts) == 1:
+                    continue
+
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+
+                if info.file_size >= large:
+                    futures.append(executor.submit(extract_large, info, path))
+                else:
+                    extract(zip_file, info, path)
+
+            for future in futures:
+                future.result()
+    except Exception as e:
+        return False, f"Caught exception: {e.__doc__}({e})"
+    finally:
+        for thread_zip in zip_files:
+            thread_zip.close()
+
+    return True, ""
+
+
+def link_or_copy(src, dst):
+    """
+    It places a file of a staged upload at its item path as a hardlink, or as a copy when the two
+    paths are not on the same file system. It is the copy_function of shutil.copytree.
+    """
+
+    if os.path.lexists(dst):
+        os.unlink(dst)
+
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+    return dst
@@ -0,0 +1,164 @@
+import os
+import pathlib
+
+import numpy
+import pandas
+
+from config.setting import ITEM_LIST
+
+
+ARBIN_COLUMNS = ['Data Point', 'Total Time, S', 'Cycle', 'Step', 'Step time, S', 'Current, A', 'Voltage, V', 'Power, W', 'Amp-Hours, AH', 'Amp Hours Discharge, AH']
+
+DIGATRON_COLUMNS = ['cycle_1', 'TestTime.1', 'ABCVoltage', 'ABCCurrent', 'ABCAhOut', 'ABCkWhOut', 'ABCCommandMode', 'StopCondition']
+
+# the items whose class reads more cycles than the default count
+MIN_CYCLES = {
+    "CellStandardCycleLife": 501
+}
+
+
+def _cycle_steps(cycles, rows_per_step, capacity, rng, interval=10):
+    """
+    It builds the rest / charge / rest / discharge steps of every cycle as columns of numpy arrays
+
+    :param cycles: the number of cycles
+    :param rows_per_step: the number of rows of every step
+    :param capacity: the capacity of the first cycle in Ah, it fades by 0.02% per cycle
+    :param rng: a numpy random Generator
+    :param interval: the seconds between two rows
+    """
+
+    steps = 4
+    n = cycles * steps * rows_per_step
+
+    cycle = numpy.repeat(numpy.arange(1, cycles + 1), steps * rows_per_step)
+    step = numpy.tile(numpy.repeat(numpy.arange(1, steps + 1), rows_per_step), cycles)
+    step_time = numpy.tile(1 + interval * numpy.arange(rows_per_step, dtype='float64'), cycles * steps)
+    progress = numpy.tile(numpy.arange(rows_per_step) / (rows_per_step - 1), cycles * steps)
+
+    step_capacity = capacity * (1 - 0.0002 * (cycle - 1)) * (1 + rng.normal(0, 0.001, n))
+    current = step_capacity * 3600 / (interval * rows_per_step)
+
+    current = numpy.select([step == 2, step == 4], [current, -current], 0.0)
+    voltage = numpy.select([step == 2, step == 4], [3.0 + 1.2 * progress, 4.2 - 1.2 * progress ** 1.5], numpy.where(step == 1, 3.0, 4.2))
+    voltage = voltage + rng.normal(0, 0.002, n)
+
+    amp_hours = current * (step_time - 1 + interval) / 3600
+    discharged = numpy.cumsum(numpy.where(current < 0, current * interval / 3600, 0.0))
+
+    return {
+        'Data Point': numpy.arange(1, n + 1),
+        'Total Time, S': interval * numpy.arange(n, dtype='float64'),
+        'Cycle': cycle,
+        'Step': step,
+        'Step time, S': step_time,
+        'Current, A': current.round(3),
+        'Voltage, V': voltage.round(4),
+        'Power, W': (current * voltage).round(3),
+        'Amp-Hours, AH': amp_hours.round(4),
+        'Amp Hours Discharge, AH': discharged.round(4)
+    }
+
+
+def write_arbin_csv(csv_file, cycles, rows_per_step=30, capacity=50.0, seed=0):
+    """
+    It writes an Arbin-style cycler export: 13 lines of test header, then the data rows, in GBK
+
+    :param csv_file: the path to the csv file
+    :param cycles: the number of cycles
+    :param rows_per_step: the number of rows of every step
+    :param capacity: the discharge capacity of the first cycle in Ah
+    :param seed: the seed of the noise
+    :return: The number of data rows.
+    """
+
+    df = pandas.DataFrame(_cycle_steps(cycles, rows_per_step, capacity, numpy.random.default_rng(seed)), columns=ARBIN_COLUMNS)
+
+    header = ["测试名称,benchmark", "通道,1", f"样本,{pathlib.Path(csv_file).parent.parent.name}", "开始时间,2022-01-01 00:00:00"]
+    header += [f"备注{i},-" for i in range(len(header), 13)]
+
+    with open(csv_file, "w", encoding='gbk', newline='') as f:
+        f.write("\n".join(header) + "\n")
+        df.to_csv(f, index=False)
+
+    return len(df)
+
+
+def write_digatron_dats(dat_path, cycles, rows_per_step=30, capacity=100.0, seed=0):
+    """
+    It writes a Digatron-style test as one whitespace separated .dat file per cycle
+
+    :param dat_path: the 设备数据 directory of the sample
+    :param cycles: the number of cycles
+    :param rows_per_step: the number of rows of every step
+    :param capacity: the discharge capacity of the first cycle in Ah
+    :param seed: the seed of the noise
+    :return: The number of data rows.
+    """
+
+    steps = _cycle_steps(cycles, rows_per_step, capacity, numpy.random.default_rng(seed))
+
+    energy = numpy.where(steps['Current, A'] < 0, steps['Amp-Hours, AH'] * steps['Voltage, V'] * 100 / 1000, 0.0)
+
+    df = pandas.DataFrame({
+        'cycle_1': steps['Cycle'],
+        'TestTime.1': steps['Total Time, S'],
+        'ABCVoltage': (steps['Voltage, V'] * 100).round(2),
+        'ABCCurrent': steps['Current, A'],
+        'ABCAhOut': steps['Amp Hours Discharge, AH'],
+        'ABCkWhOut': energy.round(5),
+        'ABCCommandMode': numpy.where(steps['Step'] % 2 == 0, 1, 0),
+        'StopCondition': numpy.where(steps['Step'] % 2 == 0, 1, 0)
+    }, columns=DIGATRON_COLUMNS)
+
+    for cycle, cycle_df in df.groupby('cycle_1'):
+        cycle_df.to_csv(os.path.join(dat_path, f"cycle_{cycle:04d}.dat"), sep=' ', index=False)
+
+    pathlib.Path(dat_path, "重量").mkdir(exist_ok=True)
+    pathlib.Path(dat_path, "重量", "重量.txt").write_text("500kg", encoding='utf8')
+
+    return len(df)
+
+
+def generate_task(root_path, task_id, samples=3, cycles=10, rows_per_step=30, seed=0):
+    """
+    It lays out synthetic device data for every item of ITEM_LIST as
+    <root_path>/<task_id>/<gbt>/<category>/<item>/<sample>/设备数据
+
+    :param root_path: the data directory, FILE_PATH in production
+    :param task_id: the task id
+    :param samples: the number of samples of every item
+    :param cycles: the number of cycles of every sample, raised to MIN_CYCLES where an item needs more
+    :param rows_per_step: the number of rows of every step
+    :param seed: the seed of the noise
+    :return: A dictionary of (gbt, category, item) to the number of data rows written.
+    """
+
+    rows = {}
+
+    for gbt, categories in ITEM_LIST.items():
+        for category, items in categories.items():
+            for item, class_name in items.items():
+                if class_name == "DefaultItem":
+                    continue
+
+                rows[(gbt, category, item)] = 0
+
+                item_cycles = max(cycles, MIN_CYCLES.get(class_name, 0))
+
+                for i in range(samples):
+                    dat_path = os.path.join(root_path, task_id, gbt, category, item, f"样品{i + 1}", "设备数据")
+                    pathlib.Path(dat_path).mkdir(parents=True, exist_ok=True)
+
+                    if class_name.startswith("Pack"):
+                        rows[(gbt, category, item)] += write_digatron_dats(dat_path, item_cycles, rows_per_step, seed=seed + i)
+                    else:
+                        rows[(gbt, category, item)] += write_arbin_csv(os.path.join(dat_path, f"样品{i + 1}.csv"), item_cycles, rows_per_step, seed=seed + i)
+
+            if "比功率" in items:
+                mass_path = os.path.join(root_path, task_id, gbt, category, "尺寸质量", "设备数据")
+                pathlib.Path(mass_path).mkdir(parents=True, exist_ok=True)
+
+                pandas.DataFrame({"样品编号": [f"样品{i + 1}" for i in range(samples)], "模组质量/kg": [12.5] * samples}).to_excel(os.path.join(mass_path, "质量.xlsx"), index=False)
+
+    return rows
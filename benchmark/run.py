@@ -0,0 +1,153 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import datetime
+
+import app.cell
+import app.mod
+import app.pack
+from config.setting import FILE_PATH, ITEM_LIST, SampleCategory
+from app.item import DefaultItem
+from app.context import TaskContext
+from app.pool import get_executor, warm_pool
+from benchmark.generate import generate_task
+
+
+CLASSES = dict({name: getattr(module, name) for module in (app.cell, app.mod, app.pack) for name in module.__all__}, DefaultItem=DefaultItem)
+
+
+PRODUCTS = {
+    (SampleCategory.CELL, '额定容量（Ah）'): '50',
+    (SampleCategory.CELL, '产品类型'): '■能量型□功率型',
+    (SampleCategory.MOD, '额定容量（Ah）'): '50',
+    (SampleCategory.PACK, '额定容量（Ah）'): '100Ah'
+}
+
+
+def seeded_context(task_id):
+    """
+    It returns a TaskContext that already holds the product info, so that the items never query
+    Postgres. The item results are filled in as the items are parsed.
+    """
+
+    context = TaskContext(task_id)
+    context.products = dict(PRODUCTS)
+    context.results = {}
+
+    return context
+
+
+def _pids():
+    return [os.getpid()] + list(getattr(get_executor(), "_processes", {}))
+
+
+def _reset_peak_rss(pids):
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            pass
+
+
+def _peak_rss(pids):
+    """
+    It returns the max peak RSS in MB of the given processes since their peaks were last reset
+    """
+
+    peak = 0
+
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        peak = max(peak, int(line.split()[1]))
+        except OSError:
+            pass
+
+    return round(peak / 1024, 1)
+
+
+def run_benchmark(root_path, task_id, samples, cycles, rows_per_step, repeat):
+    """
+    It generates the data of a task, then times preprocess() of every item class of ITEM_LIST, the
+    prerequisites first
+
+    :return: A list of dictionaries, one per item and run.
+    """
+
+    rows = generate_task(root_path, task_id, samples, cycles, rows_per_step)
+
+    items = list(rows)
+    items.sort(key=lambda key: len(CLASSES[ITEM_LIST[key[0]][key[1]][key[2]]].prerequisites) > 0)
+
+    warm_pool()
+
+    reports = []
+
+    for run in range(repeat):
+        context = seeded_context(task_id)
+
+        for gbt, category, item in items:
+            instance = CLASSES[ITEM_LIST[gbt][category][item]](task_id, gbt, category, item, context)
+            instance.item_path = os.path.join(root_path, task_id, gbt, category, item)
+
+            pids = _pids()
+            _reset_peak_rss(pids)
+
+            start = time.perf_counter()
+            ret, result = instance.preprocess()
+            wall = time.perf_counter() - start
+
+            if ret is True and result:
+                context.set_item_result(gbt, category, item, result)
+
+            reports.append({
+                "run": run + 1,
+                "gbt": gbt,
+                "category": category,
+                "item": item,
+                "class": type(instance).__name__,
+                "ok": ret is True and bool(result),
+                "rows": rows[(gbt, category, item)],
+                "wall_s": round(wall, 3),
+                "rows_per_s": round(rows[(gbt, category, item)] / wall) if wall > 0 else 0,
+                "peak_rss_mb": _peak_rss(pids)
+            })
+
+            print("{run:>3} {class:<28} {ok!s:<5} {rows:>10} {wall_s:>9.3f} {rows_per_s:>12} {peak_rss_mb:>9}  {gbt}/{category}/{item}".format(**reports[-1]), flush=True)
+
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time preprocess() of every item class on synthetic cycler data.")
+    parser.add_argument("--root", default=FILE_PATH, help="the data directory the task is generated in")
+    parser.add_argument("--task", default=f"benchmark-{datetime.datetime.now():%Y%m%d%H%M%S}", help="the task id")
+    parser.add_argument("--samples", type=int, default=3, help="the number of samples of every item")
+    parser.add_argument("--cycles", type=int, default=10, help="the number of cycles of every sample")
+    parser.add_argument("--rows-per-step", type=int, default=30, help="the number of rows of every step")
+    parser.add_argument("--repeat", type=int, default=1, help="the number of runs, the later ones hit the caches")
+    parser.add_argument("--json", help="the file the reports are written to")
+    parser.add_argument("--keep", action="store_true", help="keep the generated task")
+    args = parser.parse_args()
+
+    print(f"{'run':>3} {'class':<28} {'ok':<5} {'rows':>10} {'wall_s':>9} {'rows_per_s':>12} {'peak_mb':>9}  item")
+
+    try:
+        reports = run_benchmark(args.root, args.task, args.samples, args.cycles, args.rows_per_step, args.repeat)
+    finally:
+        if not args.keep:
+            shutil.rmtree(os.path.join(args.root, args.task), ignore_errors=True)
+            shutil.rmtree(os.path.join(FILE_PATH, args.task), ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding='utf-8') as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import zipfile
+
+from lxml import etree
+
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+# the elements whose text is not part of the paragraph: deleted or moved away runs, and the paragraphs
+# of the text boxes drawn in it
+_SKIPPED = (f"{W}del", f"{W}moveFrom", f"{W}p")
+
+
+def _paragraph_text(p):
+    """
+    It returns the text of a w:p element from all of its runs, those in hyperlinks, insertions, smart
+    tags and fields included, but not the deleted ones
+    """
+
+    text = ""
+
+    for child in p.iterchildren():
+        if child.tag in _SKIPPED:
+            continue
+
+        if child.tag == f"{W}t":
+            text += child.text or ""
+        elif child.tag == f"{W}tab":
+            text += "\t"
+        elif child.tag in (f"{W}br", f"{W}cr"):
+            text += "\n"
+        else:
+            text += _paragraph_text(child)
+
+    return text
+
+
+def _cell(tc):
+    """
+    It returns the texts of the paragraphs of a w:tc element, its grid span, and its vMerge value
+    """
+
+    span = 1
+    merge = None
+
+    tc_pr = tc.find(f"{W}tcPr")
+
+    if tc_pr is not None:
+        grid_span = tc_pr.find(f"{W}gridSpan")
+        if grid_span is not None:
+            span = int(grid_span.get(f"{W}val"))
+
+        v_merge = tc_pr.find(f"{W}vMerge")
+        if v_merge is not None:
+            merge = v_merge.get(f"{W}val", "continue")
+
+    return [_paragraph_text(p) for p in tc.iterchildren(f"{W}p")], span, merge
+
+
+def _table_rows(tbl):
+    """
+    It lays out the cells of a w:tbl element on its grid like python-docx Table._cells: a cell is
+    repeated over the columns it spans, a cell continuing a vertical merge is the cell above it, and
+    row i is the i-th run of col_count cells.
+
+    :return: A list of rows, each a list of cells, each a list of paragraph texts.
+    """
+
+    tbl_grid = tbl.find(f"{W}tblGrid")
+    col_count = len(tbl_grid.findall(f"{W}gridCol"))
+
+    cells = []
+    row_count = 0
+
+    for tr in tbl.iterchildren(f"{W}tr"):
+        row_count += 1
+
+        for tc in tr.iterchildren(f"{W}tc"):
+            paragraphs, span, merge = _cell(tc)
+
+            for i in range(span):
+                if merge == "continue":
+                    cells.append(cells[-col_count])
+                elif i > 0:
+                    cells.append(cells[-1])
+                else:
+                    cells.append(paragraphs)
+
+    return [cells[i * col_count:(i + 1) * col_count] for i in range(row_count)]
+
+
+def iter_docx_tables(docx_file):
+    """
+    It reads the top-level tables of a .docx file from word/document.xml with iterparse, one table at
+    a time, so that the whole document is never held in memory. The cells are laid out as python-docx
+    does for Document(docx_file).tables, with the text of every run of their paragraphs.
+
+    :param docx_file: the path to the .docx file
+    :return: A generator of tables, each a list of rows, each a list of cells, each a list of the
+    texts of the paragraphs of the cell.
+    """
+
+    with zipfile.ZipFile(docx_file, "r") as zip_file:
+        with zip_file.open("word/document.xml") as f:
+            body = None
+
+            for event, elem in etree.iterparse(f, events=("start", "end")):
+                if event == "start":
+                    if elem.tag == f"{W}body":
+                        body = elem
+                    continue
+
+                if body is None or elem.getparent() is not body:
+                    continue
+
+                if elem.tag == f"{W}tbl":
+                    yield _table_rows(elem)
+
+                elem.clear()
+
+                while elem.getprevious() is not None:
+                    del body[0]
@@ -0,0 +1,80 @@
+import os
+import atexit
+
+from config.setting import METRICS_PATH, DatabaseTable
+
+# prometheus_client picks its multiprocess storage when it is imported, so the directory is set first
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", METRICS_PATH)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+
+API_REQUESTS = Counter("catarc_api_requests_total", "The number of calls of /api/<func>.", ["func"])
+API_ERRORS = Counter("catarc_api_errors_total", "The number of calls of /api/<func> that failed.", ["func"])
+API_LATENCY = Histogram("catarc_api_latency_seconds", "The seconds /api/<func> took until the response was ready.", ["func"],
+                        buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+API_RESPONSE_BYTES = Counter("catarc_api_response_bytes_total", "The bytes sent by /api/<func>, streamed bodies included.", ["func"])
+
+DOWNLOAD_BYTES = Counter("catarc_download_bytes_total", "The bytes sent by the download endpoints.", ["func"])
+
+POOL_PENDING = Gauge("catarc_pool_pending", "The tasks submitted to the worker pools and not finished yet.", multiprocess_mode="livesum")
+DB_CONNECTIONS = Gauge("catarc_db_connections_in_use", "The database connections handed out by the connection pools.", multiprocess_mode="livesum")
+
+
+@atexit.register
+def _mark_dead():
+    multiprocess.mark_process_dead(os.getpid())
+
+
+def count_stream(func, chunks):
+    """
+    It passes the chunks of a streamed download through, counting their bytes as they are sent, since
+    the size of a streamed response is not known by after_request
+
+    :param func: the name of the api function
+    :param chunks: an iterable of bytes
+    :return: A generator of bytes.
+    """
+
+    for chunk in chunks:
+        DOWNLOAD_BYTES.labels(func).inc(len(chunk))
+        API_RESPONSE_BYTES.labels(func).inc(len(chunk))
+
+        yield chunk
+
+
+# It's a collector that reads the number of parse jobs of every status from the job table at scrape time
+class JobCollector(object):
+    def collect(self):
+        from common.postgres_driver import create_conn, fetch_all
+
+        jobs = GaugeMetricFamily("catarc_parse_jobs", "The parse jobs of the job table, by status.", labels=["status"])
+
+        with create_conn() as conn:
+            ret, data = fetch_all(conn, f"SELECT status, count(*) FROM {DatabaseTable.JOB} WHERE status IN ('queued','running') GROUP BY status")
+
+        if ret is True:
+            counts = dict(data)
+
+            for status in ("queued", "running"):
+                jobs.add_metric([status], counts.get(status, 0))
+
+        yield jobs
+
+
+def render_metrics():
+    """
+    It aggregates the metrics of every process that wrote to the multiprocess directory, gunicorn
+    workers, their pool workers and the job worker, and adds the parse jobs of the job table
+
+    :return: the body and the content type of the /metrics response.
+    """
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(JobCollector())
+
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,48 +1,258 @@
+import io
+import os
+import json
+import math
+import time
+import threading
 from contextlib import contextmanager
 
 import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+
+from config.setting import POSTGRESQL, POSTGRESQL_POOL
+from common.metrics import DB_CONNECTIONS
+
+
+def gevent_wait_callback(conn, timeout=None):
+    """
+    It waits for a psycopg2 connection by yielding to the gevent hub instead of blocking the worker
+    
+    :param conn: the connection or cursor that is waiting
+    :param timeout: the timeout of every wait, None for no timeout
+    """
+
+    from gevent.socket import wait_read, wait_write
+
+    while True:
+        state = conn.poll()
+
+        if state == psycopg2.extensions.POLL_OK:
+            break
+        elif state == psycopg2.extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == psycopg2.extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(f"Bad result from poll: {state}")
+
+
+def _gevent_patched():
+    try:
+        import gevent.monkey
+    except ImportError:
+        return False
+
+    return gevent.monkey.is_module_patched("socket")
+
+
+# It's a class that keeps open connections to the database and hands them out to create_conn
+class ConnectionPool(object):
+    def __init__(self, min_size=1, max_size=10, timeout=30, max_lifetime=3600, check_idle=30):
+        """
+        :param min_size: the number of connections kept open while idle
+        :param max_size: the max number of connections open at a time
+        :param timeout: the seconds to wait for a free connection when max_size are in use
+        :param max_lifetime: the seconds after which a connection is closed and replaced
+        :param check_idle: the seconds a connection may stay idle before it is checked with SELECT 1
+        """
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_idle = check_idle
+
+        self.pid = os.getpid()
+        self.idle = []
+        self.size = 0
+        self.condition = threading.Condition()
+
+        self.stats = {
+            "connects": 0,
+            "requests": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "checks_failed": 0,
+            "expired": 0,
+            "discarded": 0
+        }
+
+        if _gevent_patched():
+            psycopg2.extensions.set_wait_callback(gevent_wait_callback)
+
+
+    def _connect(self):
+        conn = psycopg2.connect(
+            database=POSTGRESQL.get("database"),
+            user=POSTGRESQL.get("user"),
+            password=POSTGRESQL.get("password"),
+            host=POSTGRESQL.get("host"),
+            port=POSTGRESQL.get("port")
+        )
+
+        self.stats["connects"] += 1
+
+        return [conn, time.monotonic(), time.monotonic()]
+
+
+    def _usable(self, entry):
+        """
+        It tells whether an idle connection can be handed out, after checking it when it is too old
+        or was idle for too long
+        """
+
+        conn, created, used = entry
+        now = time.monotonic()
+
+        if conn.closed:
+            return False
+
+        if now - created > self.max_lifetime:
+            self.stats["expired"] += 1
+            return False
+
+        if now - used > self.check_idle:
+            try:
+                with conn.cursor() as curs:
+                    curs.execute("SELECT 1")
+                conn.rollback()
+            except Exception:
+                self.stats["checks_failed"] += 1
+                return False
+
+        return True
+
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+    def getconn(self):
+        """
+        It returns an open connection, waiting up to timeout seconds when max_size are in use
+        """
+
+        deadline = time.monotonic() + self.timeout
+
+        with self.condition:
+            self.stats["requests"] += 1
+
+            while not self.idle and self.size >= self.max_size:
+                self.stats["waits"] += 1
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.condition.wait(remaining):
+                    if not self.idle and self.size >= self.max_size:
+                        self.stats["timeouts"] += 1
+                        raise psycopg2.OperationalError(f"No connection available in {self.timeout} seconds.")
+
+            entry = self.idle.pop() if self.idle else None
+            self.size += 1
+
+        DB_CONNECTIONS.inc()
+
+        try:
+            while entry is not None and not self._usable(entry):
+                self._close(entry[0])
+
+                with self.condition:
+                    entry = self.idle.pop() if self.idle else None
+
+            if entry is None:
+                entry = self._connect()
+        except Exception:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+
+            DB_CONNECTIONS.dec()
+            raise
+
+        return entry
+
+
+    def putconn(self, entry):
+        """
+        It gives a connection back to the pool, or closes it when it is broken or the pool has enough
+        idle connections
+        """
+
+        conn = entry[0]
+
+        if not conn.closed and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except Exception:
+                self._close(conn)
+
+        DB_CONNECTIONS.dec()
+
+        with self.condition:
+            self.size -= 1
+
+            if conn.closed or len(self.idle) >= self.max_size:
+                self.stats["discarded"] += 1
+                self._close(conn)
+            else:
+                entry[2] = time.monotonic()
+                self.idle.append(entry)
+
+            while len(self.idle) > self.min_size and time.monotonic() - self.idle[0][2] > self.check_idle:
+                self._close(self.idle.pop(0)[0])
+
+            self.condition.notify()
+
+
+    def status(self):
+        """
+        It returns the size of the pool and its counters
+        """
+
+        with self.condition:
+            return dict(self.stats, pid=self.pid, size=self.size + len(self.idle), in_use=self.size, idle=len(self.idle))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    It returns the connection pool of this process. A forked process, such as a gunicorn worker
+    started with --preload, never reuses the connections of its parent and gets a pool of its own.
+    """
+
+    global _pool
+
+    if _pool is None or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                _pool = ConnectionPool(**POSTGRESQL_POOL)
+
+    return _pool
 
-from config.setting import POSTGRESQL
 
 @contextmanager
 def create_conn():
     """
-    It creates a connection to the database, and then yields it to the caller. 
-    
-    The caller can then use the connection to execute queries. 
-    
-    When the caller is done, the connection is closed. 
-    
-    The connection is closed even if an exception is raised. 
-    
-    This is a very common pattern in Python. 
-    
-    It's called a context manager. 
+    It takes a connection from the pool of this process, and then yields it to the caller. 
     
-    It's a way to ensure that resources are cleaned up when they're no longer needed. 
+    When the caller is done, the connection goes back to the pool, even if an exception is raised. 
     
-    The yield statement is what makes this a context manager. 
-    
-    It's a way to pass a value to the caller, and then get control back later on. 
-    
-    The caller uses the connection like this:
+    An unfinished transaction is rolled back first, and a broken connection is closed instead. 
     """
 
-    conn = psycopg2.connect(
-        database=POSTGRESQL.get("database"),
-        user=POSTGRESQL.get("user"),
-        password=POSTGRESQL.get("password"),
-        host=POSTGRESQL.get("host"),
-        port=POSTGRESQL.get("port")
-    )
+    pool = get_pool()
+    entry = pool.getconn()
 
     try:
-        yield conn
+        yield entry[0]
     finally:
-        try:
-            conn.close()
-        except:
-            pass
+        pool.putconn(entry)
 
 
 def execute_sqls(conn, sqls):
@@ -95,6 +305,101 @@ def execute_many(conn, sql, data):
         return False, f"Caught exception: {e.__doc__}({e})"
 
 
+def copy_rows(conn, table, columns, rows, sqls=None, page_size=1000):
+    """
+    It loads rows into a table with COPY FROM STDIN, in one round trip, after the given SQL
+    statements and in the same transaction. psycopg2 does not allow COPY while a wait callback is
+    set, as in the gevent workers, the rows are then inserted with multi-row INSERTs instead.
+
+    :param conn: the connection to the database
+    :param table: the table, such as DatabaseTable.PRODUCT
+    :param columns: the names of the columns of the rows
+    :param rows: a list of lists, None is written as NULL
+    :param sqls: the SQL statements to execute first, such as a DELETE of the rows replaced
+    :param page_size: the max number of rows of an INSERT, when COPY can not be used
+    :return: A tuple of two values.
+    """
+
+    try:
+        if sqls is None:
+            sqls = []
+        elif not isinstance(sqls, list):
+            sqls = [sqls]
+
+        if psycopg2.extensions.get_wait_callback() is not None:
+            with conn:
+                with conn.cursor() as curs:
+                    for sql in sqls:
+                        curs.execute(sql)
+
+                    psycopg2.extras.execute_values(curs, f"INSERT INTO {table}({','.join(columns)}) VALUES %s", rows, page_size=page_size)
+
+                conn.commit()
+
+            return True, ""
+
+        # every value is quoted, so that an empty string is not read as NULL, and None is an unquoted \N
+        buf = io.StringIO()
+
+        for row in rows:
+            buf.write(','.join(['\\N' if v is None else '"' + str(v).replace('"', '""') + '"' for v in row]) + '\n')
+
+        buf.seek(0)
+
+        with conn:
+            with conn.cursor() as curs:
+                for sql in sqls:
+                    curs.execute(sql)
+
+                curs.copy_expert(f"COPY {table}({','.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buf)
+
+            conn.commit()
+
+        return True, ""
+    except Exception as e:
+        return False, f"Caught exception: {e.__doc__}({e})"
+
+
+def upsert_many(conn, table, columns, rows, key, sqls=None, page_size=1000):
+    """
+    It inserts rows, or updates the non-key columns of the rows whose key already exists, with
+    INSERT ... ON CONFLICT DO UPDATE, page_size rows per statement, after the given SQL statements
+    and in the same transaction
+
+    :param conn: the connection to the database
+    :param table: the table, such as DatabaseTable.STAT
+    :param columns: the names of the columns of the rows
+    :param rows: a list of lists
+    :param key: the names of the columns of a unique key of the table
+    :param sqls: the SQL statements to execute first
+    :param page_size: the max number of rows of a statement
+    :return: A tuple of two values.
+    """
+
+    try:
+        if sqls is None:
+            sqls = []
+        elif not isinstance(sqls, list):
+            sqls = [sqls]
+
+        updates = ','.join([f"{column}=EXCLUDED.{column}" for column in columns if column not in key])
+
+        insert = f"INSERT INTO {table}({','.join(columns)}) VALUES %s ON CONFLICT ({','.join(key)}) DO " + (f"UPDATE SET {updates}" if updates else "NOTHING")
+
+        with conn:
+            with conn.cursor() as curs:
+                for sql in sqls:
+                    curs.execute(sql)
+
+                psycopg2.extras.execute_values(curs, insert, rows, page_size=page_size)
+
+            conn.commit()
+
+        return True, ""
+    except Exception as e:
+        return False, f"Caught exception: {e.__doc__}({e})"
+
+
 def fetch_one(conn, sql):
     """
     It takes a connection and a SQL statement as input, executes the SQL statement, and returns the
@@ -133,4 +438,44 @@ def fetch_all(conn, sql):
 
         return True, data
     except Exception as e:
-        return False, f"Caught exception: {e.__doc__}({e})"
\ No newline at end of file
+        return False, f"Caught exception: {e.__doc__}({e})"
+
+
+def _finite(value):
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+
+    if isinstance(value, dict):
+        return {k: _finite(v) for k, v in value.items()}
+
+    if isinstance(value, (list, tuple)):
+        return [_finite(v) for v in value]
+
+    return value
+
+
+def dump_json(value):
+    """
+    It encodes a value for a JSONB column. NaN and infinity, which JSONB does not accept, are
+    written as null.
+
+    :param value: the value to encode
+    :return: A JSON string.
+    """
+
+    return json.dumps(_finite(value), ensure_ascii=False, separators=(',', ':'))
+
+
+def load_json(value):
+    """
+    It decodes a JSON column read from the database. psycopg2 already decodes JSONB, while a column
+    that is not migrated yet is read as text.
+
+    :param value: the value of the column
+    :return: The decoded value, or None.
+    """
+
+    if isinstance(value, (str, bytes)):
+        return json.loads(value)
+
+    return value
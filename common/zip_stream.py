@@ -0,0 +1,99 @@
+import os
+import zipfile
+from urllib.parse import quote
+
+
+# It's a write-only file object that hands out what was written since the last call of pop
+class _StreamBuffer(object):
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+
+        return data
+
+
+def iter_files(root_path, dirs=None, exclude=()):
+    """
+    It walks a directory in a stable order, and yields the absolute path and the archive name of
+    every file under it
+
+    :param root_path: the absolute path of the directory, the archive names are relative to it
+    :param dirs: the names of the sub directories of root_path to walk, all of them if None
+    :param exclude: the names of the files to leave out, wherever they are
+    """
+
+    if dirs is None:
+        tops = [root_path]
+    else:
+        tops = [os.path.join(root_path, name) for name in sorted(dirs) if os.path.isdir(os.path.join(root_path, name))]
+
+    for top in tops:
+        for dir_path, dir_names, file_names in os.walk(top):
+            dir_names.sort()
+
+            for file_name in sorted(file_names):
+                if file_name in exclude:
+                    continue
+
+                file_path = os.path.join(dir_path, file_name)
+
+                yield file_path, os.path.relpath(file_path, root_path).replace(os.sep, "/")
+
+
+def zip_stream(files, compression=zipfile.ZIP_DEFLATED, chunk_size=1024 * 1024):
+    """
+    It compresses files into a zip archive and yields the archive piece by piece, so that only one
+    chunk of one file is held in memory at a time
+
+    :param files: an iterable of (absolute path, archive name)
+    :param compression: the compression of the members
+    :param chunk_size: the number of bytes read from a file at a time
+    :return: A generator of bytes.
+    """
+
+    buffer = _StreamBuffer()
+
+    with zipfile.ZipFile(buffer, "w", compression) as zf:
+        for file_path, arcname in files:
+            info = zipfile.ZipInfo.from_file(file_path, arcname)
+            info.compress_type = compression
+
+            with open(file_path, "rb") as src, zf.open(info, "w", force_zip64=True) as dst:
+                for block in iter(lambda: src.read(chunk_size), b""):
+                    dst.write(block)
+
+                    data = buffer.pop()
+                    if data:
+                        yield data
+
+            data = buffer.pop()
+            if data:
+                yield data
+
+    yield buffer.pop()
+
+
+def attachment(file_name):
+    """
+    It returns the Content-Disposition header of a download, with a UTF-8 file name
+
+    :param file_name: the name of the downloaded file
+    """
+
+    return f"attachment; filename*=UTF-8''{quote(file_name)}"
@@ -1,7 +1,26 @@
+from joblib.parallel import cpu_count
+
 LOG_PATH = "/var/log/catarc/"
 LOG_FILE = "app.log"
 LOG_LEVEL = 'INFO'
 FILE_PATH = "/usr/local/catarc/server/data/"
+CACHE_DIR = ".cache"
+CACHE_SIZE = 4 * 1024 * 1024 * 1024
+STREAM_SIZE = 256 * 1024 * 1024
+STREAM_CHUNK = 200000
+TAIL_BLOCK = 1024 * 1024
+DAT_THREADS = 4
+UNZIP_THREADS = 4
+UNZIP_LARGE = 16 * 1024 * 1024
+POOL_PATH = "/tmp/catarc/pool/"
+METRICS_PATH = "/tmp/catarc/metrics/"
+POOL_WORKERS = cpu_count()
+POOL_IDLE_TIMEOUT = 1800
+CONTEXT_SIZE = 64
+JOB_POLL_INTERVAL = 2
+JOB_HEARTBEAT = 30
+JOB_STALE = 300
+GRAPH_POINTS = 1000
 
 POSTGRESQL = {
     "user": "postgres",
@@ -10,6 +29,13 @@ POSTGRESQL = {
     "port": 5432,
     "database": "postgres"
 }
+POSTGRESQL_POOL = {
+    "min_size": 1,
+    "max_size": 10,
+    "timeout": 30,
+    "max_lifetime": 3600,
+    "check_idle": 30
+}
 
 class SampleCategory(object):
     CELL = "单体蓄电池"
@@ -85,6 +111,7 @@ class DatabaseTable(object):
     PRODUCT = "public.product_info"
     STAT = "public.stat_info"
     USER = "public.user_info"
+    JOB = "public.parse_job"
 
 class TestDataError(Exception):
     '''TestDataError'''
@@ -1,10 +1,11 @@
+import re
 import pathlib
 import os.path
 from joblib.parallel import cpu_count
 
 import gevent.monkey
 
-from config.setting import LOG_PATH
+from config.setting import LOG_PATH, METRICS_PATH
 
 
 gevent.monkey.patch_all()
@@ -34,4 +35,34 @@ pathlib.Path(errorlog).touch()
 
 reload = True
 
-x_forwarded_for_header = 'X-FORWARDED-FOR'
\ No newline at end of file
+x_forwarded_for_header = 'X-FORWARDED-FOR'
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    return True
+
+
+# the metrics of the workers are kept in files shared by all the processes, named after the pid that
+# writes them. The files of the processes gone are removed, the job worker may be running and still
+# writing its own
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", METRICS_PATH)
+pathlib.Path(os.environ["PROMETHEUS_MULTIPROC_DIR"]).mkdir(parents=True, exist_ok=True)
+
+for metrics_file in pathlib.Path(os.environ["PROMETHEUS_MULTIPROC_DIR"]).glob("*.db"):
+    pid = re.search(r"_(\d+)\.db$", metrics_file.name)
+
+    if pid is None or not _alive(int(pid.group(1))):
+        metrics_file.unlink(missing_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,15 +1,19 @@
 import os
 import json
+import time
 import pathlib
-import zipfile
 from io import BytesIO
 
-from flask import Flask, request, session, jsonify, make_response, send_from_directory, send_file
+from flask import Flask, Response, request, session, g, jsonify, make_response, send_from_directory
 from flask_cors import CORS
 
 from common.log import logger_config, get_logger
+from common.zip_stream import iter_files, zip_stream, attachment
+from common.metrics import API_REQUESTS, API_ERRORS, API_LATENCY, API_RESPONSE_BYTES, DOWNLOAD_BYTES, count_stream, render_metrics
 from config.setting import LOG_PATH, LOG_FILE, LOG_LEVEL, FILE_PATH, ITEM_LIST
 from app.api import *
+from app.migrate import migrate
+from app.curve import CURVE_FILE
 
 
 logger_config(os.path.join(LOG_PATH, LOG_FILE), LOG_LEVEL)
@@ -18,6 +22,10 @@ logger = get_logger()
 
 logger.info("Service start.")
 
+ret, msg = migrate()
+if ret is False:
+    logger.error(msg)
+
 
 app = Flask(__name__)
 
@@ -29,6 +37,60 @@ app.secret_key = "catarc"
 
 CORS(app)
 
+# the functions of call_api that are not functions of app.api
+LOCAL_FUNCS = {"login", "upload_product_file", "display_img", "download_img", "download_product_file", "download_test_file", "download_test_item_data", "download_test_sample_data"}
+
+
+def metric_func(func):
+    """
+    It returns the func label of the metrics of a call, "unknown" for the names that are not api
+    functions, so that the labels stay bounded
+    """
+
+    return func if func in LOCAL_FUNCS or callable(globals().get(func)) else "unknown"
+
+
+@app.before_request
+def start_timer():
+    g.start_time = time.perf_counter()
+
+
+@app.after_request
+def record_metrics(response):
+    """
+    It records the count, latency, errors and size of every call of call_api. The latency of a
+    streamed download ends before its body is sent, its bytes are counted by count_stream.
+    """
+
+    if request.endpoint == "call_api":
+        func = metric_func(request.view_args["func"])
+
+        API_REQUESTS.labels(func).inc()
+        API_LATENCY.labels(func).observe(time.perf_counter() - g.start_time)
+
+        if response.status_code >= 400 or g.get("failed", False):
+            API_ERRORS.labels(func).inc()
+
+        if response.content_length:
+            API_RESPONSE_BYTES.labels(func).inc(response.content_length)
+
+            if func.startswith("download_"):
+                DOWNLOAD_BYTES.labels(func).inc(response.content_length)
+
+    return response
+
+
+@app.route("/metrics", methods=['GET'])
+def metrics():
+    """
+    It returns the metrics of all the gunicorn workers in the Prometheus text format
+    """
+
+    data, content_type = render_metrics()
+
+    return Response(data, mimetype=content_type)
+
+
 @app.route("/api/<func>", methods=['POST'])
 def call_api(func):
     """
@@ -150,21 +212,11 @@ def call_api(func):
 
             params = json.loads(request.data.decode('utf-8'))
 
-            os.chdir(os.path.join(FILE_PATH, params["task_id"]))
-
-            memory_file = BytesIO()
+            task_path = os.path.join(FILE_PATH, params["task_id"])
 
-            with zipfile.ZipFile(memory_file, "w", zipfile.ZIP_DEFLATED) as myzip:
-                with os.scandir("./") as gbt_it:
-                    for gbt_entry in gbt_it:
-                        if gbt_entry.is_dir() and gbt_entry.name in ITEM_LIST:
-                            for dev in pathlib.Path(f"./{gbt_entry.name}").glob('**/*'):
-                                if dev.is_file():
-                                    myzip.writestr(dev.as_posix(), dev.read_bytes())
+            files = iter_files(task_path, [name for name in os.listdir(task_path) if name in ITEM_LIST], exclude=(CURVE_FILE,))
 
-            memory_file.seek(0)
-
-            return send_file(memory_file, attachment_filename=f'{params["task_id"]}.zip', as_attachment=True)
+            return Response(count_stream(func, zip_stream(files)), mimetype="application/zip", headers={"Content-Disposition": attachment(f'{params["task_id"]}.zip')})
         elif func == "download_test_item_data":
             ret, data = verify_token(request.headers.get('Authorization', ""))
             if ret is False:
@@ -172,18 +224,9 @@ def call_api(func):
 
             params = json.loads(request.data.decode('utf-8'))
 
-            os.chdir(os.path.join(FILE_PATH, params["task_id"], params["gbt"], params["category"], params["item"]))
-
-            memory_file = BytesIO()
-
-            with zipfile.ZipFile(memory_file, "w", zipfile.ZIP_DEFLATED) as myzip:
-                for dev in pathlib.Path("./").glob('**/*'):
-                    if dev.is_file():
-                        myzip.writestr(dev.as_posix(), dev.read_bytes())
-
-            memory_file.seek(0)
+            item_path = os.path.join(FILE_PATH, params["task_id"], params["gbt"], params["category"], params["item"])
 
-            return send_file(memory_file, attachment_filename=f'{params["item"]}.zip', as_attachment=True)
+            return Response(count_stream(func, zip_stream(iter_files(item_path, exclude=(CURVE_FILE,)))), mimetype="application/zip", headers={"Content-Disposition": attachment(f'{params["item"]}.zip')})
         elif func == "download_test_sample_data":
             ret, data = verify_token(request.headers.get('Authorization', ""))
             if ret is False:
@@ -191,18 +234,9 @@ def call_api(func):
 
             params = json.loads(request.data.decode('utf-8'))
 
-            os.chdir(os.path.join(FILE_PATH, params["task_id"], params["gbt"], params["category"], params["item"], params["sample"], "设备数据"))
+            sample_path = os.path.join(FILE_PATH, params["task_id"], params["gbt"], params["category"], params["item"], params["sample"], "设备数据")
 
-            memory_file = BytesIO()
-
-            with zipfile.ZipFile(memory_file, "w", zipfile.ZIP_DEFLATED) as myzip:
-                for dev in pathlib.Path("./").glob('**/*'):
-                    if dev.is_file():
-                        myzip.writestr(dev.as_posix(), dev.read_bytes())
-
-            memory_file.seek(0)
-
-            return send_file(memory_file, attachment_filename=f'{params["sample"]}-设备数据.zip', as_attachment=True)
+            return Response(count_stream(func, zip_stream(iter_files(sample_path))), mimetype="application/zip", headers={"Content-Disposition": attachment(f'{params["sample"]}-设备数据.zip')})
         else:
             ret, data = verify_token(request.headers.get('Authorization', ""))
             if ret is False:
@@ -216,6 +250,8 @@ def call_api(func):
         data = f"Caught exception: {e.__doc__}({e})"
 
     if ret is False:
+        g.failed = True
+
         if not isinstance(data, dict):
             logger.error(data)
 
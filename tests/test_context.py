@@ -0,0 +1,28 @@
+import pytest
+
+from app.context import TaskContext
+
+
+@pytest.mark.parametrize("value, number", [
+    ("100", 100.0),
+    ("100Ah", 100.0),
+    ("50.5 Ah", 50.5),
+    ("1,200Ah", 1200.0),
+    ("1,234,567.8", 1234567.8),
+    ("-20℃", -20.0),
+    ("+4.2V", 4.2),
+    ("约 280Ah", 280.0)
+])
+def test_get_product_number(value, number):
+    context = TaskContext("task")
+    context.products = {("电池包", "额定容量（Ah）"): value}
+
+    assert context.get_product_number("电池包", "额定容量（Ah）") == (True, number)
+
+
+@pytest.mark.parametrize("value", [None, "", "/"])
+def test_get_product_number_missing(value):
+    context = TaskContext("task")
+    context.products = {("电池包", "额定容量（Ah）"): value}
+
+    assert context.get_product_number("电池包", "额定容量（Ah）")[0] is False
@@ -0,0 +1,31 @@
+import app.curve
+from app.curve import save_graph, load_graph, delete_graph
+
+
+def test_save_and_load_graph(tmp_path, monkeypatch):
+    monkeypatch.setattr(app.curve, "FILE_PATH", str(tmp_path))
+
+    cycles = [[cycle, round(100 - cycle * 0.013, 3)] for cycle in range(1, 1001)]
+    voltages = [[round(i * 0.1, 1), 3.21 + i * 0.001] for i in range(500)]
+
+    graph = [{"容量保持率曲线": ["循环次数", "容量保持率(%)"]}, {"keys": ["a", "b"]}, {"values": [cycles, voltages]}]
+
+    saved = save_graph("task", "gbt", "category", "item", graph)
+
+    assert saved[2] == {"curves": ["c0", "c1"]}
+
+    ret, loaded = load_graph("task", "gbt", "category", "item", saved)
+
+    assert ret is True
+    assert loaded[:2] == graph[:2]
+
+    # the cycle numbers come back as integers, the floats as their 7 significant digits
+    assert loaded[2]["values"][0] == cycles
+    assert all(type(row[0]) is int for row in loaded[2]["values"][0])
+    assert loaded[2]["values"][1] == [[x, round(y, 6)] for x, y in voltages]
+
+    delete_graph("task", "gbt", "category", "item")
+
+    ret, msg = load_graph("task", "gbt", "category", "item", saved)
+
+    assert ret is False
@@ -0,0 +1,36 @@
+import zipfile
+
+from common.docx_table import iter_docx_tables
+
+
+DOCUMENT = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<w:body>
+<w:p><w:r><w:t>产品信息</w:t></w:r></w:p>
+<w:tbl>
+<w:tblGrid><w:gridCol/><w:gridCol/></w:tblGrid>
+<w:tr>
+<w:tc><w:p><w:r><w:t>额定容量</w:t></w:r><w:r><w:t>（Ah）</w:t></w:r></w:p></w:tc>
+<w:tc><w:p><w:hyperlink r:id="rId1"><w:r><w:t>100</w:t></w:r></w:hyperlink><w:ins><w:r><w:t>Ah</w:t></w:r></w:ins><w:del><w:r><w:delText>Wh</w:delText><w:t>x</w:t></w:r></w:del></w:p></w:tc>
+</w:tr>
+<w:tr>
+<w:tc><w:p><w:smartTag><w:r><w:t>生产</w:t></w:r></w:smartTag><w:r><w:tab/><w:t>日期</w:t></w:r></w:p></w:tc>
+<w:tc><w:p><w:r><w:t>2024</w:t><w:br/><w:t>01</w:t></w:r></w:p><w:p/></w:tc>
+</w:tr>
+</w:tbl>
+</w:body>
+</w:document>"""
+
+
+def test_iter_docx_tables(tmp_path):
+    docx_file = tmp_path / "product.docx"
+
+    with zipfile.ZipFile(docx_file, "w") as zip_file:
+        zip_file.writestr("word/document.xml", DOCUMENT)
+
+    tables = list(iter_docx_tables(str(docx_file)))
+
+    assert tables == [[
+        [["额定容量（Ah）"], ["100Ah"]],
+        [["生产\t日期"], ["2024\n01", ""]]
+    ]]
@@ -0,0 +1,100 @@
+import numpy
+import pytest
+
+from app.downsample import lttb, has_key, downsample_graph
+
+
+def reference_lttb(points, threshold):
+    """
+    Largest-Triangle-Three-Buckets written point by point, with the same bucket edges as lttb
+    """
+
+    n = len(points)
+
+    edges = [int(v) for v in numpy.linspace(1, n - 1, threshold - 1)]
+
+    selected = [0]
+    a = 0
+
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+
+        if i + 2 < len(edges):
+            following = points[end:edges[i + 2]]
+            next_x = sum(p[0] for p in following) / len(following)
+            next_y = sum(p[1] for p in following) / len(following)
+        else:
+            next_x, next_y = points[-1]
+
+        best, best_area = start, -1
+
+        for j in range(start, end):
+            area = abs((points[a][0] - next_x) * (points[j][1] - points[a][1]) - (points[a][0] - points[j][0]) * (next_y - points[a][1]))
+
+            if area > best_area:
+                best, best_area = j, area
+
+        a = best
+        selected.append(a)
+
+    selected.append(n - 1)
+
+    return [points[i] for i in selected]
+
+
+def curve(n, seed=0):
+    rng = numpy.random.default_rng(seed)
+
+    x = numpy.cumsum(rng.uniform(0.1, 1.0, n))
+    y = numpy.sin(x / 7) + rng.normal(0, 0.05, n)
+
+    return [[float(a), float(b)] for a, b in zip(x, y)]
+
+
+@pytest.mark.parametrize("n, threshold", [(1000, 100), (5001, 1000), (17, 5), (10, 3)])
+def test_lttb_matches_reference(n, threshold):
+    points = curve(n, seed=n)
+
+    result = lttb(points, threshold)
+
+    assert result == reference_lttb(points, threshold)
+    assert len(result) == threshold
+    assert result[0] == points[0] and result[-1] == points[-1]
+
+
+def test_lttb_keeps_short_curves():
+    points = curve(50)
+
+    assert lttb(points, 50) is points
+    assert lttb(points, None) is points
+    assert lttb(points, 2) is points
+
+
+def test_lttb_keeps_peaks():
+    points = [[i, 0.0] for i in range(1000)]
+    points[500] = [500, 10.0]
+
+    assert [500, 10.0] in lttb(points, 50)
+
+
+def test_downsample_graph():
+    graph = [{"曲线": ["x", "y"]}, {"keys": ["a", "b"]}, {"values": [curve(2000, 1), curve(2000, 2)]}]
+
+    result = downsample_graph(graph, 100, full_keys=("b",))
+
+    assert len(result[2]["values"][0]) == 100
+    assert result[2]["values"][1] == graph[2]["values"][1]
+    assert len(graph[2]["values"][0]) == 2000
+
+
+def test_downsample_graph_sample():
+    # an item with several samples keys its curves as "<sample>-<curve>"
+    keys = ["样品1-第1轮循环放电", "样品1-第2轮循环放电", "样品10-第1轮循环放电"]
+    graph = [{"曲线": ["x", "y"]}, {"keys": keys}, {"values": [curve(2000, i) for i in range(3)]}]
+
+    result = downsample_graph(graph, 100, full_keys=("样品1",))
+
+    assert [len(values) for values in result[2]["values"]] == [2000, 2000, 100]
+
+    assert has_key(graph, "样品1") and has_key(graph, "样品10-第1轮循环放电")
+    assert not has_key(graph, "样品2") and not has_key(graph, "第1轮循环放电")
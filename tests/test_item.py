@@ -0,0 +1,40 @@
+import os
+import time
+
+import app.item
+from config.setting import POOL_WORKERS
+from app.item import DefaultItem
+
+
+def test_extract_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(app.item, "FILE_PATH", str(tmp_path))
+
+    files = []
+
+    for i in range(2 * POOL_WORKERS):
+        files.append(tmp_path / f"sample{i}.dat")
+        files[-1].write_text(f"{i}\n")
+
+    def extract_file(file, scale):
+        time.sleep(0.2)
+
+        return True, (int(open(file).read()) * scale, os.getpid())
+
+    item = DefaultItem("task", "gbt", "category", "item", context=object())
+
+    results = item.extract_files(extract_file, [(str(file), 10) for file in files])
+
+    assert [result[1][0] for result in results] == [10 * i for i in range(len(files))]
+
+    pids = {result[1][1] for result in results}
+
+    # the files are extracted in the pool, on more than one process when it has more
+    assert os.getpid() not in pids
+    assert len(pids) > 1 or POOL_WORKERS == 1
+
+    # the second call reads the saved results, until a file changes
+    assert item.extract_files(extract_file, [(str(file), 10) for file in files]) == results
+
+    files[0].write_text("7\n")
+
+    assert item.extract_files(extract_file, [(str(file), 10) for file in files])[0][1][0] == 70
@@ -0,0 +1,22 @@
+import os
+import time
+
+from config.setting import POOL_WORKERS
+from app.pool import get_executor, run_parallel
+
+
+def pid(delay):
+    time.sleep(delay)
+
+    return os.getpid()
+
+
+def test_executor_size():
+    assert get_executor()._max_workers == POOL_WORKERS
+
+
+def test_run_parallel():
+    pids = run_parallel(pid, [(0.2,)] * (2 * POOL_WORKERS))
+
+    assert os.getpid() not in pids
+    assert len(set(pids)) > 1 or POOL_WORKERS == 1
@@ -0,0 +1,51 @@
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+import psycopg2.extensions
+import psycopg2.extras
+
+from config.setting import POSTGRESQL
+from common.postgres_driver import copy_rows
+
+
+ROWS = [["1", "单体蓄电池", "额定容量（Ah）", "100"], ["1", "单体蓄电池", "", None], ["1", "蓄电池模块", 'a "b", c', "\\N"]]
+
+
+@pytest.fixture
+def conn():
+    try:
+        conn = psycopg2.connect(**POSTGRESQL)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"no database: {e}")
+
+    with conn.cursor() as curs:
+        curs.execute("CREATE TEMP TABLE product_rows(task_id VARCHAR, category VARCHAR, name VARCHAR, value VARCHAR)")
+
+    conn.commit()
+
+    yield conn
+
+    conn.close()
+
+
+@pytest.fixture(params=[None, psycopg2.extras.wait_select], ids=["blocking", "wait_callback"])
+def wait_callback(request):
+    psycopg2.extensions.set_wait_callback(request.param)
+
+    yield request.param
+
+    psycopg2.extensions.set_wait_callback(None)
+
+
+def test_copy_rows(conn, wait_callback):
+    ret, msg = copy_rows(conn, "product_rows", ["task_id", "category", "name", "value"], ROWS[:1], "DELETE FROM product_rows")
+    assert ret is True, msg
+
+    ret, msg = copy_rows(conn, "product_rows", ["task_id", "category", "name", "value"], ROWS, "DELETE FROM product_rows")
+    assert ret is True, msg
+
+    with conn.cursor() as curs:
+        curs.execute("SELECT task_id, category, name, value FROM product_rows ORDER BY category, name")
+        rows = [list(row) for row in curs.fetchall()]
+
+    assert rows == sorted(ROWS, key=lambda row: (row[1], row[2]))
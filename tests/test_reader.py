@@ -0,0 +1,64 @@
+import pandas
+import pytest
+
+from benchmark.generate import write_arbin_csv
+from app.reader import read_cycler_tail, read_segments, read_tail_segments
+
+
+COLUMNS = ['Cycle', 'Step', 'Step time, S', 'Voltage, V', 'Power, W', 'Amp-Hours, AH']
+
+
+@pytest.fixture(scope="module")
+def csv_file(tmp_path_factory):
+    csv_file = tmp_path_factory.mktemp("reader") / "sample.csv"
+
+    # larger than TAIL_BLOCK, so that the tail is not the whole file
+    write_arbin_csv(csv_file, 200, rows_per_step=30, seed=2)
+
+    return str(csv_file)
+
+
+@pytest.fixture(scope="module")
+def df(csv_file):
+    return pandas.read_csv(csv_file, skiprows=13, encoding='gbk', usecols=COLUMNS).dropna(how='any')
+
+
+@pytest.mark.parametrize("block_size", [4096, 65536])
+def test_read_cycler_tail(csv_file, df, block_size):
+    window, whole = read_cycler_tail(csv_file, COLUMNS, 3, block_size=block_size)
+
+    assert whole is False
+    assert window['Cycle'].nunique() > 3
+    assert window.to_numpy().tolist() == df.iloc[-len(window):].to_numpy().tolist()
+
+
+def test_read_cycler_tail_whole(csv_file, df):
+    window, whole = read_cycler_tail(csv_file, COLUMNS, 1000)
+
+    assert whole is True
+    assert window.to_numpy().tolist() == df.to_numpy().tolist()
+
+
+def test_read_tail_segments(csv_file):
+    full = read_segments(csv_file, COLUMNS, accumulators=['Amp-Hours, AH'])
+    tail = read_tail_segments(csv_file, COLUMNS, 3, keep=1, accumulators=['Amp-Hours, AH'])
+
+    assert len(tail.table) < len(full.table)
+
+    max_cycle, dchg_step = full.last_discharge()
+
+    assert tail.last_discharge() == (max_cycle, dchg_step)
+
+    for cycle in range(max_cycle - 2, max_cycle + 1):
+        assert tail.end_value(cycle, dchg_step, column='Amp-Hours, AH') == full.end_value(cycle, dchg_step, column='Amp-Hours, AH')
+        assert tail.before_value(cycle, dchg_step, column='Amp-Hours, AH') == full.before_value(cycle, dchg_step, column='Amp-Hours, AH')
+
+    assert tail.rows(max_cycle, dchg_step).to_numpy().tolist() == full.rows(max_cycle, dchg_step).to_numpy().tolist()
+
+
+def test_read_tail_segments_not_covered(csv_file):
+    full = read_segments(csv_file, COLUMNS, accumulators=['Amp-Hours, AH'])
+
+    index = read_tail_segments(csv_file, COLUMNS, 3, covered=lambda index: False, accumulators=['Amp-Hours, AH'])
+
+    assert len(index.table) == len(full.table)
@@ -0,0 +1,78 @@
+import pandas
+import pytest
+
+from benchmark.generate import write_arbin_csv
+from app.segment import SegmentIndex
+
+
+COLUMNS = ['Total Time, S', 'Cycle', 'Step', 'Step time, S', 'Voltage, V', 'Power, W', 'Amp-Hours, AH', 'Amp Hours Discharge, AH']
+
+ACCUMULATORS = ['Amp-Hours, AH', 'Amp Hours Discharge, AH']
+
+
+@pytest.fixture(scope="module")
+def df(tmp_path_factory):
+    csv_file = tmp_path_factory.mktemp("segment") / "sample.csv"
+
+    write_arbin_csv(csv_file, 12, rows_per_step=20, seed=1)
+
+    return pandas.read_csv(csv_file, skiprows=13, encoding='gbk', usecols=COLUMNS).dropna(how='any')
+
+
+def segments(df):
+    return [tuple(int(v) for v in key) for key in df[['Cycle', 'Step']].drop_duplicates().to_numpy()]
+
+
+def test_last_discharge(df):
+    index = SegmentIndex(df, accumulators=ACCUMULATORS)
+
+    max_cycle = int(df[df['Power, W'] < 0]['Cycle'].max())
+    dchg_step = int(df[(df['Power, W'] < 0) & (df.Cycle == max_cycle)]["Step"].max())
+
+    assert index.last_discharge() == (max_cycle, dchg_step)
+
+
+def test_end_and_before_values(df):
+    index = SegmentIndex(df, accumulators=ACCUMULATORS)
+
+    for cycle, step in segments(df):
+        segment = df[(df.Cycle == cycle) & (df.Step == step)]['Step time, S'].astype('float64')
+
+        max_index = segment.idxmax()
+        min_index = segment.idxmin()
+
+        for column in ACCUMULATORS:
+            assert index.end_value(cycle, step, column=column) == df.loc[max_index, column]
+
+            if min_index > 0:
+                assert index.before_value(cycle, step, column=column) == df.loc[min_index - 1, column]
+
+
+def test_rows(df):
+    index = SegmentIndex(df, accumulators=ACCUMULATORS)
+
+    for cycle, step in segments(df):
+        expected = df[(df.Cycle == cycle) & (df.Step == step)][['Amp-Hours, AH', 'Voltage, V']]
+
+        assert index.rows(cycle, step, columns=['Amp-Hours, AH', 'Voltage, V']).to_numpy().tolist() == expected.to_numpy().tolist()
+
+
+def test_from_chunks(df):
+    whole = SegmentIndex(df, accumulators=ACCUMULATORS)
+
+    # the chunk size splits most segments across two chunks
+    chunks = [df.iloc[i:i + 37] for i in range(0, len(df), 37)]
+
+    index = SegmentIndex.from_chunks(chunks, accumulators=ACCUMULATORS, keep=3)
+
+    assert index.last_discharge() == whole.last_discharge()
+
+    for cycle, step in segments(df):
+        for column in ACCUMULATORS:
+            assert index.end_value(cycle, step, column=column) == whole.end_value(cycle, step, column=column)
+            assert index.before_value(cycle, step, column=column) == pytest.approx(whole.before_value(cycle, step, column=column), nan_ok=True)
+
+    max_cycle, dchg_step = whole.last_discharge()
+
+    for cycle in range(max_cycle - 2, max_cycle + 1):
+        assert index.rows(cycle, dchg_step, columns=COLUMNS).to_numpy().tolist() == whole.rows(cycle, dchg_step, columns=COLUMNS).to_numpy().tolist()
@@ -0,0 +1,20 @@
+import os
+
+from common.log import logger_config, get_logger
+from config.setting import LOG_PATH, LOG_LEVEL
+from app.job import init_job_table, run_worker
+from app.api import parse_test_item, parse_task
+from app.pool import warm_pool
+
+
+logger_config(os.path.join(LOG_PATH, "worker.log"), LOG_LEVEL)
+
+logger = get_logger()
+
+ret, msg = init_job_table()
+if ret is False:
+    logger.error(msg)
+
+warm_pool()
+
+run_worker(parse_test_item, parse_task)
@@ -0,0 +1,3 @@
+#!/usr/bin/env bash
+
+/usr/local/catarc/python/bin/python worker.py
\ No newline at end of file